@@ -0,0 +1,244 @@
+"""
+This file is for the shared stores that let several worker processes (gunicorn -w 8) and several machines share one
+set of caches and one rate limit budget, instead of every worker keeping its own copy and its own count of calls.
+Which store is used is set with CACHE_BACKEND:
+    memory                      Every worker keeps its own caches in memory (the default, see cache.MemoryStore)
+    sqlite:///path/to/file      One SQLite file, shared by every worker on the machine
+    redis://host:6379/0         A Redis server (or anything that speaks its protocol), shared by every machine
+
+Both shared stores have the same methods as cache.MemoryStore (get, set, delete), plus incr for the rate limit
+counters. Values are stored as JSON, compressed when they are large. A shared store that can not be reached does not
+take the API down: lookups count as misses and rate limits fall back to the counts of each worker.
+"""
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import metrics
+try:
+    import orjson    # Faster than the json module for the large match records, used when installed
+    dumps = orjson.dumps
+    loads = orjson.loads
+except ImportError:
+    def dumps(value):
+        return json.dumps(value, separators=(",", ":")).encode()
+    loads = json.loads
+
+# Where the caches and rate limit counters are kept: memory, sqlite:///path or redis://host:port/db
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+# Values larger than this many bytes are compressed before they are stored
+COMPRESS_OVER = 512
+
+log = logging.getLogger(__name__)
+
+
+def report_error(backend, operation, error):
+    """Count and log a call to a shared store that failed. The caller carries on without the store (a lookup is a
+        miss, a rate limit counter falls back to the worker's own count), so this is the only trace of it"""
+    metrics.shared_store_error(backend, operation)
+    log.warning("Shared %s store %s failed: %s", backend, operation, error)
+
+
+def encode(value):
+    data = dumps(value)
+    if len(data) > COMPRESS_OVER:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+
+def decode(data):
+    if data[:1] == b"z":
+        return loads(zlib.decompress(data[1:]))
+    return loads(data[1:])
+
+
+def key_string(key):
+    """Turn a cache key (a string or a tuple such as ("puuid", "league", "name", "tag")) into the string it is stored under"""
+    if isinstance(key, str):
+        return key
+    return "|".join(str(part) for part in key)
+
+
+class SQLiteBackend:
+    """Keeps everything in one SQLite file, which every process on the machine opens. Counters are updated in a write
+        transaction, so two workers can not both take the last call of a rate limit window"""
+
+    # Expired rows are deleted after this many writes
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._pid = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # A connection can not be used after a fork, so every worker process opens its own on first use
+        if self._db is None or self._pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")    # Readers do not wait for writers
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+            self._pid = os.getpid()
+        return self._db
+
+    def _cleanup(self, db):
+        self._writes += 1
+        if self._writes % self.CLEANUP_EVERY == 0:
+            db.execute("DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+
+    def get(self, key):
+        try:
+            with self._lock:
+                row = self._connect().execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            report_error("sqlite", "get", e)
+            return None
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return decode(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        try:
+            with self._lock:
+                db = self._connect()
+                db.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)", (key, encode(value), expires))
+                self._cleanup(db)
+        except sqlite3.Error as e:
+            report_error("sqlite", "set", e)
+
+    def delete(self, key):
+        try:
+            with self._lock:
+                self._connect().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            report_error("sqlite", "delete", e)
+
+    def incr(self, key, amount, ttl):
+        """Add <amount> to a counter and get its new value. A counter that does not exist yet starts at 0 and is
+            deleted <ttl> seconds later
+
+        Returns:
+            int: The new value, or None if the store could not be reached
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._connect()
+                db.execute("BEGIN IMMEDIATE")    # Take the write lock before reading, so no other process counts in between
+                try:
+                    row = db.execute("SELECT value, expires FROM cache_entries WHERE key = ?", (key,)).fetchone()
+                    if row is None or (row[1] is not None and row[1] < now):
+                        value, expires = amount, now + ttl
+                    else:
+                        value, expires = int(row[0]) + amount, row[1]
+                    db.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+                    self._cleanup(db)
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            return value
+        except sqlite3.Error as e:
+            report_error("sqlite", "incr", e)
+            return None
+
+
+class RedisBackend:
+    """Keeps everything in a Redis server, which every process on every machine connects to. Needs the redis package,
+        which is only imported when CACHE_BACKEND is a redis:// URL"""
+
+    def __init__(self, url):
+        import redis
+        self.errors = redis.exceptions.RedisError
+        # Connections are made on first use and re-made after a fork, so this is safe to create at import time. RESP2 is
+        # spoken by every Redis version and by the stand-in in bench/mock_redis.py
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1, protocol=2)
+
+    def get(self, key):
+        try:
+            data = self.client.get(key)
+        except self.errors as e:
+            report_error("redis", "get", e)
+            return None
+        return None if data is None else decode(data)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.client.set(key, encode(value), px=None if ttl is None else max(int(ttl * 1000), 1))
+        except self.errors as e:
+            report_error("redis", "set", e)
+
+    def delete(self, key):
+        try:
+            self.client.delete(key)
+        except self.errors as e:
+            report_error("redis", "delete", e)
+
+    def incr(self, key, amount, ttl):
+        """Same as SQLiteBackend.incr"""
+        try:
+            # One MULTI transaction, so the counter is always made with its expiry: a worker that dies between two
+            # separate calls would leave a counter that never expires and blocks the key for good
+            pipe = self.client.pipeline(transaction=True)
+            pipe.set(key, 0, ex=max(math.ceil(ttl), 1), nx=True)
+            pipe.incrby(key, amount)
+            return pipe.execute()[1]
+        except self.errors as e:
+            report_error("redis", "incr", e)
+            return None
+
+
+class Namespace:
+    """The part of a shared store that belongs to one cache, so that the keys of different caches can not collide"""
+
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.prefix = name + ":"
+
+    def get(self, key):
+        return self.backend.get(self.prefix + key_string(key))
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(self.prefix + key_string(key), value, ttl)
+
+    def delete(self, key):
+        self.backend.delete(self.prefix + key_string(key))
+
+
+def open_backend(url):
+    """Make the store for a CACHE_BACKEND value
+
+    Returns:
+        SQLiteBackend or RedisBackend: The shared store, or None for memory (every worker keeps its own)
+
+    Raises:
+        ValueError: If the value is not one of the supported kinds
+    """
+    if url == "memory":
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith("redis://") or url.startswith("rediss://") or url.startswith("unix://"):
+        return RedisBackend(url)
+    raise ValueError("Unknown CACHE_BACKEND " + url)
+
+
+_SHARED = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared():
+    """Get the shared store set with CACHE_BACKEND, made the first time it is asked for, or None if every worker keeps its own"""
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = (open_backend(CACHE_BACKEND),)
+        return _SHARED[0]
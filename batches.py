@@ -0,0 +1,40 @@
+"""
+This file is for batch requests (POST /league/batch/rank and the others in game_api.py and game_api_async.py), which
+look up the same thing for a list of players in one request. Both apps read the list of players the same way here, and
+stream back one line of newline-delimited JSON per player as each one finishes.
+"""
+import os
+
+# Number of players a batch request works on at the same time, and the most players one batch request may ask for
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '8'))
+BATCH_MAX_PLAYERS = int(os.environ.get('BATCH_MAX_PLAYERS', '300'))
+
+
+def read_players(body):
+    """Get the players of a batch request from its JSON body, which looks like
+        {"players": ["name#tagline", {"summoner": name, "tagline": tagline}, ...], ...}.
+        A player that is listed more than once is only looked up once
+
+    Args:
+        body: The decoded JSON body of the request, or None if it was not JSON
+
+    Returns:
+        dict: (name, tagline) in lowercase -> ["name#tagline", ...], the way each request for that player was written,
+            in the order the players were listed. Returns None if the body is not a valid batch request
+    """
+    if not isinstance(body, dict):
+        return None
+    players = body.get("players")
+    if not isinstance(players, list) or len(players) > BATCH_MAX_PLAYERS:
+        return None
+    requested = {}
+    for player in players:
+        if isinstance(player, dict):
+            name, tagline = str(player.get("summoner", "")), str(player.get("tagline", ""))
+        else:
+            name, _, tagline = str(player).partition("#")
+        if not name or not tagline:
+            return None
+        key = (name.strip().lower(), tagline.strip().lower())
+        requested.setdefault(key, []).append(name + "#" + tagline)
+    return requested
@@ -0,0 +1,191 @@
+"""
+A local stand-in for a Redis server, so the shared cache backend (CACHE_BACKEND=redis://..., see backends.py) can be
+tried and benchmarked without installing Redis. It speaks the Redis protocol, but only has the commands that
+GameAPI uses (GET, SET, DEL, INCRBY, EXPIRE, MULTI/EXEC and a few for clients and tests), and keeps everything in memory.
+
+Example, with two GameAPI workers sharing one cache and one rate limit budget:
+    python bench/mock_redis.py --port 6380
+    CACHE_BACKEND=redis://127.0.0.1:6380/0 gunicorn -w 2 game_api:app
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class Store:
+    """The keys of the stand-in server, each with an optional expiry time"""
+
+    def __init__(self, latency=0.0):
+        """
+        Args:
+            latency (float): Milliseconds every command is delayed by, to act like a server on another machine
+        """
+        self.latency = latency
+        self.data = {}    # key -> [value, expiry time or None]
+        self.commands = 0
+        self._lock = threading.RLock()    # Held across a whole transaction, see run_all
+
+    def _live(self, key, now):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self.data[key]
+            return None
+        return entry
+
+    def run(self, args):
+        """Run one command
+
+        Args:
+            args (list): The command name and its arguments, as bytes
+
+        Returns:
+            The reply: None, an int, bytes, a str for a status ("OK"), or an Exception for an error
+        """
+        if self.latency > 0:
+            time.sleep(self.latency / 1000)
+        name = args[0].decode().upper()
+        with self._lock:
+            self.commands += 1
+            now = time.monotonic()
+            if name == "PING":
+                return "PONG"
+            if name == "HELLO":
+                return ValueError("NOPROTO this server only speaks RESP2")
+            if name in ("CLIENT", "SELECT"):
+                return "OK"
+            if name in ("FLUSHDB", "FLUSHALL"):
+                self.data.clear()
+                return "OK"
+            if name == "DBSIZE":
+                return sum(1 for key in list(self.data) if self._live(key, now) is not None)
+            if name == "GET":
+                entry = self._live(args[1], now)
+                return None if entry is None else entry[0]
+            if name == "SET":
+                expiry = None
+                options = [arg.decode().upper() for arg in args[3:]]
+                for i, option in enumerate(options):
+                    if option == "EX":
+                        expiry = now + int(options[i + 1])
+                    elif option == "PX":
+                        expiry = now + int(options[i + 1]) / 1000
+                if "NX" in options and self._live(args[1], now) is not None:
+                    return None
+                self.data[args[1]] = [args[2], expiry]
+                return "OK"
+            if name == "DEL":
+                return sum(1 for key in args[1:] if self._live(key, now) is not None and self.data.pop(key))
+            if name in ("INCR", "INCRBY"):
+                entry = self._live(args[1], now)
+                if entry is None:
+                    entry = [b"0", None]
+                    self.data[args[1]] = entry
+                try:
+                    value = int(entry[0]) + (int(args[2]) if name == "INCRBY" else 1)
+                except ValueError:
+                    return ValueError("ERR value is not an integer or out of range")
+                entry[0] = str(value).encode()
+                return value
+            if name in ("EXPIRE", "PEXPIRE"):
+                entry = self._live(args[1], now)
+                if entry is None:
+                    return 0
+                entry[1] = now + int(args[2]) / (1 if name == "EXPIRE" else 1000)
+                return 1
+            if name in ("TTL", "PTTL"):
+                entry = self._live(args[1], now)
+                if entry is None:
+                    return -2
+                if entry[1] is None:
+                    return -1
+                return int((entry[1] - now) * (1 if name == "TTL" else 1000))
+        return ValueError("ERR unknown command '" + name + "'")
+
+
+    def run_all(self, commands):
+        """Run the commands of a MULTI/EXEC transaction, with no other client's commands in between
+
+        Returns:
+            list: The reply of each command
+        """
+        with self._lock:
+            return [self.run(args) for args in commands]
+
+
+def encode_reply(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, list):
+        return b"*" + str(len(reply)).encode() + b"\r\n" + b"".join(encode_reply(item) for item in reply)
+    if isinstance(reply, Exception):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":" + str(reply).encode() + b"\r\n"
+    return b"$" + str(len(reply)).encode() + b"\r\n" + reply + b"\r\n"
+
+
+def read_command(stream):
+    """Read one command sent by a client, None when the client has disconnected"""
+    line = stream.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()    # Inline command, as typed into telnet
+    args = []
+    for _ in range(int(line[1:])):
+        size = int(stream.readline()[1:])
+        args.append(stream.read(size + 2)[:-2])
+    return args
+
+
+def make_server(store, host="127.0.0.1", port=0):
+    """Build the server for a Store, port 0 picks a free port (see server.server_address)"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            queued = None    # The commands of an open MULTI transaction
+            while True:
+                args = read_command(self.rfile)
+                if args is None:
+                    return
+                if not args:
+                    continue
+                name = args[0].decode().upper()
+                if name == "MULTI":
+                    queued = []
+                    reply = "OK"
+                elif name == "EXEC":
+                    reply = ValueError("ERR EXEC without MULTI") if queued is None else store.run_all(queued)
+                    queued = None
+                elif name == "DISCARD":
+                    reply = ValueError("ERR DISCARD without MULTI") if queued is None else "OK"
+                    queued = None
+                elif queued is not None:
+                    queued.append(args)
+                    reply = "QUEUED"
+                else:
+                    reply = store.run(args)
+                self.wfile.write(encode_reply(reply))
+                self.wfile.flush()
+
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for a Redis server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds added to every command")
+    args = parser.parse_args()
+    server = make_server(Store(args.latency), args.host, args.port)
+    print("Redis stand-in on redis://%s:%d/0" % server.server_address)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+A local stand-in for the Riot API, for benchmarking GameAPI without a network or a real key. It serves the recorded
+responses in bench/payloads (account, summoner, league, mastery, match-v5 and tft match-v1), with a made up player
+and match history behind every Riot ID, and can add latency, jitter, 429 responses and real rate limit headers.
+Match timelines are made up from the match, with as many filler events as a real one so they are as large, and every
+ranked ladder has LADDER_SIZES made up players (see ladder.py), whose LP moves each time ladder_shift is increased.
+
+Point GameAPI at it with RIOT_API_OVERRIDE, for example:
+    python bench/mock_riot.py --port 8089 --latency 40 --jitter 20
+    RIOT_API_OVERRIDE=http://127.0.0.1:8089 RIOT_KEY=x TFT_KEY=x python game_api.py
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+# Every player has this many matches in each game, newest first, one every half hour before HISTORY_END
+HISTORY_LENGTH = 500
+HISTORY_END = 1700000000
+# Match IDs are NA1_<player number * MATCH_ID_BASE + match number>, so a match ID tells us whose history it is from
+MATCH_ID_BASE = 100000
+# Events in each minute of a made up timeline, a real one has around this many (wards, items, skill level ups...)
+TIMELINE_EVENTS = 60
+# Players in each division of a made up ladder, and in each apex league. Riot sends division entries in pages of 205
+LADDER_SIZES = {"division": 1000, "MASTER": 2000, "GRANDMASTER": 700, "CHALLENGER": 300}
+LADDER_PAGE = 205
+
+
+def make_puuid(name, tagline):
+    """A 78 character PUUID that is always the same for a Riot ID, like the real ones"""
+    digest = hashlib.sha256((name.lower() + "#" + tagline.lower()).encode()).hexdigest()
+    return (digest + digest)[:78]
+
+
+class Window:
+    """One rate limit window, counting calls the way Riot does"""
+
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.calls = deque()
+
+    def hit(self, now):
+        """Count a call, returns the seconds until it would have been allowed, or 0 if it is allowed"""
+        while self.calls and self.calls[0] <= now - self.seconds:
+            self.calls.popleft()
+        if len(self.calls) >= self.limit:
+            return self.calls[0] + self.seconds - now
+        self.calls.append(now)
+        return 0
+
+    def count(self, now):
+        return sum(1 for t in self.calls if t > now - self.seconds)
+
+
+def parse_windows(header):
+    windows = []
+    for pair in (header or "").split(","):
+        if pair.strip():
+            limit, seconds = pair.split(":")
+            windows.append(Window(int(limit), int(seconds)))
+    return windows
+
+
+class MockRiot:
+    """The state of the mock server: the players it has made up, the calls it has seen, and its rate limits"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, app_limit="", method_limit="", payloads=PAYLOADS):
+        """
+        Args:
+            latency (float): Milliseconds every response is delayed by
+            jitter (float): Up to this many milliseconds are randomly added to or taken off the latency
+            error_rate (float): Share of calls that get a 429 response with Retry-After, whatever the rate limits say
+            app_limit (str): Rate limit of the key, e.g. "20:1,100:120". Calls over it get a 429. Empty for no limit
+            method_limit (str): Rate limit of each endpoint, in the same format
+            payloads (str): Directory with the recorded responses
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.app_limit = app_limit
+        self.method_limit = method_limit
+        self.payloads = {}
+        for name in ("account", "summoner", "league", "mastery", "lol_match", "tft_league", "tft_match"):
+            with open(os.path.join(payloads, name + ".json"), "r") as f:
+                self.payloads[name] = json.load(f)
+        self.ladder_shift = 0    # Added to the LP of the ladder players, so two crawls can see different ladders
+        self.players = {}    # puuid -> player number
+        self.calls = Counter()    # route -> number of calls
+        self._app_windows = parse_windows(app_limit)
+        self._method_windows = {}
+        self._lock = threading.Lock()
+        self.routes = [
+            ("account", re.compile(r"^/riot/account/v1/accounts/by-riot-id/([^/]+)/([^/]+)$"), self.account),
+            ("summoner", re.compile(r"^/lol/summoner/v4/summoners/by-puuid/([^/]+)$"), self.summoner),
+            ("league", re.compile(r"^/lol/league/v4/entries/by-puuid/([^/]+)$"), self.league),
+            ("mastery", re.compile(r"^/lol/champion-mastery/v4/champion-masteries/by-puuid/([^/]+)/top$"), self.mastery),
+            ("match-ids", re.compile(r"^/lol/match/v5/matches/by-puuid/([^/]+)/ids$"), self.match_ids),
+            ("match", re.compile(r"^/lol/match/v5/matches/([^/]+)$"), self.lol_match),
+            ("timeline", re.compile(r"^/lol/match/v5/matches/([^/]+)/timeline$"), self.lol_timeline),
+            ("tft-league", re.compile(r"^/tft/league/v1/entries/by-summoner/([^/]+)$"), self.tft_league),
+            ("tft-match-ids", re.compile(r"^/tft/match/v1/matches/by-puuid/([^/]+)/ids$"), self.match_ids),
+            ("tft-match", re.compile(r"^/tft/match/v1/matches/([^/]+)$"), self.tft_match),
+            ("league-entries", re.compile(r"^/lol/league/v4/entries/([^/]+)/([^/]+)/([^/]+)$"), self.league_entries),
+            ("apex-league", re.compile(r"^/lol/league/v4/(challenger|grandmaster|master)leagues/by-queue/([^/]+)$"), self.apex_league),
+            ("tft-league-entries", re.compile(r"^/tft/league/v1/entries/([^/]+)/([^/]+)$"), self.tft_league_entries),
+            ("tft-apex-league", re.compile(r"^/tft/league/v1/(challenger|grandmaster|master)$"), self.tft_apex_league),
+        ]
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def _player(self, puuid):
+        with self._lock:
+            if puuid not in self.players:
+                self.players[puuid] = len(self.players) + 1
+            return self.players[puuid]
+
+    def _owner(self, match_id):
+        """The PUUID of the player whose history a match ID came from, and the match's place in that history"""
+        number = int(match_id.split("_", 1)[1])
+        player, index = divmod(number, MATCH_ID_BASE)
+        with self._lock:
+            for puuid, n in self.players.items():
+                if n == player:
+                    return puuid, index
+        return None, index
+
+    def account(self, query, name, tagline):
+        ret = dict(self.payloads["account"], puuid=make_puuid(name, tagline), gameName=name, tagLine=tagline)
+        self._player(ret["puuid"])
+        return 200, ret
+
+    def summoner(self, query, puuid):
+        return 200, dict(self.payloads["summoner"], puuid=puuid, id=puuid)
+
+    def league(self, query, puuid):
+        return 200, [dict(entry, puuid=puuid, summonerId=puuid) for entry in self.payloads["league"]]
+
+    def tft_league(self, query, summoner_id):
+        return 200, [dict(entry, summonerId=summoner_id) for entry in self.payloads["tft_league"]]
+
+    def mastery(self, query, puuid):
+        count = int(query.get("count", ["3"])[0])
+        return 200, [dict(entry, puuid=puuid) for entry in self.payloads["mastery"][:count]]
+
+    def match_ids(self, query, puuid):
+        player = self._player(puuid)
+        start = int(query.get("start", ["0"])[0])
+        count = int(query.get("count", ["20"])[0])
+        start_time = int(query.get("startTime", ["0"])[0])
+        queue = query.get("queue", [None])[0]
+        ids = []
+        for index in range(HISTORY_LENGTH):
+            if HISTORY_END - index * 1800 < start_time:
+                break
+            if queue is not None and str(self._queue(index)) != queue:
+                continue
+            ids.append("NA1_" + str(player * MATCH_ID_BASE + index))
+        return 200, ids[start:start + count]
+
+    def _queue(self, index):
+        return 450 if index % 3 == 2 else 420    # Every third game is an ARAM, so queue filters have something to do
+
+    def lol_match(self, query, match_id):
+        puuid, index = self._owner(match_id)
+        if puuid is None:
+            return 404, {"status": {"message": "Data not found - match file not found", "status_code": 404}}
+        ret = copy.deepcopy(self.payloads["lol_match"])
+        ret["metadata"]["matchId"] = match_id
+        ret["metadata"]["participants"][0] = puuid
+        ret["info"]["participants"][0]["puuid"] = puuid
+        ret["info"]["gameStartTimestamp"] = (HISTORY_END - index * 1800) * 1000
+        ret["info"]["queueId"] = self._queue(index)
+        return 200, ret
+
+    def lol_timeline(self, query, match_id):
+        status, match = self.lol_match(query, match_id)
+        if status != 200:
+            return status, match
+        info = match["info"]
+        random_state = random.Random(match_id)    # The same match always gets the same timeline
+        frames = []
+        totals = {participant["participantId"]: [500, 0, 0, 0] for participant in info["participants"]}    # gold, xp, minions, monsters
+        for minute in range(info["gameDuration"] // 60 + 2):
+            participant_frames = {}
+            for participant in info["participants"]:
+                total = totals[participant["participantId"]]
+                if minute > 0:
+                    total[0] += random_state.randint(250, 450)
+                    total[1] += random_state.randint(300, 500)
+                    total[2] += random_state.randint(0, 9) if participant["teamPosition"] != "JUNGLE" else 0
+                    total[3] += random_state.randint(3, 6) if participant["teamPosition"] == "JUNGLE" else 0
+                participant_frames[str(participant["participantId"])] = {
+                    "participantId": participant["participantId"], "totalGold": total[0], "currentGold": total[0] % 1000,
+                    "xp": total[1], "level": min(total[1] // 600 + 1, 18), "minionsKilled": total[2], "jungleMinionsKilled": total[3],
+                    "position": {"x": random_state.randint(0, 14000), "y": random_state.randint(0, 14000)},
+                    "championStats": {"armor": 50, "attackDamage": 80, "health": 1200, "movementSpeed": 345},
+                    "damageStats": {"totalDamageDone": total[0] * 3, "totalDamageDoneToChampions": total[0]}
+                }
+            events = [{"type": "WARD_PLACED", "timestamp": minute * 60000 + i * 900, "creatorId": i % 10 + 1, "wardType": "YELLOW_TRINKET"}
+                      for i in range(TIMELINE_EVENTS)]
+            timestamp = min(minute * 60000, info["gameDuration"] * 1000) + (random_state.randint(0, 50) if minute else 0)
+            frames.append({"events": events, "participantFrames": participant_frames, "timestamp": timestamp})
+        return 200, {
+            "metadata": {"dataVersion": "2", "matchId": match_id, "participants": match["metadata"]["participants"]},
+            "info": {"frameInterval": 60000, "frames": frames, "gameId": info.get("gameId"),
+                     "participants": [{"participantId": p["participantId"], "puuid": p["puuid"]} for p in info["participants"]]}
+        }
+
+    def tft_match(self, query, match_id):
+        puuid, index = self._owner(match_id)
+        if puuid is None:
+            return 404, {"status": {"message": "Data not found - match file not found", "status_code": 404}}
+        ret = copy.deepcopy(self.payloads["tft_match"])
+        ret["metadata"]["match_id"] = match_id
+        # Move the player around the lobby so their placements are not all the same
+        seat = index % len(ret["metadata"]["participants"])
+        ret["metadata"]["participants"][seat] = puuid
+        ret["info"]["participants"][seat]["puuid"] = puuid
+        ret["info"]["game_datetime"] = (HISTORY_END - index * 1800) * 1000
+        return 200, ret
+
+    def _ladder(self, queue, tier, division, first, count):
+        """Made up ladder entries <first> to <first> + <count> of a division (or apex league, division "I")"""
+        entries = []
+        for i in range(first, min(first + count, LADDER_SIZES.get(tier, LADDER_SIZES["division"]))):
+            entries.append({
+                "puuid": make_puuid("Ladder-%s-%s-%d" % (tier, division, i), queue),
+                "leaguePoints": (i * 37 + self.ladder_shift * (i % 7 - 3)) % 100 + (1000 - i if tier in LADDER_SIZES else 0),
+                "rank": division, "wins": 50 + i % 40, "losses": 50 + i % 30,
+                "veteran": False, "inactive": False, "freshBlood": i % 11 == 0, "hotStreak": i % 13 == 0
+            })
+        return entries
+
+    def league_entries(self, query, queue, tier, division):
+        page = int(query.get("page", ["1"])[0])
+        entries = self._ladder(queue, tier, division, (page - 1) * LADDER_PAGE, LADDER_PAGE)
+        return 200, [dict(entry, queueType=queue, tier=tier) for entry in entries]
+
+    def tft_league_entries(self, query, tier, division):
+        return self.league_entries(query, query.get("queue", ["RANKED_TFT"])[0], tier, division)
+
+    def apex_league(self, query, tier, queue):
+        tier = tier.upper()
+        return 200, {"leagueId": "apex-" + tier.lower(), "tier": tier, "queue": queue, "name": "Mock " + tier.title(),
+                     "entries": self._ladder(queue, tier, "I", 0, LADDER_SIZES[tier])}
+
+    def tft_apex_league(self, query, tier):
+        return self.apex_league(query, tier, query.get("queue", ["RANKED_TFT"])[0])
+
+    def _rate_limit(self, route):
+        """Count a call against the rate limits
+
+        Returns:
+            tuple: (headers to send, seconds to wait if the call is over a limit, which limit it was)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if route not in self._method_windows:
+                self._method_windows[route] = parse_windows(self.method_limit)
+            method_windows = self._method_windows[route]
+            retry_after, limit_type = 0, None
+            for windows, kind in ((self._app_windows, "application"), (method_windows, "method")):
+                for window in windows:
+                    wait = window.hit(now)
+                    if wait > retry_after:
+                        retry_after, limit_type = wait, kind
+            headers = {}
+            if self._app_windows:
+                headers["X-App-Rate-Limit"] = self.app_limit
+                headers["X-App-Rate-Limit-Count"] = ",".join("%d:%d" % (w.count(now), w.seconds) for w in self._app_windows)
+            if method_windows:
+                headers["X-Method-Rate-Limit"] = self.method_limit
+                headers["X-Method-Rate-Limit-Count"] = ",".join("%d:%d" % (w.count(now), w.seconds) for w in method_windows)
+        return headers, retry_after, limit_type
+
+    def handle(self, path, query):
+        """Answer one call
+
+        Returns:
+            tuple: (status code, headers, body)
+        """
+        for route, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return 404, {}, {"status": {"message": "Resource not found", "status_code": 404}}
+        with self._lock:
+            self.calls[route] += 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        headers, retry_after, limit_type = self._rate_limit(route)
+        if retry_after > 0 or random.random() < self.error_rate:
+            headers["Retry-After"] = str(max(int(retry_after + 0.999), 1))
+            headers["X-Rate-Limit-Type"] = limit_type or "method"
+            return 429, headers, {"status": {"message": "Rate limit exceeded", "status_code": 429}}
+        status, body = handler(query, *(unquote(group) for group in match.groups()))
+        return status, headers, body
+
+
+def make_server(mock, host="127.0.0.1", port=0):
+    """Build the HTTP server for a MockRiot, port 0 picks a free port (see server.server_address)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"    # Keep connections alive, like Riot does
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            status, headers, body = mock.handle(parts.path, parse_qs(parts.query))
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json;charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Riot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many milliseconds randomly added or taken off")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of calls answered with a 429")
+    parser.add_argument("--app-limit", default="", help='rate limit of the key, e.g. "20:1,100:120"')
+    parser.add_argument("--method-limit", default="", help="rate limit of each endpoint")
+    parser.add_argument("--payloads", default=PAYLOADS, help="directory with the recorded responses")
+    args = parser.parse_args()
+    mock = MockRiot(args.latency, args.jitter, args.error_rate, args.app_limit, args.method_limit, args.payloads)
+    server = make_server(mock, args.host, args.port)
+    print("Mock Riot API on http://%s:%d" % server.server_address)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark of every GameAPI route against the mock Riot API in mock_riot.py, so a performance change can be measured
+without a network or a real key. The mock server and GameAPI are both started in this process, then each route is
+called <requests> times at <concurrency> calls at once, spread over <players> different Riot IDs.
+
+For every route it reports the throughput, the p50/p95/p99 latency, and the average number of calls that reached the
+mock Riot API per request. Example:
+    python bench/run.py --concurrency 16 --requests 200 --players 20 --latency 40 --jitter 20
+
+--cache-backend sqlite or redis runs GameAPI with a shared cache (see backends.py), redis on the stand-in in mock_redis.py.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mock_redis
+import mock_riot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every route of game_api.py, {name} and {tagline} are filled in with a different player for each call
+ROUTES = [
+    ("GET", "/league/mastery/{name}/{tagline}/5", None),
+    ("GET", "/league/rank/{name}/{tagline}/SOLO", None),
+    ("GET", "/league/matches/{name}/{tagline}/10", None),
+    ("GET", "/league/matches/{name}/{tagline}/10?stream=ndjson", None),
+    ("GET", "/league/match/{name}/{tagline}/2", None),
+    ("GET", "/league/stats/{name}/{tagline}/20", None),
+    ("GET", "/league/timeline/{name}/{tagline}/1", None),
+    ("GET", "/tft/rank/{name}/{tagline}/RANKED", None),
+    ("GET", "/tft/match/{name}/{tagline}/1", None),
+    ("GET", "/tft/matches/{name}/{tagline}/10", None),
+    ("GET", "/tft/stats/{name}/{tagline}/20", None),
+    ("GET", "/tft/comps/{name}/{tagline}/20", None),
+    ("POST", "/league/batch/rank", {"players": ["{name}#{tagline}", "Bench{other}#NA1"]}),
+    ("POST", "/tft/batch/matches", {"players": ["{name}#{tagline}", "Bench{other}#NA1"], "count": "5"}),
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def fill(value, name, tagline, other):
+    if isinstance(value, str):
+        return value.format(name=name, tagline=tagline, other=other)
+    if isinstance(value, list):
+        return [fill(item, name, tagline, other) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, name, tagline, other) for key, item in value.items()}
+    return value
+
+
+def run_route(session, base, mock, method, path, body, args):
+    """Call one route <args.requests> times and measure it
+
+    Returns:
+        dict: The route's results
+    """
+    latencies = []
+    failures = 0
+
+    def call(i):
+        player = i % args.players
+        name, tagline, other = "Bench" + str(player), "NA1", str((player + 1) % args.players)
+        url = base + fill(path, name, tagline, other)
+        started = time.perf_counter()
+        if method == "POST":
+            response = session.post(url, json=fill(body, name, tagline, other), timeout=60)
+        else:
+            response = session.get(url, timeout=60)
+        response.content    # Read the whole body, streamed responses included
+        return time.perf_counter() - started, response.status_code
+
+    mock.reset_counts()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for seconds, status in pool.map(call, range(args.requests)):
+            latencies.append(seconds)
+            if status >= 400:
+                failures += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "route": method + " " + path,
+        "requests": args.requests,
+        "failures": failures,
+        "req_per_s": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "upstream_per_request": round(mock.total_calls() / args.requests, 2),
+        "upstream_by_route": dict(mock.calls)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every GameAPI route against a mock Riot API")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls sent at once")
+    parser.add_argument("--requests", type=int, default=100, help="calls per route")
+    parser.add_argument("--players", type=int, default=10, help="different Riot IDs the calls are spread over")
+    parser.add_argument("--latency", type=float, default=30, help="milliseconds of mock Riot latency")
+    parser.add_argument("--jitter", type=float, default=10, help="milliseconds of mock Riot jitter")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of mock Riot calls answered with a 429")
+    parser.add_argument("--app-limit", default="", help='rate limit of the mock key, e.g. "500:10,30000:600"')
+    parser.add_argument("--method-limit", default="", help="rate limit of each mock endpoint")
+    parser.add_argument("--cache-backend", choices=["memory", "sqlite", "redis"], default="memory", help="where GameAPI keeps its caches")
+    parser.add_argument("--route", action="append", help="only run routes that contain this text (can be repeated)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON instead of a table")
+    args = parser.parse_args()
+
+    mock = mock_riot.MockRiot(args.latency, args.jitter, args.error_rate, args.app_limit, args.method_limit)
+    mock_server = mock_riot.make_server(mock)
+    threading.Thread(target=mock_server.serve_forever, daemon=True).start()
+
+    # GameAPI reads its settings when it is imported, so point it at the mock before that
+    os.environ["RIOT_API_OVERRIDE"] = "http://%s:%d" % mock_server.server_address
+    os.environ.setdefault("RIOT_KEY", "RGAPI-bench")
+    os.environ.setdefault("TFT_KEY", "RGAPI-bench")
+    os.environ.setdefault("RIOT_APP_RATE_LIMIT", args.app_limit or "100000:1")
+    os.environ.setdefault("RIOT_RETRY_BACKOFF", "0.05")
+    os.environ.setdefault("MATCH_DB_PATH", os.path.join(tempfile.mkdtemp(), "matches.sqlite3"))
+    if args.cache_backend == "sqlite":
+        os.environ["CACHE_BACKEND"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "shared.sqlite3")
+    elif args.cache_backend == "redis":
+        redis_server = mock_redis.make_server(mock_redis.Store())
+        threading.Thread(target=redis_server.serve_forever, daemon=True).start()
+        os.environ["CACHE_BACKEND"] = "redis://%s:%d/0" % redis_server.server_address
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import requests
+    from werkzeug.serving import make_server
+    import game_api
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)    # No access log line for every call
+    api_server = make_server("127.0.0.1", 0, game_api.app, threaded=True)
+    threading.Thread(target=api_server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:%d" % api_server.server_port
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    results = []
+    for method, path, body in ROUTES:
+        if args.route and not any(text in path for text in args.route):
+            continue
+        results.append(run_route(session, base, mock, method, path, body, args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print("%-55s %8s %8s %8s %8s %8s %9s" % ("route", "req/s", "p50 ms", "p95 ms", "p99 ms", "failed", "riot/req"))
+    for result in results:
+        print("%-55s %8.1f %8.1f %8.1f %8.1f %8d %9.2f" % (result["route"], result["req_per_s"], result["p50_ms"], result["p95_ms"],
+                                                         result["p99_ms"], result["failures"], result["upstream_per_request"]))
+
+
+if __name__ == "__main__":
+    main()
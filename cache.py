@@ -0,0 +1,430 @@
+"""
+This file is for caching data from the Riot API so that we do not have to ask for the same thing twice.
+Finished matches never change, so they are kept forever: a small in-memory LRU sits in front of a
+SQLite file, keyed by match ID. Only a compact record of each match (the few fields per player that we use)
+is kept, not the full Riot response.
+Player identities (Riot ID -> PUUID -> encrypted summoner ID) almost never change either, so they are
+kept in memory for a configurable amount of time, along with short-lived entries for names that do not exist.
+Requests for the same thing that arrive while it is still being fetched share that one fetch (see SingleFlight).
+Whole endpoint results (ranks, match history) can change, so they are only kept for a short time (see ResponseCache).
+Each worker process keeps these caches in its own memory, unless a shared store is set up with CACHE_BACKEND (see
+backends.py), in which case every worker uses that one.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import backends
+import metrics
+try:
+    import orjson    # Parses the large match responses several times faster than the json module, used when installed
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Number of matches kept in memory (per game), on top of the ones stored on disk
+MATCH_CACHE_SIZE = int(os.environ.get('MATCH_CACHE_SIZE', '512'))
+# SQLite file that stores every match we have downloaded
+MATCH_DB_PATH = os.environ.get('MATCH_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'matches.sqlite3'))
+# Number of identities (PUUIDs and summoner IDs) kept in memory
+IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', '10000'))
+# Seconds that a PUUID or summoner ID is trusted before we ask Riot again
+IDENTITY_TTL = int(os.environ.get('IDENTITY_TTL', '86400'))
+# Seconds that we remember a Riot ID does not exist, short so that new or renamed accounts show up quickly
+IDENTITY_NEGATIVE_TTL = int(os.environ.get('IDENTITY_NEGATIVE_TTL', '60'))
+# Number of endpoint results kept in memory, and the number of threads that refresh stale ones in the background
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '5000'))
+RESPONSE_REFRESH_WORKERS = int(os.environ.get('RESPONSE_REFRESH_WORKERS', '4'))
+
+
+class LRUCache:
+    """A thread-safe dictionary that holds at most <max_size> items, dropping the least recently used one when full"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MemoryStore:
+    """The store a cache uses when there is no shared one: an LRUCache in this process, where each item can expire
+        after a number of seconds. Has the same methods as the shared stores in backends.py"""
+
+    def __init__(self, max_size):
+        self._data = LRUCache(max_size)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+            return None
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        self._data.set(key, (value, None if ttl is None else time.monotonic() + ttl))
+
+    def delete(self, key):
+        self._data.set(key, (None, 0))
+
+    def __len__(self):
+        return len(self._data)
+
+
+def open_store(name, max_size):
+    """Get the store for one cache: its part of the shared store if CACHE_BACKEND sets one, otherwise its own MemoryStore
+
+    Args:
+        name (str): The name of the cache, which keeps its keys apart from the other caches in a shared store
+        max_size (int): The number of items kept when it is in memory. A shared store decides that for itself
+
+    Returns:
+        MemoryStore or backends.Namespace: The store
+    """
+    shared = backends.shared()
+    if shared is None:
+        return MemoryStore(max_size)
+    return backends.Namespace(shared, name)
+
+
+async def off_loop(func, *args):
+    """Call func(*args) from a coroutine, when func may use the shared store. With a shared store (CACHE_BACKEND) that
+        can mean waiting on a Redis server or on a SQLite file another worker is writing, so func runs in a thread
+        instead of holding up every other request on the event loop. Without one the caches are in memory, and func is
+        called right away"""
+    if backends.shared() is None:
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+class TTLCache:
+    """A thread-safe dictionary that holds at most <max_size> items, each of which expires after a number of seconds"""
+
+    def __init__(self, max_size, ttl, name=None, store=None):
+        """
+        Args:
+            max_size (int): The number of items kept
+            ttl (int): Seconds that an item is kept, unless set says otherwise
+            name (str): Lookups are counted in the cache metrics under this name, if there is one
+            store (MemoryStore or backends.Namespace): Where the items are kept, see open_store. Defaults to this process's memory
+        """
+        self.ttl = ttl
+        self.name = name
+        self._data = store if store is not None else MemoryStore(max_size)
+
+    def get(self, key, default=None):
+        value = self._data.get(key)
+        if value is None:
+            if self.name:
+                metrics.cache_lookup(self.name, "miss")
+            return default
+        if self.name:
+            metrics.cache_lookup(self.name, "hit")
+        return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        self._data.set(key, value, ttl)
+
+
+class MatchStore:
+    """Permanent store of compact match records for one game (league or tft), keyed by match ID"""
+
+    def __init__(self, game, compact, path=MATCH_DB_PATH, memory_size=MATCH_CACHE_SIZE, shared=None):
+        """
+        Args:
+            game (str): The game the matches are from ("league" or "tft")
+            compact (function): compact(data) turns the match JSON from the Riot API into the record that is stored
+            path (str): The SQLite file the records are saved in, when there is no shared store
+            memory_size (int): The number of records also kept in memory
+            shared (backends.Namespace): Shared store to keep the records in instead of the SQLite file. Defaults to
+                                            the one set with CACHE_BACKEND, if any
+        """
+        self.game = game
+        self.compact = compact
+        self.path = path
+        self.memory = LRUCache(memory_size)
+        if shared is None and backends.shared() is not None:
+            shared = backends.Namespace(backends.shared(), "match-" + game)
+        self.shared = shared
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened on first use so that importing this file never touches the disk
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS match_records (game TEXT, match_id TEXT, data BLOB, PRIMARY KEY (game, match_id))")
+            self._migrate()
+            self._db.commit()
+        return self._db
+
+    def _migrate(self):
+        """Move the matches of this game out of the matches table of older versions, which kept the whole Riot
+            response of every match, into compact records. The table is dropped once every game has moved its
+            matches out, which gives back most of the space they took"""
+        db = self._db
+        if db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'matches'").fetchone() is None:
+            return
+        # One row at a time, a store from before could hold thousands of full responses
+        for match_id, data in db.cursor().execute("SELECT match_id, data FROM matches WHERE game = ?", (self.game,)):
+            try:
+                record = self.compact(loads(zlib.decompress(data)))
+            except Exception:
+                continue    # It is downloaded again the next time it is asked for
+            db.execute("INSERT OR IGNORE INTO match_records (game, match_id, data) VALUES (?, ?, ?)",
+                       (self.game, match_id, zlib.compress(json.dumps(record, separators=(",", ":")).encode())))
+        db.execute("DELETE FROM matches WHERE game = ?", (self.game,))
+        if db.execute("SELECT 1 FROM matches LIMIT 1").fetchone() is None:
+            db.execute("DROP TABLE matches")
+
+    def get(self, match_id):
+        """Look up a match that we have already downloaded
+
+        Args:
+            match_id (str): Unique ID of the requested match
+
+        Returns:
+            dict: The compact record of the match, or None if we have never stored this match
+        """
+        record = self.memory.get(match_id)
+        if record is not None:
+            metrics.cache_lookup("match-" + self.game, "hit")
+            return record
+        if self.shared is not None:
+            record = self.shared.get(match_id)
+        else:
+            with self._lock:
+                row = self._connect().execute("SELECT data FROM match_records WHERE game = ? AND match_id = ?", (self.game, match_id)).fetchone()
+            if row is not None:
+                record = loads(zlib.decompress(row[0]))
+        if record is None:
+            metrics.cache_lookup("match-" + self.game, "miss")
+            return None
+        metrics.cache_lookup("match-" + self.game, "disk")
+        self.memory.set(match_id, record)
+        return record
+
+    def put(self, match_id, raw):
+        """Store a match downloaded from the Riot API
+
+        Args:
+            match_id (str): Unique ID of the match
+            raw (bytes): The body of the Riot API response for this match
+
+        Returns:
+            dict: The compact record of the match
+        """
+        return self.put_record(match_id, self.compact(loads(raw)))
+
+    def put_record(self, match_id, record):
+        """Store a record that is already compact, for responses that were parsed while they were downloaded
+
+        Args:
+            match_id (str): Unique ID of the match
+            record (dict): The compact record of the match
+
+        Returns:
+            dict: The same record
+        """
+        self.memory.set(match_id, record)
+        if self.shared is not None:
+            self.shared.set(match_id, record)
+            return record
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO match_records (game, match_id, data) VALUES (?, ?, ?)",
+                       (self.game, match_id, zlib.compress(json.dumps(record, separators=(",", ":")).encode())))
+            db.commit()
+        return record
+
+
+class SingleFlight:
+    """Makes concurrent calls with the same key share one run of the function: the first caller runs it, and
+        everyone who asks for the same key before it finishes waits for that result instead of running it again"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Run func(), or wait for the run that is already in flight for <key>
+
+        Args:
+            key (hashable): What is being fetched, calls with equal keys are shared
+            func (function): Takes no arguments and returns the result
+
+        Returns:
+            The return value of func(). If it raised an exception, every waiter gets that exception
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._Call()
+                self._calls[key] = call
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        """Await func(), or the run that is already in flight for <key>, see SingleFlight.do. The run is a task of its
+            own, so a caller that is cancelled (e.g. its client disconnected) stops waiting without cancelling it for
+            everyone else who shares it"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._finished(key, task))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()    # Mark it as retrieved, so there is no warning when every caller had stopped waiting
+
+
+class ResponseCache:
+    """Short-lived cache of endpoint results with stale-while-revalidate. An entry is fresh for <ttl> seconds and is
+        returned as is. For <stale> seconds after that it is still returned right away, but a refresh is started in the
+        background so the next caller gets a new result. After that it is fetched again while the caller waits"""
+
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, refresh_workers=RESPONSE_REFRESH_WORKERS, store=None):
+        self._data = store if store is not None else open_store("response", max_size)
+        self._in_flight = SingleFlight()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers)
+
+    def _fetch(self, key, func, keep):
+        def run():
+            value, cacheable = func()
+            if cacheable:
+                self._data.set(key, (value, time.time()), keep)
+            return value
+        return self._in_flight.do(key, run)
+
+    def _refresh(self, key, func, keep):
+        try:
+            self._fetch(key, func, keep)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key, func, ttl, stale):
+        """Get the cached result for <key>, calling func() when there is none or it is too old
+
+        Args:
+            key (hashable): What is being fetched, usually the request path
+            func (function): Takes no arguments and returns (value, cacheable). Values that are not cacheable (e.g. an
+                                empty answer because Riot was rate limiting us) are returned but not stored
+            ttl (int): Seconds that a result is fresh
+            stale (int): Seconds after that during which the old result is still returned while a new one is fetched
+
+        Returns:
+            tuple: (value, age) where age is the number of seconds since the value was fetched
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < ttl:
+                metrics.cache_lookup("response", "hit")
+                return value, age
+            if age < ttl + stale:
+                metrics.cache_lookup("response", "stale")
+                with self._lock:
+                    start = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start:
+                    # Threads do not get the caller's context variables on their own, and func needs them (the
+                    # platform of the request in regions.py), or the refresh would go to the default platform
+                    context = contextvars.copy_context()
+                    self._refresher.submit(context.run, self._refresh, key, func, ttl + stale)
+                return value, age
+        metrics.cache_lookup("response", "miss")
+        return self._fetch(key, func, ttl + stale), 0
+
+    def refresh(self, key, func, min_age=0, keep=None):
+        """Fetch <key> again and store it, unless the stored result is younger than <min_age> seconds. Used to keep
+            results warm before anyone asks for them. func runs on the calling thread, with the caller's context variables
+
+        Args:
+            key (hashable): What is being fetched
+            func (function): Takes no arguments and returns (value, cacheable), see get
+            min_age (int): Seconds below which the stored result is left as it is
+            keep (int): Seconds that the new result is kept, None to keep it until it is pushed out
+        """
+        entry = self._data.get(key)
+        if entry is None or time.time() - entry[1] >= min_age:
+            self._fetch(key, func, keep)
+
+
+IDENTITIES = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_TTL, "identity", open_store("identity", IDENTITY_CACHE_SIZE))
+
+
+def riot_id_key(game, summoner_name, tagline, key_name=None):
+    """Build the IDENTITIES key for a Riot ID. Riot IDs are not case sensitive, so "Name#NA1" and "name#na1" are the same player.
+        PUUIDs are encrypted differently for each API key, so the game and the key that was used are part of the key
+
+    Args:
+        game (str): The game module doing the lookup ("league" or "tft")
+        summoner_name (str): The name part of the Riot ID
+        tagline (str): The tagline part of the Riot ID
+        key_name (str): The API key used for the lookup, as given by riot_client.key_name
+
+    Returns:
+        tuple: The cache key
+    """
+    return ("puuid", game, key_name, summoner_name.strip().lower(), tagline.strip().lower())
@@ -1,54 +1,270 @@
+import hashlib
 import json
+import os
+import time
+import requests
+import batches
+import cache
+import metrics
+import prefetch
+import regions
 import riot
+import riot_client
 import tft
-from flask import Flask, jsonify
+import workers
+from flask import Flask, g, jsonify, request, stream_with_context
 
 app = Flask(__name__)
 
+# Identical requests that arrive while one is still waiting on Riot share its result
+IN_FLIGHT = cache.SingleFlight()
+
+
+def shared(func, *args):
+    """Run func(*args) for the current request, or share the result of an identical request that is already running
+        (e.g. dozens of people looking up the same streamer at once)"""
+    return IN_FLIGHT.do(request.full_path, lambda: func(*args))
+
+
+# Seconds that rank and match history results are served from memory before they are fetched again
+RANK_CACHE_TTL = int(os.environ.get('RANK_CACHE_TTL', '120'))
+MATCHES_CACHE_TTL = int(os.environ.get('MATCHES_CACHE_TTL', '60'))
+# Seconds after that during which the old result is still served while a new one is fetched in the background
+RESPONSE_STALE_TTL = int(os.environ.get('RESPONSE_STALE_TTL', '300'))
+RESPONSES = cache.ResponseCache()
+
+
+def cached(ttl, func, *args):
+    """Serve func(*args) for the current request from the response cache, with ETag and Cache-Control headers.
+        A client that sends back the ETag it already has gets an empty 304 response if nothing changed
+
+    Args:
+        ttl (int): Seconds that the result is fresh
+        func (function): The riot or tft method that gets the result
+        *args: The arguments for func
+
+    Returns:
+        flask.Response: The JSON response, the same body that jsonify would make
+    """
+    def fetch():
+        # A result that Riot failed to answer part of is served once but not kept, see riot_client.cacheable
+        value, complete = riot_client.cacheable(func, *args)
+        body = app.json.dumps(value) + "\n"
+        return (body, hashlib.sha1(body.encode()).hexdigest()), complete
+
+    if g.get("prefetch"):
+        # The prefetch thread only refreshes results that are half way to going stale, nobody reads this response
+        RESPONSES.refresh(request.full_path, fetch, ttl / 2, ttl + RESPONSE_STALE_TTL)
+        return app.response_class(status=204)
+    (body, etag), age = RESPONSES.get(request.full_path, fetch, ttl, RESPONSE_STALE_TTL)
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, max-age=%d, stale-while-revalidate=%d" % (max(ttl - age, 0), RESPONSE_STALE_TTL)
+    return response.make_conditional(request)
+
+
+def warm(path):
+    """Refresh the cached response of an API path as if a client had asked for it, used by the prefetch thread"""
+    with app.test_request_context(path):
+        g.prefetch = True
+        app.full_dispatch_request()
+
+
+# Keeps the players in the watchlist (and optionally the most looked up ones) cached, see prefetch.py
+PREFETCH = prefetch.Prefetcher(warm, riot_client.app_headroom, prefetch.load_watchlist())
+
+
+@app.before_request
+def count_lookup():
+    """Count every lookup of a player, so the prefetch thread refreshes the most requested players first"""
+    args = request.view_args or {}
+    if "summoner" in args and "tagline" in args and not g.get("prefetch"):
+        PREFETCH.seen(args["summoner"], args["tagline"], request.args.get('platform', ''))
+
+@app.before_request
+def start_timing():
+    metrics.start_request()
+
+
+@app.before_request
+def select_platform():
+    """Send the Riot calls of this request to the platform in ?platform= (e.g. euw1 or euw), or the default one"""
+    try:
+        regions.PLATFORM.set(regions.parse_platform(request.args.get('platform')))
+    except ValueError:
+        return jsonify({'error': 'Invalid platform'}), 400
+
+
+@app.after_request
+def record_timing(response):
+    """Count the time taken by every request in the latency histograms, and add the Server-Timing header if it is turned on"""
+    timing = metrics.CURRENT.get()
+    if timing is not None and not g.get("prefetch"):
+        route = request.url_rule.rule if request.url_rule is not None else "unknown"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - timing.started, route, request.method, str(response.status_code))
+        if metrics.SERVER_TIMING:
+            response.headers["Server-Timing"] = timing.header()
+    return response
+
 # TODO: Create methods and API routes for each of the game stats we want to obtain
 
 @app.route('/league/mastery/<summoner>/<tagline>/<count>')
 @app.route('/league/mastery/<summoner>/<tagline>')
 def league_mastery(summoner, tagline, count="5"):
-    print(count)
-    champions = riot.get_top_champs(summoner, tagline, count)
+    champions = shared(riot.get_top_champs, summoner, tagline, count)
     return jsonify(champions)
 
 
 @app.route('/league/rank/<summoner>/<tagline>/<league>')
 def league_rank(summoner, tagline, league="SOLO"):
-    rank = riot.get_summoner_rank(summoner, tagline, league)
-    return jsonify(rank)
+    return cached(RANK_CACHE_TTL, riot.get_summoner_rank, summoner, tagline, league)
 
 
 @app.route('/league/matches/<summoner>/<tagline>/<count>')
 @app.route('/league/matches/<summoner>/<tagline>')
 def league_matches(summoner, tagline,  count="5"):
-    matches = riot.get_matches(summoner, tagline, count)
-    return jsonify(matches)
+    # ?queue=420 only counts matches from that queue
+    queue = request.args.get('queue')
+    if request.args.get('stream') == 'ndjson':
+        # One line per match as soon as it is ready, so clients can start showing matches before the last one arrives
+        # The summoner and match IDs are looked up here, so Riot being down still gets the 504 below
+        matches = riot.iter_matches(summoner, tagline, count, "1", queue)
+
+        def generate():
+            for i, match in matches:
+                yield app.json.dumps(dict(match, index=i)) + "\n"
+
+        return app.response_class(stream_with_context(generate()), mimetype="application/x-ndjson")
+    return cached(MATCHES_CACHE_TTL, riot.get_matches, summoner, tagline, count, "1", queue)
 
 @app.route('/league/match/<summoner>/<tagline>/<start>')
 @app.route('/league/match/<summoner>/<tagline>')
 def league_one_match(summoner, tagline, start="1"):
-    match = riot.get_matches(summoner, tagline, count="1", start=start)
-    return jsonify(match)
+    return cached(MATCHES_CACHE_TTL, riot.get_matches, summoner, tagline, "1", start)
+
+@app.route('/league/timeline/<summoner>/<tagline>/<start>')
+@app.route('/league/timeline/<summoner>/<tagline>')
+def league_timeline(summoner, tagline, start="1"):
+    return cached(MATCHES_CACHE_TTL, riot.get_timeline, summoner, tagline, start)
+
+@app.route('/league/stats/<summoner>/<tagline>/<count>')
+@app.route('/league/stats/<summoner>/<tagline>')
+def league_stats(summoner, tagline, count="20"):
+    # ?queue=420 only counts matches from that queue
+    return cached(MATCHES_CACHE_TTL, riot.get_match_stats, summoner, tagline, count, request.args.get('queue'))
 
 @app.route('/tft/rank/<summoner>/<tagline>/<league>')
 def tft_rank(summoner, tagline, league='RANKED'):
-    rank = tft.get_tft_rank(summoner, tagline, league)
-    return jsonify(rank)
+    return cached(RANK_CACHE_TTL, tft.get_tft_rank, summoner, tagline, league)
 
 @app.route('/tft/match/<summoner>/<tagline>/<start>')
 @app.route('/tft/match/<summoner>/<tagline>')
 def tft_match(summoner, tagline, start="1"):
-    match = tft.get_match(summoner, tagline, count="1", start=start)
-    return jsonify(match)
+    return cached(MATCHES_CACHE_TTL, tft.get_match, summoner, tagline, "1", start)
 
 @app.route('/tft/matches/<summoner>/<tagline>/<count>')
 @app.route('/tft/matches/<summoner>/<tagline>')
 def tft_matches(summoner, tagline, count="10"):
-    matches = tft.get_recents(summoner, tagline, count)
-    return jsonify(matches)
+    return cached(MATCHES_CACHE_TTL, tft.get_recents, summoner, tagline, count)
+
+@app.route('/tft/stats/<summoner>/<tagline>/<count>')
+@app.route('/tft/stats/<summoner>/<tagline>')
+def tft_stats(summoner, tagline, count="20"):
+    return cached(MATCHES_CACHE_TTL, tft.get_match_stats, summoner, tagline, count)
+
+@app.route('/tft/comps/<summoner>/<tagline>/<count>')
+@app.route('/tft/comps/<summoner>/<tagline>')
+def tft_comps(summoner, tagline, count="20"):
+    return cached(MATCHES_CACHE_TTL, tft.get_comps, summoner, tagline, count)
+
+def batch(body, func, *args):
+    """Run func(summoner, tagline, *args) for every player in the JSON body of the current request, in parallel.
+        See batches.read_players for what the body looks like
+
+    Args:
+        body (dict): The decoded JSON body of the request
+        func (function): The riot or tft method to call for each player
+        *args: The arguments that come after the summoner name and tagline
+
+    Returns:
+        flask.Response: Newline-delimited JSON, one {"player": "name#tagline", "result": ...} line per player (or
+            {"player": ..., "error": reason} if that player failed), streamed in the order the players finish
+    """
+    requested = batches.read_players(body)
+    if requested is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    unique = list(requested)
+
+    def run(key):
+        name, tagline = requested[key][0].split("#", 1)
+        try:
+            return {"result": func(name, tagline, *args)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def generate():
+        for i, result in workers.imap_unordered(run, unique, batches.BATCH_WORKERS):
+            for player in requested[unique[i]]:
+                yield app.json.dumps(dict({"player": player}, **result)) + "\n"
+
+    return app.response_class(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def batch_body():
+    """The JSON body of the current batch request, or None if it is not a JSON object"""
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else None
+
+
+@app.route('/league/batch/rank', methods=['POST'])
+def league_batch_rank():
+    body = batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return batch(body, riot.get_summoner_rank, str(body.get("league", "SOLO")))
+
+@app.route('/league/batch/mastery', methods=['POST'])
+def league_batch_mastery():
+    body = batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return batch(body, riot.get_top_champs, str(body.get("count", "5")))
+
+@app.route('/tft/batch/rank', methods=['POST'])
+def tft_batch_rank():
+    body = batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return batch(body, tft.get_tft_rank, str(body.get("league", "RANKED")))
+
+@app.route('/tft/batch/matches', methods=['POST'])
+def tft_batch_matches():
+    body = batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return batch(body, tft.get_recents, str(body.get("count", "10")))
+
+@app.route('/tft/batch/comps', methods=['POST'])
+def tft_batch_comps():
+    body = batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return batch(body, tft.get_comps, str(body.get("count", "20")))
+
+# How much of each Riot rate limit is currently used, per API key, host and endpoint
+@app.route('/status/limits')
+def rate_limits():
+    return jsonify(riot_client.rate_limit_status())
+
+# Timings, status codes, retries and cache hits in the Prometheus text format, see metrics.py
+@app.route('/metrics')
+def prometheus_metrics():
+    return app.response_class(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Riot could not be reached, or did not answer in time (see riot_client.py for the timeouts)
+@app.errorhandler(requests.exceptions.RequestException)
+def riot_unavailable(error):
+    return jsonify({'error': 'Riot API unavailable'}), 504
 
 # Define API route to handle unknown requests
 @app.route('/', defaults={'path': ''})
@@ -56,6 +272,8 @@ def tft_matches(summoner, tagline, count="10"):
 def catch_all(path):
     return jsonify({'error': 'Invalid request'})
 
+PREFETCH.start()
+
 # Run Flask app
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Async (ASGI) version of game_api.py. The routes and the JSON they return are the same, but every handler is a
+coroutine and every Riot API call is awaited on an async HTTP client (see riot_async.py and tft_async.py), so one
+process can hold hundreds of requests that are waiting on Riot instead of one per thread.
+
+Run it with any ASGI server, for example:
+    hypercorn game_api_async:app --bind 0.0.0.0:5000
+"""
+import time
+import batches
+import cache
+import httpx
+import metrics
+import regions
+import riot_async
+import riot_client
+import tft_async
+import workers
+from quart import Quart, jsonify, request, stream_with_context
+
+app = Quart(__name__)
+
+# Identical requests that arrive while one is still waiting on Riot share its result
+IN_FLIGHT = cache.AsyncSingleFlight()
+
+
+async def shared(func, *args):
+    """Await func(*args) for the current request, or the result of an identical request that is already running"""
+    return await IN_FLIGHT.do(request.full_path, lambda: func(*args))
+
+
+@app.before_request
+async def start_timing():
+    metrics.start_request()
+
+
+@app.before_request
+async def select_platform():
+    """Async version of game_api.select_platform"""
+    try:
+        regions.PLATFORM.set(regions.parse_platform(request.args.get('platform')))
+    except ValueError:
+        return jsonify({'error': 'Invalid platform'}), 400
+
+
+@app.after_request
+async def record_timing(response):
+    """Async version of game_api.record_timing"""
+    timing = metrics.CURRENT.get()
+    if timing is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unknown"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - timing.started, route, request.method, str(response.status_code))
+        if metrics.SERVER_TIMING:
+            response.headers["Server-Timing"] = timing.header()
+    return response
+
+
+@app.route('/league/mastery/<summoner>/<tagline>/<count>')
+@app.route('/league/mastery/<summoner>/<tagline>')
+async def league_mastery(summoner, tagline, count="5"):
+    champions = await shared(riot_async.get_top_champs, summoner, tagline, count)
+    return jsonify(champions)
+
+
+@app.route('/league/rank/<summoner>/<tagline>/<league>')
+async def league_rank(summoner, tagline, league="SOLO"):
+    rank = await shared(riot_async.get_summoner_rank, summoner, tagline, league)
+    return jsonify(rank)
+
+
+@app.route('/league/matches/<summoner>/<tagline>/<count>')
+@app.route('/league/matches/<summoner>/<tagline>')
+async def league_matches(summoner, tagline,  count="5"):
+    # ?queue=420 only counts matches from that queue
+    queue = request.args.get('queue')
+    if request.args.get('stream') == 'ndjson':
+        matches = await riot_async.iter_matches(summoner, tagline, count, "1", queue)
+
+        @stream_with_context
+        async def generate():
+            async for i, match in matches:
+                yield app.json.dumps(dict(match, index=i)) + "\n"
+
+        return app.response_class(generate(), mimetype="application/x-ndjson")
+    matches = await shared(riot_async.get_matches, summoner, tagline, count, "1", queue)
+    return jsonify(matches)
+
+@app.route('/league/match/<summoner>/<tagline>/<start>')
+@app.route('/league/match/<summoner>/<tagline>')
+async def league_one_match(summoner, tagline, start="1"):
+    match = await shared(riot_async.get_matches, summoner, tagline, "1", start)
+    return jsonify(match)
+
+@app.route('/league/timeline/<summoner>/<tagline>/<start>')
+@app.route('/league/timeline/<summoner>/<tagline>')
+async def league_timeline(summoner, tagline, start="1"):
+    timeline = await shared(riot_async.get_timeline, summoner, tagline, start)
+    return jsonify(timeline)
+
+@app.route('/league/stats/<summoner>/<tagline>/<count>')
+@app.route('/league/stats/<summoner>/<tagline>')
+async def league_stats(summoner, tagline, count="20"):
+    # ?queue=420 only counts matches from that queue
+    stats = await shared(riot_async.get_match_stats, summoner, tagline, count, request.args.get('queue'))
+    return jsonify(stats)
+
+@app.route('/tft/rank/<summoner>/<tagline>/<league>')
+async def tft_rank(summoner, tagline, league='RANKED'):
+    rank = await shared(tft_async.get_tft_rank, summoner, tagline, league)
+    return jsonify(rank)
+
+@app.route('/tft/match/<summoner>/<tagline>/<start>')
+@app.route('/tft/match/<summoner>/<tagline>')
+async def tft_match(summoner, tagline, start="1"):
+    match = await shared(tft_async.get_match, summoner, tagline, "1", start)
+    return jsonify(match)
+
+@app.route('/tft/matches/<summoner>/<tagline>/<count>')
+@app.route('/tft/matches/<summoner>/<tagline>')
+async def tft_matches(summoner, tagline, count="10"):
+    matches = await shared(tft_async.get_recents, summoner, tagline, count)
+    return jsonify(matches)
+
+@app.route('/tft/stats/<summoner>/<tagline>/<count>')
+@app.route('/tft/stats/<summoner>/<tagline>')
+async def tft_stats(summoner, tagline, count="20"):
+    stats = await shared(tft_async.get_match_stats, summoner, tagline, count)
+    return jsonify(stats)
+
+@app.route('/tft/comps/<summoner>/<tagline>/<count>')
+@app.route('/tft/comps/<summoner>/<tagline>')
+async def tft_comps(summoner, tagline, count="20"):
+    comps = await shared(tft_async.get_comps, summoner, tagline, count)
+    return jsonify(comps)
+
+
+async def batch(body, func, *args):
+    """Async version of game_api.batch"""
+    requested = batches.read_players(body)
+    if requested is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    unique = list(requested)
+
+    async def run(key):
+        name, tagline = requested[key][0].split("#", 1)
+        try:
+            return {"result": await func(name, tagline, *args)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    results = workers.gather_unordered(run, unique, batches.BATCH_WORKERS)
+
+    @stream_with_context
+    async def generate():
+        async for i, result in results:
+            for player in requested[unique[i]]:
+                yield app.json.dumps(dict({"player": player}, **result)) + "\n"
+
+    return app.response_class(generate(), mimetype="application/x-ndjson")
+
+
+async def batch_body():
+    """Async version of game_api.batch_body"""
+    body = await request.get_json(silent=True)
+    return body if isinstance(body, dict) else None
+
+
+@app.route('/league/batch/rank', methods=['POST'])
+async def league_batch_rank():
+    body = await batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return await batch(body, riot_async.get_summoner_rank, str(body.get("league", "SOLO")))
+
+@app.route('/league/batch/mastery', methods=['POST'])
+async def league_batch_mastery():
+    body = await batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return await batch(body, riot_async.get_top_champs, str(body.get("count", "5")))
+
+@app.route('/tft/batch/rank', methods=['POST'])
+async def tft_batch_rank():
+    body = await batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return await batch(body, tft_async.get_tft_rank, str(body.get("league", "RANKED")))
+
+@app.route('/tft/batch/matches', methods=['POST'])
+async def tft_batch_matches():
+    body = await batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return await batch(body, tft_async.get_recents, str(body.get("count", "10")))
+
+@app.route('/tft/batch/comps', methods=['POST'])
+async def tft_batch_comps():
+    body = await batch_body()
+    if body is None:
+        return jsonify({'error': 'Invalid request'}), 400
+    return await batch(body, tft_async.get_comps, str(body.get("count", "20")))
+
+# How much of each Riot rate limit is currently used, per API key, host and endpoint
+@app.route('/status/limits')
+async def rate_limits():
+    return jsonify(riot_client.rate_limit_status())
+
+# Timings, status codes, retries and cache hits in the Prometheus text format, see metrics.py
+@app.route('/metrics')
+async def prometheus_metrics():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+# Riot could not be reached, or did not answer in time (see riot_client.py for the timeouts)
+@app.errorhandler(httpx.HTTPError)
+async def riot_unavailable(error):
+    return jsonify({'error': 'Riot API unavailable'}), 504
+
+# Close the pooled connections to Riot when the server stops. The client belongs to this event loop, so it is
+# forgotten as well and the next loop to serve the app (in tests, for one) makes its own
+@app.after_serving
+async def close_riot_client():
+    if riot_client.ASYNC_SESSION is not None:
+        await riot_client.ASYNC_SESSION.aclose()
+        riot_client.ASYNC_SESSION = None
+
+# Define API route to handle unknown requests
+@app.route('/', defaults={'path': ''})
+@app.route('/<path:path>')
+async def catch_all(path):
+    return jsonify({'error': 'Invalid request'})
+
+# Run the ASGI app with Quart's development server
+if __name__ == '__main__':
+    app.run()
@@ -0,0 +1,216 @@
+"""
+This file is for keeping a local copy of each player's list of match IDs, so that looking up the same player again
+only asks Riot for the matches played since the newest one we already know about. Together with the match store in
+cache.py, polling a player who has played one new game costs one small match-ids call and one match download,
+instead of re-downloading their whole history.
+
+Histories are kept per player and queue, newest match first, in the same SQLite file as the match store.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import cache
+
+# Set to 0 to always ask Riot for the whole list of match IDs, like before histories were kept
+INCREMENTAL_HISTORY = os.environ.get('INCREMENTAL_HISTORY', '1') != '0'
+# Number of match IDs asked for in each call when looking for new matches (Riot allows up to 100)
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', '20'))
+# Number of player histories kept in memory, the rest are read back from the SQLite file when needed
+HISTORY_CACHE_SIZE = int(os.environ.get('HISTORY_CACHE_SIZE', '2000'))
+
+
+class MatchHistory:
+    """The stored match IDs of every player for one game (league or tft)"""
+
+    def __init__(self, game, fetch_ids, match_start_time, path=cache.MATCH_DB_PATH):
+        """
+        Args:
+            game (str): The game these histories are for ("league" or "tft")
+            fetch_ids (function): fetch_ids(puuid, query) calls the Riot match-ids endpoint with the query parameters in the
+                                    dictionary <query>, and returns the list of IDs or None if the call failed
+            match_start_time (function): match_start_time(match_id) returns the start time of a match in epoch seconds if
+                                    we have it stored, or None
+            path (str): The SQLite file the histories are saved in
+        """
+        self.game = game
+        self.fetch_ids = fetch_ids
+        self.match_start_time = match_start_time
+        self.path = path
+        self._histories = cache.LRUCache(HISTORY_CACHE_SIZE)    # (puuid, queue) -> {"ids": [newest first], "complete": bool}
+        self._in_flight = cache.SingleFlight()
+        self._in_flight_async = cache.AsyncSingleFlight()
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS histories (game TEXT, puuid TEXT, queue TEXT, match_ids TEXT, complete INTEGER, PRIMARY KEY (game, puuid, queue))")
+            self._db.commit()
+        return self._db
+
+    def _load(self, puuid, queue):
+        key = (puuid, queue)
+        history = self._histories.get(key)
+        if history is None:
+            with self._lock:
+                row = self._connect().execute("SELECT match_ids, complete FROM histories WHERE game = ? AND puuid = ? AND queue = ?",
+                                              (self.game, puuid, str(queue))).fetchone()
+            if row is None:
+                history = {"ids": [], "complete": False}
+            else:
+                history = {"ids": json.loads(row[0]), "complete": bool(row[1])}
+            self._histories.set(key, history)
+        return history
+
+    def _save(self, puuid, queue, history):
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO histories (game, puuid, queue, match_ids, complete) VALUES (?, ?, ?, ?, ?)",
+                       (self.game, puuid, str(queue), json.dumps(history["ids"]), int(history["complete"])))
+            db.commit()
+
+    def _query(self, queue, **params):
+        if queue is not None:
+            params["queue"] = queue
+        return params
+
+    def _sync_newer(self, queue, history, start_time):
+        """Ask Riot only for the matches newer than the newest one we have, and put them in front of the history.
+            This and _sync_older do not call Riot themselves: they yield the query of each match-ids call and are sent
+            back its page (None if the call failed), so the same steps run with blocking calls (get_ids) and awaited
+            ones (get_ids_async)
+
+        Args:
+            start_time (int): The start time of the newest match we have, see match_start_time, or None
+
+        Returns:
+            bool: False if Riot could not be reached, in which case the history is left as it was
+        """
+        known = set(history["ids"])
+        query = {"count": HISTORY_PAGE_SIZE}
+        if start_time is not None:
+            # A new match has to have started after the newest one we know, so nothing older needs to be listed
+            query["startTime"] = int(start_time)
+        new_ids = []
+        start = 0
+        reached_end = False
+        while True:
+            page = yield self._query(queue, start=start, **query)
+            if page is None:
+                return False
+            for match_id in page:
+                if match_id in known:
+                    history["ids"] = new_ids + history["ids"]
+                    return True
+                new_ids.append(match_id)
+            if len(page) < query["count"]:
+                reached_end = True
+                break
+            if start_time is None:
+                break    # Without a start time we could be paging through the whole history, so stop after one page
+            start += len(page)
+        if start_time is not None:
+            # Everything since the newest known match was listed without reaching it, so the history is still contiguous
+            history["ids"] = new_ids + history["ids"]
+        else:
+            # We could not connect the new matches to the old history, so start over from the newest ones
+            history["ids"] = new_ids
+            history["complete"] = reached_end
+        return True
+
+    def _sync_older(self, queue, history, needed):
+        """Ask Riot for older matches until the history has at least <needed> matches, or we reach the player's first
+            match. Yields queries like _sync_newer"""
+        while len(history["ids"]) < needed and not history["complete"]:
+            count = min(max(needed - len(history["ids"]), 1), 100)
+            page = yield self._query(queue, start=len(history["ids"]), count=count)
+            if page is None:
+                return False
+            known = set(history["ids"])
+            history["ids"] += [match_id for match_id in page if match_id not in known]
+            if len(page) < count:
+                history["complete"] = True
+        return True
+
+    def _sync(self, queue, history, start_time, needed):
+        """All the steps of one sync, yielding queries like _sync_newer
+
+        Returns:
+            bool: False if Riot could not be reached
+        """
+        if history["ids"]:
+            ok = yield from self._sync_newer(queue, history, start_time)
+        else:
+            history["complete"] = False
+            ok = True
+        if ok:
+            ok = yield from self._sync_older(queue, history, needed)
+        return ok
+
+    def get_ids(self, puuid, start, count, queue=None):
+        """Get match IDs from a player's history, syncing it with Riot first
+
+        Args:
+            puuid (str): Unique player ID of the summoner
+            start (int): Zero-based index of the first match to get (0 is the most recent game)
+            count (int): The number of match IDs to get
+            queue (int): Only count matches from this queue ID (league only), None for every queue
+
+        Returns:
+            list: The match IDs, newest first, or None if Riot could not be reached and we have nothing stored
+        """
+        def sync():
+            history = self._load(puuid, queue)
+            changed = list(history["ids"]), history["complete"]
+            start_time = self.match_start_time(history["ids"][0]) if history["ids"] else None
+            steps = self._sync(queue, history, start_time, start + count)
+            try:
+                query = next(steps)
+                while True:
+                    query = steps.send(self.fetch_ids(puuid, query))
+            except StopIteration as done:
+                ok = done.value
+            if (history["ids"], history["complete"]) != changed:
+                self._save(puuid, queue, history)
+            return ok
+
+        # Concurrent lookups of the same player share one sync
+        ok = self._in_flight.do((puuid, queue), sync)
+        history = self._load(puuid, queue)
+        if not ok and not history["ids"]:
+            return None
+        return history["ids"][start:start + count]
+
+    async def get_ids_async(self, fetch_ids, puuid, start, count, queue=None):
+        """Same as get_ids, for the async serving mode. Only the SQLite reads and writes run in a thread, the calls
+            to Riot are awaited on the event loop
+
+        Args:
+            fetch_ids (function): Coroutine function used instead of the fetch_ids given to the constructor, called
+                                    the same way
+            puuid, start, count, queue: See get_ids
+        """
+        async def sync():
+            history = await asyncio.to_thread(self._load, puuid, queue)
+            changed = list(history["ids"]), history["complete"]
+            start_time = await asyncio.to_thread(self.match_start_time, history["ids"][0]) if history["ids"] else None
+            steps = self._sync(queue, history, start_time, start + count)
+            try:
+                query = next(steps)
+                while True:
+                    query = steps.send(await fetch_ids(puuid, query))
+            except StopIteration as done:
+                ok = done.value
+            if (history["ids"], history["complete"]) != changed:
+                await asyncio.to_thread(self._save, puuid, queue, history)
+            return ok
+
+        ok = await self._in_flight_async.do((puuid, queue), sync)
+        history = await asyncio.to_thread(self._load, puuid, queue)
+        if not ok and not history["ids"]:
+            return None
+        return history["ids"][start:start + count]
@@ -0,0 +1,301 @@
+"""
+This file is for snapshots of whole ranked ladders (every ranked player of one queue on one platform), for leaderboards
+and so that rank lookups do not need two Riot calls per player. It is also the crawler that makes them, run for example
+every half hour from cron:
+    python ladder.py crawl --game league --queue SOLO --platform na1
+    python ladder.py crawl --game tft --queue SOLO --platform euw1
+    python ladder.py climbers --game league --queue SOLO --platform na1 --count 20
+
+A crawl pages through the league entries endpoint of every tier and division, and the challenger, grandmaster and
+master leagues. Divisions are crawled side by side and several pages of a division are asked for at once, all of it
+within the rate limits in riot_client.py (shared with the API when CACHE_BACKEND is set, see backends.py). The ladder
+is saved as one compressed NumPy file, sorted by PUUID, which also has every player's LP change since the previous
+snapshot (a promotion counts as the LP it took, 100 per division).
+
+While the newest snapshot of a ladder is younger than LADDER_MAX_AGE, riot.get_summoner_rank and tft.get_tft_rank
+answer from it instead of calling Riot.
+"""
+import argparse
+import glob
+import logging
+import os
+import threading
+import time
+import numpy as np
+import regions
+import riot_client
+import workers
+
+# Directory the snapshots are saved in
+LADDER_DIR = os.environ.get('LADDER_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ladder'))
+# Seconds a snapshot is used for rank lookups after it was made, 0 to always ask Riot
+LADDER_MAX_AGE = int(os.environ.get('LADDER_MAX_AGE', '1800'))
+# Number of snapshots kept per ladder, older ones are deleted after a crawl
+LADDER_KEEP = int(os.environ.get('LADDER_KEEP', '48'))
+# Number of divisions crawled at the same time, and the number of pages of one division asked for at once
+LADDER_WORKERS = int(os.environ.get('LADDER_WORKERS', '8'))
+LADDER_PAGE_BATCH = int(os.environ.get('LADDER_PAGE_BATCH', '4'))
+# Seconds between checks for a newer snapshot when looking up ranks
+LADDER_CHECK = 60
+
+log = logging.getLogger(__name__)
+
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER"]
+DIVISIONS = ["IV", "III", "II", "I"]
+# Tiers from here up have no divisions, their LP keeps counting up instead
+APEX = TIERS.index("MASTER")
+# The endpoints of each game: every tier below master has pages of entries per division, the others one league each
+ENDPOINTS = {
+    "league": {
+        "entries": "/lol/league/v4/entries/{queue}/{tier}/{division}?page={page}",
+        "apex": "/lol/league/v4/{tier}leagues/by-queue/{queue}"
+    },
+    "tft": {
+        "entries": "/tft/league/v1/entries/{tier}/{division}?queue={queue}&page={page}",
+        "apex": "/tft/league/v1/{tier}?queue={queue}"
+    }
+}
+
+
+def _get_json(url, api_key):
+    response = riot_client.get(url, api_key)
+    if response.status_code != 200:
+        # A snapshot with a division missing would look like everyone in it dropped off the ladder, so give up instead
+        raise RuntimeError("Riot API returned " + str(response.status_code) + " for " + url)
+    return response.json()
+
+
+def _crawl_division(game, platform, queue, tier, division, api_key):
+    """Get every entry of one division, LADDER_PAGE_BATCH pages at a time until a page is not full (empty past the end)"""
+    entries = []
+    page = 1
+    page_size = None
+    while True:
+        urls = [regions.platform_url(platform) + ENDPOINTS[game]["entries"].format(queue=queue, tier=tier, division=division, page=number)
+                for number in range(page, page + LADDER_PAGE_BATCH)]
+        pages = workers.map_ordered(lambda url: _get_json(url, api_key), urls, LADDER_PAGE_BATCH)
+        if page_size is None:
+            page_size = len(pages[0])    # Every page but the last is as full as the first
+        for data in pages:
+            entries.extend(data)
+        if any(len(data) < page_size or len(data) == 0 for data in pages):
+            return entries
+        page += LADDER_PAGE_BATCH
+
+
+def _crawl_apex(game, platform, queue, tier, api_key):
+    """Get every entry of the master, grandmaster or challenger league, which come in one response without a tier"""
+    url = regions.platform_url(platform) + ENDPOINTS[game]["apex"].format(queue=queue, tier=tier.lower())
+    return [dict(entry, tier=tier) for entry in _get_json(url, api_key).get("entries", [])]
+
+
+def crawl(game, platform, queue, api_key):
+    """Get every ranked player of a queue on a platform from the Riot API
+
+    Args:
+        game (str): "league" or "tft"
+        platform (str): The platform ID, e.g. "na1"
+        queue (str): The queue type, e.g. "RANKED_SOLO_5x5" or "RANKED_TFT"
+        api_key (str): The key to crawl with, the PUUIDs in the snapshot belong to it
+
+    Returns:
+        dict: The ladder as arrays sorted by PUUID, see save. Raises RuntimeError if a page could not be obtained
+    """
+    jobs = [(tier, division) for tier in TIERS[:APEX] for division in DIVISIONS] + [(tier, None) for tier in TIERS[APEX:]]
+
+    def run(job):
+        tier, division = job
+        if division is None:
+            return _crawl_apex(game, platform, queue, tier, api_key)
+        return _crawl_division(game, platform, queue, tier, division, api_key)
+
+    entries = {}
+    for data in workers.map_ordered(run, jobs, LADDER_WORKERS):
+        for entry in data:
+            if entry.get("puuid"):    # A player who moves division during the crawl is kept once, wherever they were seen last
+                entries[entry["puuid"]] = entry
+    puuids = sorted(entries)
+    rows = [entries[puuid] for puuid in puuids]
+    return {
+        "puuid": np.array([puuid.encode() for puuid in puuids], dtype="S"),
+        "tier": np.array([TIERS.index(entry["tier"]) for entry in rows], dtype=np.int8),
+        "division": np.array([DIVISIONS.index(entry.get("rank") or "I") for entry in rows], dtype=np.int8),
+        "lp": np.array([entry.get("leaguePoints", 0) for entry in rows], dtype=np.int32),
+        "wins": np.array([entry.get("wins", 0) for entry in rows], dtype=np.int32),
+        "losses": np.array([entry.get("losses", 0) for entry in rows], dtype=np.int32)
+    }
+
+
+def score(ladder):
+    """The LP of every player counted from the bottom of the ladder, so that promotions and demotions are LP changes too"""
+    tier = ladder["tier"].astype(np.int64)
+    lp = ladder["lp"].astype(np.int64)
+    return np.where(tier >= APEX, APEX * 400 + lp, tier * 400 + ladder["division"].astype(np.int64) * 100 + lp)
+
+
+def diff(ladder, previous):
+    """Add every player's LP change since the previous snapshot to a ladder, as "change" (0 for players who were not
+        in it) and "new" (True for them)"""
+    if previous is None or len(previous["puuid"]) == 0:
+        ladder["change"] = np.zeros(len(ladder["puuid"]), dtype=np.int32)
+        ladder["new"] = np.ones(len(ladder["puuid"]), dtype=bool)
+        return ladder
+    # Both are sorted by PUUID, so each player's row in the previous snapshot is found with a binary search
+    where = np.minimum(np.searchsorted(previous["puuid"], ladder["puuid"]), len(previous["puuid"]) - 1)
+    found = previous["puuid"][where] == ladder["puuid"]
+    ladder["change"] = np.where(found, score(ladder) - score(previous)[where], 0).astype(np.int32)
+    ladder["new"] = ~found
+    return ladder
+
+
+def _paths(game, platform, queue):
+    """The snapshot files of a ladder, oldest first"""
+    paths = glob.glob(os.path.join(LADDER_DIR, "%s-%s-%s-*.npz" % (game, platform, queue)))
+    return sorted(paths, key=lambda path: int(path.rsplit("-", 1)[1][:-len(".npz")]))
+
+
+def load(path):
+    """Read a snapshot file into a dictionary of arrays, plus "created" (epoch seconds) and "key" (the API key name)"""
+    with np.load(path) as data:
+        ladder = {name: data[name] for name in data.files}
+    ladder["created"] = float(ladder["created"])
+    ladder["key"] = str(ladder["key"])
+    return ladder
+
+
+def save(game, platform, queue, ladder, key):
+    """Write a ladder to a new snapshot file, and delete the oldest ones past LADDER_KEEP
+
+    Returns:
+        str: The path of the snapshot
+    """
+    os.makedirs(LADDER_DIR, exist_ok=True)
+    created = time.time()
+    path = os.path.join(LADDER_DIR, "%s-%s-%s-%d.npz" % (game, platform, queue, created))
+    # Written next to it first, so a lookup never reads half a file
+    with open(path + ".tmp", "wb") as f:
+        np.savez_compressed(f, created=np.float64(created), key=np.str_(key), **ladder)
+    os.replace(path + ".tmp", path)
+    for old in _paths(game, platform, queue)[:-LADDER_KEEP]:
+        os.remove(old)
+    return path
+
+
+def snapshot(game, platform, queue, api_key):
+    """Crawl a ladder, compare it with the previous snapshot and save it
+
+    Returns:
+        tuple: (path of the new snapshot, the ladder)
+    """
+    paths = _paths(game, platform, queue)
+    previous = load(paths[-1]) if paths else None
+    ladder = diff(crawl(game, platform, queue, api_key), previous)
+    return save(game, platform, queue, ladder, riot_client.key_name(api_key)), ladder
+
+
+class Snapshots:
+    """The newest snapshot of every ladder that ranks are looked up in, read when it is first needed and again when a
+        newer one shows up"""
+
+    def __init__(self):
+        self._ladders = {}    # (game, platform, queue) -> (time checked, path, ladder)
+        self._lock = threading.Lock()
+
+    def newest(self, game, platform, queue):
+        """Get the newest snapshot of a ladder, or None if there is none"""
+        key = (game, platform, queue)
+        now = time.monotonic()
+        with self._lock:
+            checked, path, ladder = self._ladders.get(key, (None, None, None))
+            if checked is None or now - checked >= LADDER_CHECK:
+                paths = _paths(game, platform, queue)
+                if paths and paths[-1] != path:
+                    try:
+                        path, ladder = paths[-1], load(paths[-1])
+                    except (OSError, ValueError, KeyError) as e:
+                        log.warning("Could not load ladder snapshot %s: %s", paths[-1], e)
+                self._ladders[key] = (now, path, ladder)
+        return ladder
+
+
+SNAPSHOTS = Snapshots()
+
+
+def lookup(game, platform, queue, puuid, api_key):
+    """Get a player's rank from the newest snapshot of a ladder, if it is fresh
+
+    Args:
+        game (str): "league" or "tft"
+        platform (str): The platform ID, e.g. "na1"
+        queue (str): The queue type, e.g. "RANKED_SOLO_5x5"
+        puuid (str): Unique player ID of the summoner
+        api_key (str): The key the PUUID belongs to
+
+    Returns:
+        list: [tier, division, LP] like riot.parse_rank, or an empty list if they are not ranked. Returns None if there is
+                no fresh snapshot made with the same key, in which case Riot has to be asked
+    """
+    if LADDER_MAX_AGE <= 0:
+        return None
+    ladder = SNAPSHOTS.newest(game, platform, queue)
+    if ladder is None or time.time() - ladder["created"] > LADDER_MAX_AGE or ladder["key"] != riot_client.key_name(api_key):
+        return None
+    target = puuid.encode()
+    i = int(np.searchsorted(ladder["puuid"], target))
+    if i >= len(ladder["puuid"]) or ladder["puuid"][i] != target:
+        return []
+    return [TIERS[ladder["tier"][i]], DIVISIONS[ladder["division"][i]], int(ladder["lp"][i])]
+
+
+def climbers(ladder, count):
+    """The players with the biggest LP changes in a snapshot, biggest gain first and biggest loss last"""
+    order = np.argsort(-ladder["change"], kind="stable")
+    order = np.concatenate([order[:count], order[max(len(order) - count, count):]])
+    return [{
+        "puuid": ladder["puuid"][i].decode(),
+        "tier": TIERS[ladder["tier"][i]],
+        "division": DIVISIONS[ladder["division"][i]],
+        "LP": int(ladder["lp"][i]),
+        "change": int(ladder["change"][i])
+    } for i in order if not ladder["new"][i]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshots of whole ranked ladders")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, text in (("crawl", "crawl a ladder and save a snapshot"), ("climbers", "list the biggest LP changes of the newest snapshot")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("--game", choices=sorted(ENDPOINTS), default="league")
+        command.add_argument("--queue", default="SOLO", help="SOLO or FLEX for League, SOLO or DOUBLEUP for TFT")
+        command.add_argument("--platform", default=None, help="e.g. na1 or euw (default RIOT_PLATFORM)")
+    commands.choices["climbers"].add_argument("--count", type=int, default=10)
+    args = parser.parse_args()
+
+    # Imported here, since riot.py and tft.py look ranks up in the snapshots made by this file
+    if args.game == "league":
+        import riot
+        queue, keys = riot.league_codes.get(args.queue, riot.league_codes["SOLO"]), riot.KEYS
+    else:
+        import tft
+        queue, keys = tft.tft_codes.get(args.queue, tft.tft_codes["SOLO"]), tft.KEYS
+    platform = regions.parse_platform(args.platform)
+    regions.PLATFORM.set(platform)
+
+    if args.command == "crawl":
+        started = time.monotonic()
+        path, ladder = snapshot(args.game, platform, queue, keys.keys[0])
+        print("Saved %d players to %s in %.1fs" % (len(ladder["puuid"]), path, time.monotonic() - started))
+        return
+    paths = _paths(args.game, platform, queue)
+    if not paths:
+        print("No snapshot of this ladder yet")
+        return
+    players = climbers(load(paths[-1]), args.count)
+    if not players:
+        print("No LP changes, the newest snapshot is the first of this ladder")
+    for player in players:
+        print("%+6d  %-11s %-3s %5d LP  %s" % (player["change"], player["tier"], player["division"], player["LP"], player["puuid"]))
+
+
+if __name__ == "__main__":
+    main()
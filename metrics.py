@@ -0,0 +1,158 @@
+"""
+This file is for measuring where the time goes: how long each Riot endpoint takes and what it answers, how often
+calls are retried, how often each cache has what we need, and how long each of our own routes takes. Everything is
+kept in memory and served at /metrics in the Prometheus text format.
+
+The Riot time spent on the current request is also added up (across every thread and task working for it), so it can
+be sent back to the client in a Server-Timing header.
+"""
+import contextvars
+import os
+import threading
+import time
+
+# Set to 1 to add a Server-Timing header with the time spent waiting on Riot to every response
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(name + "=\"" + escaped + "\"")
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """A count that only goes up, kept separately for every combination of label values"""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self):
+        lines = ["# HELP " + self.name + " " + self.help, "# TYPE " + self.name + " counter"]
+        with self._lock:
+            for values, count in sorted(self._values.items()):
+                lines.append(self.name + _labels(self.labels, values) + " " + repr(float(count)))
+        return lines
+
+
+class Histogram:
+    """Counts of observed durations in BUCKETS, with their sum and count, for every combination of label values"""
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}    # label values -> [count in each bucket, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *values):
+        with self._lock:
+            entry = self._values.get(values)
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0.0, 0]
+                self._values[values] = entry
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[0][i] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def render(self):
+        lines = ["# HELP " + self.name + " " + self.help, "# TYPE " + self.name + " histogram"]
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(self.name + "_bucket" + _labels(self.labels + ("le",), values + (repr(float(bound)),)) + " " + str(bucket_count))
+                lines.append(self.name + "_bucket" + _labels(self.labels + ("le",), values + ("+Inf",)) + " " + str(count))
+                lines.append(self.name + "_sum" + _labels(self.labels, values) + " " + repr(total))
+                lines.append(self.name + "_count" + _labels(self.labels, values) + " " + str(count))
+        return lines
+
+
+UPSTREAM_SECONDS = Histogram("riot_upstream_seconds", "Time taken by calls to the Riot API, per endpoint", ("route",))
+UPSTREAM_RESPONSES = Counter("riot_upstream_responses_total", "Responses from the Riot API, per endpoint and status code ('error' if Riot could not be reached)", ("route", "status"))
+UPSTREAM_RETRIES = Counter("riot_upstream_retries_total", "Calls to the Riot API sent again after a 429 or 5xx response, per endpoint and status code", ("route", "status"))
+RATE_LIMIT_WAIT = Counter("riot_rate_limit_wait_seconds_total", "Time spent waiting for room in our Riot rate limits before sending a call, per endpoint", ("route",))
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups per cache and result (hit, stale, disk or miss)", ("cache", "result"))
+SHARED_STORE_ERRORS = Counter("shared_store_errors_total", "Calls to the shared store (CACHE_BACKEND) that failed, per store and operation", ("backend", "operation"))
+REQUEST_SECONDS = Histogram("http_request_seconds", "Time taken to answer our own API requests, per route and status code", ("route", "method", "status"))
+
+ALL = [UPSTREAM_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_RETRIES, RATE_LIMIT_WAIT, CACHE_LOOKUPS, SHARED_STORE_ERRORS, REQUEST_SECONDS]
+
+
+def render():
+    """Get every metric in the Prometheus text format"""
+    lines = []
+    for metric in ALL:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+class Timing:
+    """The Riot calls made for one of our requests"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.upstream_seconds = 0.0
+        self.upstream_calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.upstream_seconds += seconds
+            self.upstream_calls += 1
+
+    def header(self):
+        """The value of the Server-Timing header for this request"""
+        total = (time.perf_counter() - self.started) * 1000
+        return "riot;desc=\"%d calls\";dur=%.1f, total;dur=%.1f" % (self.upstream_calls, self.upstream_seconds * 1000, total)
+
+
+# The Timing of the request being handled. Context variables follow the request into threads started with
+# workers.py and into async tasks, so calls made in parallel are counted too
+CURRENT = contextvars.ContextVar("metrics_timing", default=None)
+
+
+def start_request():
+    """Start timing the current request, returns the token needed to stop"""
+    return CURRENT.set(Timing())
+
+
+def upstream(route, status, seconds):
+    """Count one call to the Riot API
+
+    Args:
+        route (str): The endpoint name, see riot_client.route_name
+        status (int or str): The status code of the response, or "error" if there was none
+        seconds (float): The time the call took
+    """
+    UPSTREAM_SECONDS.observe(seconds, route)
+    UPSTREAM_RESPONSES.inc(route, str(status))
+    timing = CURRENT.get()
+    if timing is not None:
+        timing.add(seconds)
+
+
+def cache_lookup(cache, result):
+    """Count one lookup in a cache, <result> is hit, stale, disk or miss"""
+    CACHE_LOOKUPS.inc(cache, result)
+
+
+def shared_store_error(backend, operation):
+    """Count one failed call to the shared store, <operation> is get, set, delete or incr"""
+    SHARED_STORE_ERRORS.inc(backend, operation)
@@ -0,0 +1,183 @@
+"""
+This file is for keeping tracked players warm. A background thread goes over a watchlist of Riot IDs every
+PREFETCH_INTERVAL seconds and asks for their usual endpoints (ranks and match histories) itself, so that their PUUIDs, ranks, new match
+IDs and new matches are already cached when someone looks them up, instead of every lookup waiting on Riot.
+
+Players are refreshed most requested first, and the thread waits whenever less than PREFETCH_RESERVE of the Riot
+rate limit is free, so clients always get the rest of the budget.
+"""
+import logging
+import os
+import threading
+import time
+import regions
+
+# Riot IDs to keep warm, as "name#tagline" separated by commas, and/or a file with one Riot ID per line. A player on
+# another platform than the default one is written "name#tagline@euw1"
+WATCHLIST = os.environ.get('WATCHLIST', '')
+WATCHLIST_FILE = os.environ.get('WATCHLIST_FILE')
+# Also keep this many of the most looked up players warm, on top of the watchlist
+PREFETCH_TOP = int(os.environ.get('PREFETCH_TOP', '0'))
+# Seconds between two rounds over every tracked player
+PREFETCH_INTERVAL = float(os.environ.get('PREFETCH_INTERVAL', '60'))
+# Share of each rate limit window that prefetching leaves free for clients
+PREFETCH_RESERVE = float(os.environ.get('PREFETCH_RESERVE', '0.5'))
+# Endpoints refreshed for each tracked player, {name} and {tagline} are filled in
+PREFETCH_PATHS = os.environ.get('PREFETCH_PATHS', '/league/rank/{name}/{tagline}/SOLO,/league/matches/{name}/{tagline},'
+                                                  '/tft/rank/{name}/{tagline}/RANKED,/tft/matches/{name}/{tagline}')
+
+log = logging.getLogger(__name__)
+
+
+def parse_watchlist(text):
+    """Turn "name#tagline" or "name#tagline@platform" entries separated by commas or new lines into a list of
+        (name, tagline, platform), skipping invalid ones. platform is "" for the default platform"""
+    ret = []
+    for entry in text.replace("\n", ",").split(","):
+        riot_id, _, platform = entry.strip().partition("@")
+        name, _, tagline = riot_id.partition("#")
+        if name and tagline and valid_platform(platform):
+            ret.append((name, tagline, platform.strip().lower()))
+    return ret
+
+
+def valid_platform(platform):
+    """Check a ?platform= value, "" being the default platform"""
+    try:
+        regions.parse_platform(platform.strip())
+    except ValueError:
+        return False
+    return True
+
+
+def player_path(path, name, tagline, platform):
+    """Fill in one of the paths to refresh for a player, with the ?platform= the player was looked up with"""
+    path = path.format(name=name, tagline=tagline)
+    if platform:
+        path += ("&" if "?" in path else "?") + "platform=" + platform
+    return path
+
+
+def load_watchlist(text=WATCHLIST, path=WATCHLIST_FILE):
+    """Get the watchlist from the WATCHLIST setting and the WATCHLIST_FILE file"""
+    ret = parse_watchlist(text)
+    if path:
+        with open(path, "r") as f:
+            ret += parse_watchlist(f.read())
+    return ret
+
+
+class Prefetcher:
+    """Background refresher of the endpoints of tracked players"""
+
+    def __init__(self, warm, headroom, watchlist=(), top=PREFETCH_TOP, paths=PREFETCH_PATHS,
+                 interval=PREFETCH_INTERVAL, reserve=PREFETCH_RESERVE):
+        """
+        Args:
+            warm (function): warm(path) refreshes the cached response for an API path
+            headroom (function): headroom() returns the share of the Riot rate limit that is still free, from 0 to 1
+            watchlist (list): The (name, tagline, platform) of every player that is always kept warm, see parse_watchlist
+            top (int): The number of most looked up players that are also kept warm
+            paths (str): The API paths to refresh for each player, separated by commas
+            interval (float): Seconds between two rounds over every tracked player
+            reserve (float): Share of the rate limit that is left for clients
+        """
+        self.warm = warm
+        self.headroom = headroom
+        self.top = top
+        self.paths = [path.strip() for path in paths.split(",") if path.strip()]
+        self.interval = interval
+        self.reserve = reserve
+        # (name, tagline, platform) in lowercase -> {"name": str, "tagline": str, "platform": str, "hits": float, "watched": bool}
+        self._players = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        for name, tagline, platform in watchlist:
+            self._players[(name.lower(), tagline.lower(), platform)] = {"name": name, "tagline": tagline, "platform": platform,
+                                                                        "hits": 0.0, "watched": True}
+
+    def seen(self, name, tagline, platform=""):
+        """Count a lookup of a player, which moves them up the refresh order
+
+        Args:
+            name (str): The name part of the Riot ID
+            tagline (str): The tagline part of the Riot ID
+            platform (str): The ?platform= of the lookup, as the client wrote it. The same player on another platform,
+                            or the same platform written differently, is a different cached response so it is counted apart
+        """
+        platform = (platform or "").strip().lower()
+        key = (name.strip().lower(), tagline.strip().lower(), platform)
+        with self._lock:
+            player = self._players.get(key)
+            if player is None:
+                if self.top <= 0 or not valid_platform(platform):
+                    return    # Only the watchlist is kept warm, so there is no need to count other players
+                player = {"name": name, "tagline": tagline, "platform": platform, "hits": 0.0, "watched": False}
+                self._players[key] = player
+            player["hits"] += 1
+
+    def tracked(self):
+        """Get the players to refresh this round, most looked up first
+
+        Returns:
+            list: (name, tagline, platform) of every watched player and of the <top> most looked up other players
+        """
+        with self._lock:
+            players = sorted(self._players.values(), key=lambda player: -player["hits"])
+        watched = [player for player in players if player["watched"]]
+        others = [player for player in players if not player["watched"] and player["hits"] > 0][:self.top]
+        chosen = sorted(watched + others, key=lambda player: -player["hits"])
+        return [(player["name"], player["tagline"], player["platform"]) for player in chosen]
+
+    def _decay(self):
+        """Halve every lookup count once a round, so the order follows recent lookups, and forget players nobody asks for"""
+        with self._lock:
+            for key, player in list(self._players.items()):
+                player["hits"] /= 2
+                if not player["watched"] and player["hits"] < 0.5:
+                    del self._players[key]
+
+    def _wait_for_budget(self):
+        while self.headroom() < self.reserve:
+            time.sleep(1)
+
+    def run_once(self):
+        """Refresh every tracked player once, spread over the interval
+
+        Returns:
+            int: The number of paths refreshed
+        """
+        players = self.tracked()
+        started = time.monotonic()
+        done = 0
+        for i, (name, tagline, platform) in enumerate(players):
+            for path in self.paths:
+                self._wait_for_budget()
+                try:
+                    self.warm(player_path(path, name, tagline, platform))
+                    done += 1
+                except Exception as e:
+                    log.warning("Prefetch of %s#%s failed: %s", name, tagline, e)
+            # Spread the players over the interval instead of sending every call at the start of it
+            next_start = started + self.interval * (i + 1) / len(players)
+            time.sleep(max(next_start - time.monotonic(), 0))
+        self._decay()
+        return done
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            self.run_once()
+            time.sleep(max(self.interval - (time.monotonic() - started), 1))
+
+    def start(self):
+        """Start the background thread, if there is anyone to keep warm
+
+        Returns:
+            bool: True if the thread is running
+        """
+        with self._lock:
+            if self._thread is None and (self._players or self.top > 0):
+                self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+                self._thread.start()
+        return self._thread is not None
@@ -0,0 +1,99 @@
+"""
+This file is for routing Riot API calls to the right host for a player's server. Riot has two kinds of hosts:
+platform hosts such as na1 or euw1 (summoner, league and mastery endpoints), and regional hosts americas, europe,
+asia and sea (account, match and match history endpoints) that each serve several platforms.
+
+The platform of the request being handled is kept in a context variable, so that game_api.py can set it once from
+the ?platform= parameter and every Riot call made for that request (including the ones made from other threads, see
+workers.py) goes to the right hosts. Every host has its own connection pool and rate limits in riot_client.py, so
+a busy region can not use up the quota of another.
+"""
+import contextvars
+import os
+import threading
+
+# The platform used when a request does not ask for one
+DEFAULT_PLATFORM = os.environ.get('RIOT_PLATFORM', 'na1').lower()
+
+# Platform -> the regional host that serves its matches
+MATCH_REGIONS = {
+    "na1": "americas", "br1": "americas", "la1": "americas", "la2": "americas",
+    "euw1": "europe", "eun1": "europe", "tr1": "europe", "ru": "europe", "me1": "europe",
+    "kr": "asia", "jp1": "asia",
+    "oc1": "sea", "ph2": "sea", "sg2": "sea", "th2": "sea", "tw2": "sea", "vn2": "sea",
+}
+# The account endpoints are only on americas, europe and asia, and any of them knows every player, so use the closest
+ACCOUNT_REGIONS = {"americas": "americas", "europe": "europe", "asia": "asia", "sea": "asia"}
+# The names players usually use for their server
+ALIASES = {
+    "na": "na1", "br": "br1", "lan": "la1", "las": "la2", "euw": "euw1", "eune": "eun1", "tr": "tr1", "me": "me1",
+    "jp": "jp1", "oce": "oc1", "oc": "oc1", "ph": "ph2", "sg": "sg2", "th": "th2", "tw": "tw2", "vn": "vn2",
+}
+
+PLATFORM = contextvars.ContextVar("riot_platform", default=DEFAULT_PLATFORM)
+
+
+def parse_platform(value):
+    """Turn a platform parameter such as "euw1", "EUW" or None (the default platform) into a platform ID
+
+    Raises:
+        ValueError: If it is not a platform we know about
+    """
+    if value is None or value == "":
+        return DEFAULT_PLATFORM
+    platform = ALIASES.get(value.lower(), value.lower())
+    if platform not in MATCH_REGIONS:
+        raise ValueError("Unknown platform " + value)
+    return platform
+
+
+def platform():
+    """The platform of the request being handled"""
+    return PLATFORM.get()
+
+
+def match_region(platform_id=None):
+    """The regional host name for the matches of a platform (the current one if not given)"""
+    return MATCH_REGIONS[platform_id or platform()]
+
+
+def match_id_platform(match_id):
+    """The platform a match was played on, from the start of its ID ("EUW1_6543210987" -> "euw1"), or None if it is not one we know"""
+    prefix = match_id.split("_", 1)[0].lower()
+    return prefix if prefix in MATCH_REGIONS else None
+
+
+def platform_url(platform_id=None):
+    """Base URL of the platform host, for summoner, league and mastery calls"""
+    return "https://" + (platform_id or platform()) + ".api.riotgames.com"
+
+
+def match_url(platform_id=None):
+    """Base URL of the regional host for match and match history calls"""
+    return "https://" + match_region(platform_id) + ".api.riotgames.com"
+
+
+def account_url(platform_id=None):
+    """Base URL of the regional host for account (Riot ID) calls"""
+    return "https://" + ACCOUNT_REGIONS[match_region(platform_id)] + ".api.riotgames.com"
+
+
+class PerRegion:
+    """One object per match region, created the first time that region is used"""
+
+    def __init__(self, make):
+        """
+        Args:
+            make (function): make(region) creates the object for a region
+        """
+        self.make = make
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def get(self, region=None):
+        """Get the object of a region, the region of the current request if not given"""
+        region = region or match_region()
+        with self._lock:
+            if region not in self._objects:
+                self._objects[region] = self.make(region)
+            return self._objects[region]
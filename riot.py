@@ -3,20 +3,26 @@ This file is for methods used in obtaining data from the Riot Games API.
 Here we will unpack the JSON response from Riot, pull out the specific info we want, and repackage it into
 another JSON to be used in game_api.py
 """
-import json
-import requests
 import os
 import datetime
+from urllib.parse import urlencode
+import workers
+import cache
+import history
+import ladder
+import regions
+import riot_client
+import static_data
+import stats
+import timeline
 from dotenv import load_dotenv
 load_dotenv('keys.env')    # Load environment variables from keys.env
 
-TARGET = "https://na1.api.riotgames.com"
-ACCOUNT_TARGET = "https://americas.api.riotgames.com"
 API_KEY = os.environ.get('RIOT_KEY')     # The Riot API bot token
+# Several League keys separated by commas, calls are spread over all of them (see riot_client.KeyPool). Defaults to RIOT_KEY
+KEYS = riot_client.KeyPool(os.environ.get('RIOT_KEYS', API_KEY or '').split(','), "league")
 # TFT_KEY = os.environ.get('TFT_KEY')   # To be used later for TFT
-CHAMPION_IDS = json.load(open(os.path.join('./data-jsons', "champion_ids.json"), "r"))
-# Adapted from https://static.developer.riotgames.com/docs/lol/queues.json
-GAME_IDS = json.load(open(os.path.join('./data-jsons', "queue_ids.json"), "r"))
+# Champion and queue names are looked up in static_data.py, which loads data-jsons the first time they are needed
 # https://developer.riotgames.com/apis
 
 # Example call
@@ -44,24 +50,67 @@ def get_top_champs(summoner_name, tagline, count):
     if len(puuid) > 0:    # Make sure we get a valid summoner ID
         #url = TARGET+"/lol/champion-mastery/v4/champion-masteries/by-summoner/"+summoner_id+"/top?count="+count+"&api_key="+API_KEY
         #puuid = get_summoner_puuid(summoner_name)
-        url = TARGET+"/lol/champion-mastery/v4/champion-masteries/by-puuid/"+puuid+"/top?count="+count+"&api_key="+API_KEY
-        response = requests.get(url)
+        url = regions.platform_url()+"/lol/champion-mastery/v4/champion-masteries/by-puuid/"+puuid+"/top?count="+count
+        response = riot_client.get(url, KEYS.for_puuid(puuid))
         #print(url)
         #print("code: " + str(response.status_code))
         if response.status_code == 200:
             #print("YAY!")
             data = response.json() # List of dictionaries
             #print(data)
-            champion_data = {}
-            for champion in data:
-                champion_id = str(champion["championId"])   # Stored as an int in the JSON response, need to cast it to a string
-                champion_name = get_champion_name(champion_id)
-                mastery_level = champion["championLevel"]
-                mastery_points = champion["championPoints"]
-                champion_data[champion_name] = [mastery_level, mastery_points]
-            ret = champion_data
+            ret = parse_top_champs(data)
     return ret
+
+
+def parse_top_champs(data):
+    """Pull the champion names and mastery out of a champion-mastery response
+
+    Args:
+        data (list): The JSON from the champion-mastery top endpoint
+
+    Returns:
+        dict {str: list of ints} -> {"champion_name" : [mastery_level, mastery_points]}
+    """
+    champion_data = {}
+    for champion in data:
+        champion_id = str(champion["championId"])   # Stored as an int in the JSON response, need to cast it to a string
+        champion_name = get_champion_name(champion_id)
+        mastery_level = champion["championLevel"]
+        mastery_points = champion["championPoints"]
+        champion_data[champion_name] = [mastery_level, mastery_points]
+    return champion_data
+
     
+# The fields of each participant that we keep from a match-v5 response, everything else is dropped before storing it
+PARTICIPANT_FIELDS = ("participantId", "teamId", "teamPosition", "win", "championId", "championName", "kills", "deaths", "assists",
+                      "totalMinionsKilled", "neutralMinionsKilled", "totalDamageDealtToChampions", "visionScore",
+                      "damageSelfMitigated", "goldEarned", "largestMultiKill")
+
+
+def compact_match(data):
+    """Turn a full match-v5 response into the compact record that is kept in the match store. The response has hundreds
+        of fields for each of the ten players, of which we only use the ones in PARTICIPANT_FIELDS
+
+    Args:
+        data (dict): The match JSON from the Riot API
+
+    Returns:
+        dict: {"gameDuration": int, "gameStartTimestamp": int, "queueId": int, "participants": {puuid: {field: value}}}
+    """
+    info = data["info"]
+    participants = {}
+    for puuid, participant in zip(data["metadata"]["participants"], info["participants"]):
+        participants[puuid] = {field: participant.get(field) for field in PARTICIPANT_FIELDS}
+    return {
+        "gameDuration": info["gameDuration"],
+        "gameStartTimestamp": info["gameStartTimestamp"],
+        "queueId": info["queueId"],
+        "participants": participants
+    }
+
+
+MATCHES = cache.MatchStore("league", compact_match)
+
 
 def get_match_info(match_id, puuid):
     """Calls the Riot API to get detailed stats on specific match in relationship to a summoner based on the match ID. 
@@ -84,71 +133,97 @@ def get_match_info(match_id, puuid):
                      }
     """
     ret = {}
-    # Different API target than some other methods, so not using the TARGET variable
-    url = "https://americas.api.riotgames.com/lol/match/v5/matches/"+match_id+"?api_key="+API_KEY
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        # participant index = metadata->participants->list.index(puuid)
-        participant_idx = data["metadata"]["participants"].index(puuid)
-        # win/loss = info->participants[index]->win
-        win = data["info"]["participants"][participant_idx]["win"]
-        # number of kills = info->participants[index]->kills
-        num_kills = str(data["info"]["participants"][participant_idx]["kills"])
-        # number of deaths = info->participants[index]->deaths
-        num_deaths = str(data["info"]["participants"][participant_idx]["deaths"])
-        # number of assists = info->participants[index]->assists
-        num_assists = str(data["info"]["participants"][participant_idx]["assists"])
-        
-        # Pull out all the data that we need
-        champion_name = data["info"]["participants"][participant_idx]["championName"] 
-        cs = data["info"]["participants"][participant_idx]["totalMinionsKilled"]    # Lane minions
-        cs += data["info"]["participants"][participant_idx]["neutralMinionsKilled"]    # Jungle minions
-        duration_seconds = data["info"]["gameDuration"] # Game duration in seconds
-        duration_time = str(datetime.timedelta(seconds=duration_seconds))   # Duration in time format (HH:MM:SS)
-        duration_minutes = duration_seconds/60  # Duration in minutes, used for calculating <stat> per minute
-        cs_per_minute = round(cs/duration_minutes, 1) # round to one decimal place
-        champion_damage = data["info"]["participants"][participant_idx]["totalDamageDealtToChampions"]  # Total damage dealt to enemy champions
-        damage_per_minute = round(champion_damage/duration_minutes, 1)  # round to one decimal place
-        vision_score = data["info"]["participants"][participant_idx]["visionScore"] 
-        self_mitigated_damage = data["info"]["participants"][participant_idx]["damageSelfMitigated"]    # Total incoming damage that was self-mitigated (armor, magic resist, damage reduction)
-        gold_earned = data["info"]["participants"][participant_idx]["goldEarned"]   # Total gold earned during the match
-        gold_per_minute = round(gold_earned/duration_minutes, 1)    # round to one decimal place
-        queue_id = str(data["info"]["queueId"]) # The internal ID number of the queue type (draft, blind, solo ranked, ARAM, etc)
-        queue_name = GAME_IDS[0][queue_id]  # Actual name of the queue type
-        multikill = data["info"]["participants"][participant_idx]["largestMultiKill"]   # Number of the largest multikill the player had
-        multikill_type = "Single Kill"  # Default to "Single Kill," but change if they got something higher (each one is less likely than the previous)
-        if multikill == 2:
-            multikill_type = "Double Kill"
-        elif multikill == 3:
-            multikill_type = "Triple Kill!"
-        elif multikill == 4:
-            multikill_type = "Quadra Kill!!"
-        elif multikill == 5:
-            multikill_type = "PENTA KILL!!!"
-        # Throw all of our data into a dictionary, and convert most of the numbers to strings
-        ret = {
-            "win": win,
-            "KDA": num_kills+"/"+num_deaths+"/"+num_assists,
-            "CS": str(cs),
-            "CS/min": str(cs_per_minute),
-            "duration": duration_time,
-            "championDamage": str(champion_damage),
-            "championName": champion_name,
-            "visionScore": str(vision_score),
-            "selfMitigatedDamage": str(self_mitigated_damage),
-            "goldEarned": str(gold_earned),
-            "largestMultikill": multikill,
-            "multikillType": multikill_type,
-            "queueType": queue_name,
-            "gold/min": str(gold_per_minute),
-            "damage/min": str(damage_per_minute)
-        }
-        
+    record = get_match_record(match_id, KEYS.for_puuid(puuid))
+    if record is not None:
+        ret = parse_match_info(record, puuid)
     return ret
+
+
+def get_match_record(match_id, api_key=None):
+    """Get the compact record of a match (see compact_match), from the match store or else from the Riot API
+
+    Args:
+        match_id (str): Unique ID of the requested match
+        api_key (str): The key that the PUUIDs of the player asking for it belong to, see KEYS.for_puuid. Defaults to the first key
+
+    Returns:
+        dict: The compact record of the match. Returns None if an invalid response is received from the API.
+    """
+    api_key = api_key or KEYS.keys[0]
+    store_id = KEYS.store_id(match_id, api_key)    # The PUUIDs in the record only match the key that downloaded it
+    record = MATCHES.get(store_id)   # Finished matches never change, so only download ones we have not seen before
+    if record is None:
+        # Matches are on the regional host of the platform the match was played on, which is the start of its ID
+        url = regions.match_url(regions.match_id_platform(match_id))+"/lol/match/v5/matches/"+match_id
+        response = riot_client.get(url, api_key)
+        if response.status_code == 200:
+            record = MATCHES.put(store_id, response.content)
+    return record
+
+
+def parse_match_info(record, puuid):
+    """Pull the stats of one player out of a compact match record, see get_match_info for the stats obtained
+
+    Args:
+        record (dict): The compact record of the match, from compact_match
+        puuid (str): Unique player ID of the requested summoner
+
+    Returns:
+        dict: Dictionary containing stats about the game for this player
+    """
+    participant = record["participants"][puuid]
+    win = participant["win"]
+    num_kills = str(participant["kills"])
+    num_deaths = str(participant["deaths"])
+    num_assists = str(participant["assists"])
+
+    # Pull out all the data that we need
+    champion_name = participant["championName"] 
+    cs = participant["totalMinionsKilled"]    # Lane minions
+    cs += participant["neutralMinionsKilled"]    # Jungle minions
+    duration_seconds = record["gameDuration"] # Game duration in seconds
+    duration_time = str(datetime.timedelta(seconds=duration_seconds))   # Duration in time format (HH:MM:SS)
+    duration_minutes = duration_seconds/60  # Duration in minutes, used for calculating <stat> per minute
+    cs_per_minute = round(cs/duration_minutes, 1) # round to one decimal place
+    champion_damage = participant["totalDamageDealtToChampions"]  # Total damage dealt to enemy champions
+    damage_per_minute = round(champion_damage/duration_minutes, 1)  # round to one decimal place
+    vision_score = participant["visionScore"] 
+    self_mitigated_damage = participant["damageSelfMitigated"]    # Total incoming damage that was self-mitigated (armor, magic resist, damage reduction)
+    gold_earned = participant["goldEarned"]   # Total gold earned during the match
+    gold_per_minute = round(gold_earned/duration_minutes, 1)    # round to one decimal place
+    queue_id = str(record["queueId"]) # The internal ID number of the queue type (draft, blind, solo ranked, ARAM, etc)
+    queue_name = static_data.queue_name(queue_id)  # Actual name of the queue type
+    multikill = participant["largestMultiKill"]   # Number of the largest multikill the player had
+    multikill_type = "Single Kill"  # Default to "Single Kill," but change if they got something higher (each one is less likely than the previous)
+    if multikill == 2:
+        multikill_type = "Double Kill"
+    elif multikill == 3:
+        multikill_type = "Triple Kill!"
+    elif multikill == 4:
+        multikill_type = "Quadra Kill!!"
+    elif multikill == 5:
+        multikill_type = "PENTA KILL!!!"
+    # Throw all of our data into a dictionary, and convert most of the numbers to strings
+    return {
+        "win": win,
+        "KDA": num_kills+"/"+num_deaths+"/"+num_assists,
+        "CS": str(cs),
+        "CS/min": str(cs_per_minute),
+        "duration": duration_time,
+        "championDamage": str(champion_damage),
+        "championName": champion_name,
+        "visionScore": str(vision_score),
+        "selfMitigatedDamage": str(self_mitigated_damage),
+        "goldEarned": str(gold_earned),
+        "largestMultikill": multikill,
+        "multikillType": multikill_type,
+        "queueType": queue_name,
+        "gold/min": str(gold_per_minute),
+        "damage/min": str(damage_per_minute)
+    }
         
 
-def get_matches(summoner_name, tagline, count, start="1"):
+def get_matches(summoner_name, tagline, count, start="1", queue=None):
     """Call the Riot API to obtain stats about the <count> most recent matches of a given summoner, starting at 
         a given amount of matches backwards. 
 
@@ -157,10 +232,12 @@ def get_matches(summoner_name, tagline, count, start="1"):
         count (str): The number of games we want to get info about
         start (str): The number of the match to start looking back from (1 would be the most recent game, 2 would be two games ago, etc).
                         Defaults to "1"
+        queue (str): Only count matches from this queue ID (e.g. "420" for Ranked Solo/Duo). Defaults to every queue
 
     Returns:
         list: List of dictionaries, with each one containing information about a match. Returns an empty list 
-                if an invalid response is received from the API.
+                if an invalid response is received from the API. A match that could not be obtained is 
+                {"matchId": match_id, "error": reason} instead, so the rest of the list is still returned.
                 Example dictionary: {
                                         "CS": "64",
                                         "CS/min": "2.0",
@@ -182,24 +259,210 @@ def get_matches(summoner_name, tagline, count, start="1"):
     ret = []
     puuid = get_summoner_puuid(summoner_name, tagline)
     if len(puuid) > 0:    # Make sure we get a valid summoner ID
-        # Different API target than some other methods, so not using the TARGET variable
-        start_int = int(start)
-        # Riot API zero-indexes games, so subtract one
-        if start_int > 0:
-            start_int -= 1
-        start = str(start_int)
-        # Different API target than some other methods, so not using the TARGET variable
-        url = "https://americas.api.riotgames.com/lol/match/v5/matches/by-puuid/"+puuid+"/ids?start="+start+"&count="+count+"&api_key="+API_KEY
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json() # List of match IDs
-            for match_id in data:
-                match = get_match_info(match_id, puuid)
-                ret.append(match)           
+        data = get_recent_match_ids(puuid, count, start, queue)
+        if data is not None:
+            # Fetch the details of every match at once, results stay in the same order as the match IDs
+            ret = workers.map_ordered(lambda match_id: get_match_or_error(match_id, puuid), data)
             
     return ret
 
 
+def iter_matches(summoner_name, tagline, count, start="1", queue=None):
+    """Same as get_matches, but gives back each match as soon as it has been fetched and parsed, instead of
+        waiting for the whole list. Matches come out in the order they finish, not in match history order.
+        The summoner and their match IDs are looked up before this returns, so if Riot can not be reached for those
+        the error is raised here, before anything has been sent to the client
+
+    Args:
+        summoner_name (str): The name of the summoner whose match history we want
+        count (str): The number of games we want to get info about
+        start (str): The number of the match to start looking back from (1 would be the most recent game). Defaults to "1"
+        queue (str): Only count matches from this queue ID. Defaults to every queue
+
+    Returns:
+        iterator: (index, match) where index is the position the match would have in the list from get_matches. A match
+            that could not be fetched is {"matchId": match_id, "error": reason}, see get_match_or_error
+    """
+    data = []
+    puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = get_recent_match_ids(puuid, count, start, queue) or []
+    return workers.imap_unordered(lambda match_id: get_match_or_error(match_id, puuid), data)
+
+
+# Per-minute gold, XP and CS of every player, kept per match like MATCHES
+TIMELINES = cache.MatchStore("league-timeline", timeline.compact_timeline)
+
+
+def get_timeline_record(match_id, api_key=None):
+    """Get the compact timeline of a match (see timeline.parse_timeline), from the timeline store or else from the Riot API.
+        The timeline is parsed while it is downloaded, so the multi-megabyte response is never held in memory
+
+    Args:
+        match_id (str): Unique ID of the requested match
+        api_key (str): The key that the PUUIDs of the player asking for it belong to, see KEYS.for_puuid. Defaults to the first key
+
+    Returns:
+        dict: The compact timeline of the match. Returns None if an invalid response is received from the API.
+    """
+    api_key = api_key or KEYS.keys[0]
+    store_id = KEYS.store_id(match_id, api_key)
+    record = TIMELINES.get(store_id)
+    if record is None:
+        url = regions.match_url(regions.match_id_platform(match_id))+"/lol/match/v5/matches/"+match_id+"/timeline"
+        _, record = riot_client.get_parsed(url, api_key, timeline.parse_timeline)
+        if record is not None:
+            TIMELINES.put_record(store_id, record)
+    return record
+
+
+def get_timeline(summoner_name, tagline, start="1"):
+    """Get a summoner's gold, XP and CS at every minute of one match, and the difference with their lane opponent at
+        10, 15 and 20 minutes
+
+    Args:
+        summoner_name (str): The name of the summoner whose match history we want
+        start (str): The number of the match to look at (1 would be the most recent game). Defaults to "1"
+
+    Returns:
+        dict: See timeline.curves, with the "matchId". Returns an empty dictionary if an invalid response is received from the API.
+    """
+    ret = {}
+    puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = get_recent_match_ids(puuid, "1", start)
+        if data:
+            match_id = data[0]
+            api_key = KEYS.for_puuid(puuid)
+            # The match has the positions and champions, the timeline the numbers, so get both at once
+            record, timeline_record = workers.map_ordered(lambda get: get(match_id, api_key), [get_match_record, get_timeline_record])
+            if record is not None and timeline_record is not None and puuid in record["participants"]:
+                ret = timeline.curves(timeline_record, record, puuid)
+                if ret:
+                    ret["matchId"] = match_id
+    return ret
+
+
+def get_match_stats(summoner_name, tagline, count, queue=None):
+    """Sum up a summoner's <count> most recent matches: averages (KDA, CS/min, gold/min, damage/min, vision score)
+        and win rates, overall and per champion. The numbers are numbers here, not strings like in get_matches
+
+    Args:
+        summoner_name (str): The name of the summoner whose match history we want
+        count (str): The number of games to sum up
+        queue (str): Only count matches from this queue ID (e.g. "420" for Ranked Solo/Duo). Defaults to every queue
+
+    Returns:
+        dict: See stats.summarize_league. Matches that could not be obtained are left out and listed under "errors".
+                Returns an empty dictionary if an invalid response is received from the API.
+    """
+    ret = {}
+    puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = get_recent_match_ids(puuid, count, "1", queue)
+        if data is not None:
+            api_key = KEYS.for_puuid(puuid)
+            ret = summarize_stats(puuid, data, lambda match_id: get_match_record(match_id, api_key))
+    return ret
+
+
+def summarize_stats(puuid, match_ids, get_record):
+    """The part of get_match_stats after the match IDs are known: get the player's rows and sum them up
+
+    Args:
+        puuid (str): Unique player ID of the summoner
+        match_ids (list): The matches to sum up, most recent first
+        get_record (function): get_record(match_id) returns the compact record of a match, see stats.PlayerStats.select
+
+    Returns:
+        dict: See get_match_stats
+    """
+    rows, _, errors = stats.LEAGUE.select(puuid, match_ids, get_record)
+    ret = stats.summarize_league(rows, stats.LEAGUE.names)
+    if errors:
+        riot_client.incomplete()
+        ret["errors"] = errors
+    return ret
+
+
+def get_recent_match_ids(puuid, count, start="1", queue=None):
+    """Get the IDs of a summoner's <count> most recent matches, starting at <start> matches backwards
+
+    Args:
+        puuid (str): Unique player ID of the summoner
+        count (str): The number of match IDs to get
+        start (str): The number of the match to start looking back from (1 would be the most recent game)
+        queue (str): Only count matches from this queue ID. Defaults to every queue
+
+    Returns:
+        list: The match IDs, most recent first. Returns None if an invalid response is received from the API.
+    """
+    start_int = int(start)
+    # Riot API zero-indexes games, so subtract one
+    if start_int > 0:
+        start_int -= 1
+    if history.INCREMENTAL_HISTORY:
+        # Only asks Riot for the matches played since the last time we looked this player up
+        return HISTORIES.get().get_ids(puuid, start_int, int(count), queue)
+    query = {"start": start_int, "count": count}
+    if queue is not None:
+        query["queue"] = queue
+    return get_match_ids(puuid, query)
+
+
+def get_match_ids(puuid, query):
+    """Call the Riot API to get a page of a summoner's match IDs
+
+    Args:
+        puuid (str): Unique player ID of the summoner
+        query (dict): Query parameters for the match-ids endpoint, such as start, count, startTime and queue
+
+    Returns:
+        list: The match IDs, most recent first. Returns None if an invalid response is received from the API.
+    """
+    # Match histories are on the regional host, not the platform one
+    url = regions.match_url()+"/lol/match/v5/matches/by-puuid/"+puuid+"/ids?"+urlencode(query)
+    response = riot_client.get(url, KEYS.for_puuid(puuid))
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+def match_start_time(match_id):
+    """Get the start time of a match that is already in the match store, in epoch seconds, or None if we do not have it"""
+    for api_key in KEYS.keys:    # Any key's copy of the match has the same start time
+        record = MATCHES.get(KEYS.store_id(match_id, api_key))
+        if record is not None:
+            return record["gameStartTimestamp"] // 1000
+    return None
+
+
+# Match histories are kept per region, since Riot only lists the matches a player played in the region that is asked
+HISTORIES = regions.PerRegion(lambda region: history.MatchHistory("league/" + region, get_match_ids, match_start_time))
+
+
+def get_match_or_error(match_id, puuid):
+    """Wrapper around get_match_info used when fetching many matches at once, so that one match failing
+        is reported in its own slot of the list instead of failing the whole request
+
+    Args:
+        match_id (str): Unique ID of the requested match
+        puuid (str): Unique player ID of the requested summoner
+
+    Returns:
+        dict: The result of get_match_info, or {"matchId": match_id, "error": reason} if the match could not be obtained
+    """
+    try:
+        match = get_match_info(match_id, puuid)
+    except Exception as e:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": str(e)}
+    if not match:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": "Invalid response from the Riot API"}
+    return match
+
+
 def get_champion_name(champion_id):
     """Convert a champion ID into the corresponding champion name
 
@@ -207,9 +470,9 @@ def get_champion_name(champion_id):
         champion_id (str): The ID of the champion whose name we want
 
     Returns:
-        str: The name of the champion
+        str: The name of the champion, or a placeholder if it is not in the static data yet (e.g. a brand new champion)
     """
-    return CHAMPION_IDS[champion_id]
+    return static_data.champion_name(champion_id)
 
 league_codes =  {   "SOLO": "RANKED_SOLO_5x5",
                     "FLEX": "RANKED_FLEX_SR"
@@ -229,21 +492,40 @@ def get_summoner_rank(summoner_name, tagline, league_type="SOLO"):
     """
     ret = []
     puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:
+        # A fresh snapshot of the whole ladder already has everyone's rank, see ladder.py
+        ranked = ladder.lookup("league", regions.platform(), league_codes.get(league_type, league_codes["SOLO"]), puuid, KEYS.for_puuid(puuid))
+        if ranked is not None:
+            return ranked
     encryptedID = get_summoner_id(puuid)
     if len(encryptedID) > 0 :
-        url = TARGET+"/lol/league/v4/entries/by-puuid/"+encryptedID+"?api_key="+API_KEY
+        url = regions.platform_url()+"/lol/league/v4/entries/by-puuid/"+encryptedID
         #print(url)
-        response = requests.get(url)
+        response = riot_client.get(url, KEYS.for_puuid(puuid))
         #print(str(response))
         if response.status_code == 200:
-            if league_type in league_codes:
-                code = league_codes[league_type]
-            else:
-                code = league_codes["SOLO"]
-            data = response.json()
-            for league in data:
-                if league["queueType"] == code:
-                    ret = [league["tier"], league["rank"], league["leaguePoints"]]
+            ret = parse_rank(response.json(), league_type)
+    return ret
+
+
+def parse_rank(data, league_type="SOLO"):
+    """Find one league type in a league-v4 entries response
+
+    Args:
+        data (list): The JSON from the league entries endpoint, one entry per league the player is ranked in
+        league_type (str): The name of the league we want (SOLO or FLEX)
+
+    Returns:
+        list: Contains the tier, division, and LP of the player, or an empty list if they are not ranked in that league
+    """
+    ret = []
+    if league_type in league_codes:
+        code = league_codes[league_type]
+    else:
+        code = league_codes["SOLO"]
+    for league in data:
+        if league["queueType"] == code:
+            ret = [league["tier"], league["rank"], league["leaguePoints"]]
     return ret
 
 
@@ -256,15 +538,21 @@ def get_summoner_id(puuid):
     Returns:
         str: The encrypted summoner ID. Returns an empty string if an invalid response is received from the API.
     """
+    api_key = KEYS.for_puuid(puuid)
+    # Summoner IDs are different on every platform, and encrypted for the key they were looked up with
+    key = ("summoner", "league", regions.platform(), riot_client.key_name(api_key), puuid)
+    ret = cache.IDENTITIES.get(key)
+    if ret is not None:
+        return ret
     ret = ""
-    url = TARGET+"/lol/summoner/v4/summoners/by-puuid/"+ puuid + "?api_key="+API_KEY
+    if len(puuid) == 0:    # No point asking Riot about a player we could not find
+        return ret
+    url = regions.platform_url()+"/lol/summoner/v4/summoners/by-puuid/"+ puuid
     #print(url)
-    response = requests.get(url)
-    data = response.json()
-    #print(response.status_code)
+    response = riot_client.get(url, api_key)
     if response.status_code == 200:
-        #print("get_summoner_id good")
-        ret = data["puuid"]
+        ret = response.json()["puuid"]
+        cache.IDENTITIES.set(key, ret)
     return ret
 
 
@@ -277,13 +565,21 @@ def get_summoner_puuid(summoner_name, tagline):
     Returns:
         str: The unique summoner puuid. Returns an empty string if an invalid response is received from the API.
     """   
+    api_key = KEYS.for_riot_id(summoner_name, tagline)    # Every later call about this player has to use the same key
+    key = cache.riot_id_key("league", summoner_name, tagline, riot_client.key_name(api_key))
+    ret = cache.IDENTITIES.get(key)
+    if ret is not None:
+        KEYS.remember(ret, api_key)
+        return ret
     ret = ""  
-    url = ACCOUNT_TARGET+"/riot/account/v1/accounts/by-riot-id/"+ summoner_name + "/" + tagline + "?api_key="+API_KEY
+    url = regions.account_url()+"/riot/account/v1/accounts/by-riot-id/"+ summoner_name + "/" + tagline
     #print(url)
-    response = requests.get(url)
-    data = response.json()
-    #print(response.status_code)
+    response = riot_client.get(url, api_key)
     if response.status_code == 200:
-        #print("get_puuid good")
-        ret = data["puuid"]
+        ret = response.json()["puuid"]
+        cache.IDENTITIES.set(key, ret)
+        KEYS.remember(ret, api_key)
+    elif response.status_code == 404:
+        # Remember that this Riot ID does not exist for a short time, but do not cache other errors (rate limits, outages)
+        cache.IDENTITIES.set(key, ret, cache.IDENTITY_NEGATIVE_TTL)
     return ret
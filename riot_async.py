@@ -0,0 +1,241 @@
+"""
+Async versions of the League methods in riot.py, used by game_api_async.py. Each one makes the same Riot API calls
+as its riot.py counterpart, but awaits them on an async HTTP client so that a single process can wait on many
+calls at once. They share riot.py's constants, caches and parsing, so the JSON they return is identical.
+"""
+import asyncio
+from urllib.parse import urlencode
+import cache
+import history
+import ladder
+import regions
+import riot
+import riot_client
+import stats
+import timeline
+import workers
+from riot import KEYS
+
+
+async def get_top_champs(summoner_name, tagline, count):
+    """Async version of riot.get_top_champs"""
+    ret = {}
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        url = regions.platform_url()+"/lol/champion-mastery/v4/champion-masteries/by-puuid/"+puuid+"/top?count="+count
+        api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+        response = await riot_client.get_async(url, api_key)
+        if response.status_code == 200:
+            ret = riot.parse_top_champs(response.json())
+    return ret
+
+
+async def get_match_record(match_id, api_key=None):
+    """Async version of riot.get_match_record"""
+    api_key = api_key or KEYS.keys[0]
+    store_id = KEYS.store_id(match_id, api_key)
+    # The match store reads and writes a SQLite file, so do that in a thread rather than on the event loop
+    record = await asyncio.to_thread(riot.MATCHES.get, store_id)
+    if record is None:
+        url = regions.match_url(regions.match_id_platform(match_id))+"/lol/match/v5/matches/"+match_id
+        response = await riot_client.get_async(url, api_key)
+        if response.status_code == 200:
+            record = await asyncio.to_thread(riot.MATCHES.put, store_id, response.content)
+    return record
+
+
+async def get_match_info(match_id, puuid):
+    """Async version of riot.get_match_info"""
+    ret = {}
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    record = await get_match_record(match_id, api_key)
+    if record is not None:
+        ret = riot.parse_match_info(record, puuid)
+    return ret
+
+
+async def get_match_or_error(match_id, puuid):
+    """Async version of riot.get_match_or_error"""
+    try:
+        match = await get_match_info(match_id, puuid)
+    except Exception as e:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": str(e)}
+    if not match:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": "Invalid response from the Riot API"}
+    return match
+
+
+async def get_matches(summoner_name, tagline, count, start="1", queue=None):
+    """Async version of riot.get_matches"""
+    ret = []
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = await get_recent_match_ids(puuid, count, start, queue)
+        if data is not None:
+            ret = await workers.gather_ordered(lambda match_id: get_match_or_error(match_id, puuid), data)
+    return ret
+
+
+async def iter_matches(summoner_name, tagline, count, start="1", queue=None):
+    """Async version of riot.iter_matches, gives back an async iterator"""
+    data = []
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = await get_recent_match_ids(puuid, count, start, queue) or []
+    return workers.gather_unordered(lambda match_id: get_match_or_error(match_id, puuid), data)
+
+
+async def get_recent_match_ids(puuid, count, start="1", queue=None):
+    """Async version of riot.get_recent_match_ids. It uses the same stored histories as the sync app, so both apps
+        list the same matches"""
+    start_int = int(start)
+    # Riot API zero-indexes games, so subtract one
+    if start_int > 0:
+        start_int -= 1
+    if history.INCREMENTAL_HISTORY:
+        return await riot.HISTORIES.get().get_ids_async(get_match_ids, puuid, start_int, int(count), queue)
+    query = {"start": start_int, "count": count}
+    if queue is not None:
+        query["queue"] = queue
+    return await get_match_ids(puuid, query)
+
+
+async def get_match_ids(puuid, query):
+    """Async version of riot.get_match_ids"""
+    url = regions.match_url()+"/lol/match/v5/matches/by-puuid/"+puuid+"/ids?"+urlencode(query)
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    response = await riot_client.get_async(url, api_key)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+async def get_match_stats(summoner_name, tagline, count, queue=None):
+    """Async version of riot.get_match_stats. The matches are fetched on the async client first, and only the NumPy
+        work (stats.PlayerStats.select and the summary) runs in a thread"""
+    ret = {}
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = await get_recent_match_ids(puuid, count, "1", queue)
+        if data is not None:
+            api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+            get_record = await prefetch_records(stats.LEAGUE, puuid, data, lambda match_id: get_match_record(match_id, api_key),
+                                                lambda match_id: riot.get_match_record(match_id, api_key))
+            ret = await asyncio.to_thread(riot.summarize_stats, puuid, data, get_record)
+    return ret
+
+
+async def prefetch_records(table, puuid, match_ids, get_record, get_record_blocking):
+    """Fetch on the async client the records that stats.PlayerStats.select would fetch, so that select can run in a
+        thread without waiting on Riot there
+
+    Args:
+        table (stats.PlayerStats): The stats table the records are for
+        puuid (str): Unique player ID of the summoner
+        match_ids (list): The matches that will be selected
+        get_record (function): Coroutine function that gets the compact record of a match
+        get_record_blocking (function): The same as a normal function, for a match that was added to the table and then
+                                        pushed out of it again before select ran (the records are fetched again then)
+
+    Returns:
+        function: The get_record to give select, which gives back the fetched records (or raises what fetching raised)
+    """
+    missing = table.missing(puuid, match_ids)
+
+    async def fetch(match_id):
+        try:
+            return await get_record(match_id)
+        except Exception as e:
+            return e
+
+    records = dict(zip(missing, await workers.gather_ordered(fetch, missing)))
+
+    def fetched(match_id):
+        if match_id not in records:
+            return get_record_blocking(match_id)
+        if isinstance(records[match_id], Exception):
+            raise records[match_id]
+        return records[match_id]
+
+    return fetched
+
+
+async def get_timeline(summoner_name, tagline, start="1"):
+    """Async version of riot.get_timeline. The summoner, match ID and match are fetched on the async client. The
+        timeline is parsed while it is being downloaded (see timeline.py), which needs the blocking client to hand the
+        body to ijson, so only that download runs in a thread, at the same time as the match"""
+    ret = {}
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = await get_recent_match_ids(puuid, "1", start)
+        if data:
+            match_id = data[0]
+            api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+            record, timeline_record = await asyncio.gather(get_match_record(match_id, api_key),
+                                                           asyncio.to_thread(riot.get_timeline_record, match_id, api_key))
+            if record is not None and timeline_record is not None and puuid in record["participants"]:
+                ret = timeline.curves(timeline_record, record, puuid)
+                if ret:
+                    ret["matchId"] = match_id
+    return ret
+
+
+async def get_summoner_rank(summoner_name, tagline, league_type="SOLO"):
+    """Async version of riot.get_summoner_rank"""
+    ret = []
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    if len(puuid) > 0:
+        # The snapshot is read from disk when a newer one shows up, so do that in a thread rather than on the event loop
+        queue = riot.league_codes.get(league_type, riot.league_codes["SOLO"])
+        ranked = await asyncio.to_thread(ladder.lookup, "league", regions.platform(), queue, puuid, api_key)
+        if ranked is not None:
+            return ranked
+    encryptedID = await get_summoner_id(puuid)
+    if len(encryptedID) > 0 :
+        url = regions.platform_url()+"/lol/league/v4/entries/by-puuid/"+encryptedID
+        response = await riot_client.get_async(url, api_key)
+        if response.status_code == 200:
+            ret = riot.parse_rank(response.json(), league_type)
+    return ret
+
+
+async def get_summoner_id(puuid):
+    """Async version of riot.get_summoner_id"""
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    key = ("summoner", "league", regions.platform(), riot_client.key_name(api_key), puuid)
+    ret = await cache.off_loop(cache.IDENTITIES.get, key)
+    if ret is not None:
+        return ret
+    ret = ""
+    if len(puuid) == 0:    # No point asking Riot about a player we could not find
+        return ret
+    url = regions.platform_url()+"/lol/summoner/v4/summoners/by-puuid/"+ puuid
+    response = await riot_client.get_async(url, api_key)
+    if response.status_code == 200:
+        ret = response.json()["puuid"]
+        await cache.off_loop(cache.IDENTITIES.set, key, ret)
+    return ret
+
+
+async def get_summoner_puuid(summoner_name, tagline):
+    """Async version of riot.get_summoner_puuid"""
+    api_key = await cache.off_loop(KEYS.for_riot_id, summoner_name, tagline)
+    key = cache.riot_id_key("league", summoner_name, tagline, riot_client.key_name(api_key))
+    ret = await cache.off_loop(cache.IDENTITIES.get, key)
+    if ret is not None:
+        await cache.off_loop(KEYS.remember, ret, api_key)
+        return ret
+    ret = ""
+    url = regions.account_url()+"/riot/account/v1/accounts/by-riot-id/"+ summoner_name + "/" + tagline
+    response = await riot_client.get_async(url, api_key)
+    if response.status_code == 200:
+        ret = response.json()["puuid"]
+        await cache.off_loop(cache.IDENTITIES.set, key, ret)
+        await cache.off_loop(KEYS.remember, ret, api_key)
+    elif response.status_code == 404:
+        # Remember that this Riot ID does not exist for a short time, but do not cache other errors (rate limits, outages)
+        await cache.off_loop(cache.IDENTITIES.set, key, ret, cache.IDENTITY_NEGATIVE_TTL)
+    return ret
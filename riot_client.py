@@ -0,0 +1,617 @@
+"""
+This file is for sending requests to the Riot API. Every call goes through one shared requests.Session, so the
+connection to each Riot host (na1, americas, ...) is kept alive and reused instead of doing a new TCP and TLS
+handshake for every call. Every call also has a timeout, so a stalled Riot server can not hold a Flask worker forever.
+
+Calls are also kept under Riot's rate limits. Riot tells us the limits for our key ("X-App-Rate-Limit: 20:1,100:120",
+20 calls per second and 100 per two minutes) and for each endpoint ("X-Method-Rate-Limit") on every response. We keep
+track of our own calls in those same windows for each routing host, wait before sending a call that would go over,
+and retry 429 and 5xx responses after the delay that Riot asks for in Retry-After.
+Identical calls that are made while one is already waiting on Riot share its response instead of being sent again.
+
+A product (League or TFT) can have several API keys, each with its own rate limits, see KeyPool.
+When a shared store is set up with CACHE_BACKEND (see backends.py), every worker process also counts its calls there,
+so all of them together stay within one budget instead of each one using the whole limit.
+"""
+import asyncio
+import contextvars
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import backends
+import cache
+import metrics
+
+# Number of connections kept open to each Riot host, should be at least the number of calls we make at once
+POOL_SIZE = int(os.environ.get('RIOT_POOL_SIZE', '20'))
+# Number of different Riot hosts that keep their own pool of connections, enough for every platform and region (see regions.py)
+POOL_HOSTS = int(os.environ.get('RIOT_POOL_HOSTS', '32'))
+# Seconds to wait for a connection to Riot, and then for Riot to send back data
+CONNECT_TIMEOUT = float(os.environ.get('RIOT_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.environ.get('RIOT_READ_TIMEOUT', '10'))
+# App rate limits to use for a host until Riot tells us the real ones, these are the limits of a development key
+DEFAULT_APP_RATE_LIMIT = os.environ.get('RIOT_APP_RATE_LIMIT', '20:1,100:120')
+# Number of times a call is retried after a 429 or 5xx response, and the first delay (doubled each time) if Riot does not send Retry-After
+MAX_RETRIES = int(os.environ.get('RIOT_MAX_RETRIES', '3'))
+RETRY_BACKOFF = float(os.environ.get('RIOT_RETRY_BACKOFF', '1'))
+# Share of a key's rate limit that has to be left for a player to stay on the key their IDs were looked up with, see KeyPool
+KEY_SWITCH_HEADROOM = float(os.environ.get('RIOT_KEY_SWITCH_HEADROOM', '0.1'))
+# Send every call to this address instead of the Riot hosts, e.g. http://127.0.0.1:8089 for the mock server in bench/
+API_OVERRIDE = os.environ.get('RIOT_API_OVERRIDE')
+
+# Names for each Riot endpoint that we use, so that calls to the same endpoint share a method rate limit
+ROUTES = [
+    ("account", re.compile(r"^/riot/account/v1/accounts/by-riot-id/")),
+    ("summoner", re.compile(r"^/lol/summoner/v4/summoners/by-puuid/")),
+    ("league", re.compile(r"^/lol/league/v4/entries/by-puuid/")),
+    ("mastery", re.compile(r"^/lol/champion-mastery/v4/champion-masteries/by-puuid/[^/]+/top")),
+    ("match-ids", re.compile(r"^/lol/match/v5/matches/by-puuid/[^/]+/ids")),
+    ("match", re.compile(r"^/lol/match/v5/matches/[^/]+$")),
+    ("timeline", re.compile(r"^/lol/match/v5/matches/[^/]+/timeline$")),
+    ("tft-league", re.compile(r"^/tft/league/v1/entries/by-summoner/")),
+    ("tft-match-ids", re.compile(r"^/tft/match/v1/matches/by-puuid/[^/]+/ids")),
+    ("tft-match", re.compile(r"^/tft/match/v1/matches/[^/]+$")),
+    # Whole ladders, for ladder.py. After "league" and "tft-league", whose paths these would also match
+    ("league-entries", re.compile(r"^/lol/league/v4/entries/[^/]+/[^/]+/[^/]+$")),
+    ("apex-league", re.compile(r"^/lol/league/v4/(challenger|grandmaster|master)leagues/by-queue/")),
+    ("tft-league-entries", re.compile(r"^/tft/league/v1/entries/[^/]+/[^/]+$")),
+    ("tft-apex-league", re.compile(r"^/tft/league/v1/(challenger|grandmaster|master)$")),
+]
+
+
+def route_name(path):
+    """Get the name of the Riot endpoint that a URL path belongs to
+
+    Args:
+        path (str): The path part of a Riot API URL
+
+    Returns:
+        str: The endpoint name from ROUTES, or the path itself if it is not one of them
+    """
+    for name, pattern in ROUTES:
+        if pattern.match(path):
+            return name
+    return path
+
+
+def parse_limits(header):
+    """Turn a rate limit header such as "20:1,100:120" into a list of (count, seconds) pairs"""
+    limits = []
+    if header:
+        for pair in header.split(","):
+            count, seconds = pair.split(":")
+            limits.append((int(count), int(seconds)))
+    return limits
+
+
+class RateLimiter:
+    """Keeps track of the calls made in each rate limit window, for each bucket (an API key on a host, or an endpoint of it)"""
+
+    def __init__(self, shared=None):
+        """
+        Args:
+            shared (backends.SQLiteBackend or backends.RedisBackend): Store where the calls of every worker process are
+                counted as well, None if this process is the only one using the keys
+        """
+        self.shared = shared
+        self._windows = {}    # bucket -> {seconds: [limit, deque of call times]}
+        self._blocked = {}    # bucket -> time until which no calls may be sent
+        self._lock = threading.Lock()
+
+    def _wait_time(self, bucket, now):
+        wait = self._blocked.get(bucket, 0) - now
+        for seconds, (limit, calls) in self._windows.get(bucket, {}).items():
+            while calls and calls[0] <= now - seconds:
+                calls.popleft()
+            if len(calls) >= limit:
+                wait = max(wait, calls[0] + seconds - now)
+        return wait
+
+    def try_acquire(self, buckets):
+        """Count a call against every window of every bucket, if it fits in all of them
+
+        Args:
+            buckets (list): The buckets that the call counts towards
+
+        Returns:
+            float: 0 if the call was counted and can be sent now, otherwise the number of seconds to wait before trying again
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._wait_time(bucket, now) for bucket in buckets)
+            if wait > 0:
+                return wait
+            if self.shared is None:
+                for bucket in buckets:
+                    for limit, calls in self._windows.get(bucket, {}).values():
+                        calls.append(now)
+                return 0
+            windows = {bucket: [(limit, seconds) for seconds, (limit, calls) in self._windows.get(bucket, {}).items()] for bucket in buckets}
+        wait = self._try_shared(buckets, windows)
+        if wait > 0:
+            return wait
+        with self._lock:
+            now = time.monotonic()
+            for bucket in buckets:
+                for limit, calls in self._windows.get(bucket, {}).values():
+                    calls.append(now)
+        return 0
+
+    def _try_shared(self, buckets, windows):
+        """Count a call in the shared store, in every window of every bucket. The shared counts use fixed windows (the
+            calls from 12:00:00 to 12:00:10, then from 12:00:10 ...) so that a window is one counter
+
+        Returns:
+            float: 0 if the call was counted, otherwise the number of seconds until the full window is over
+        """
+        now = time.time()    # Wall clock time, the same in every process
+        wait = 0
+        for bucket in buckets:
+            blocked = self.shared.get("ratelimit-blocked:" + backends.key_string(bucket))
+            if blocked is not None:
+                wait = max(wait, blocked - now)
+        if wait > 0:
+            return wait
+        counted = []
+        for bucket in buckets:
+            for limit, seconds in windows[bucket]:
+                slot = int(now // seconds)
+                key = "ratelimit:%s:%d:%d" % (backends.key_string(bucket), seconds, slot)
+                count = self.shared.incr(key, 1, seconds * 2)
+                if count is None:
+                    continue    # The store is down, the count of this process still applies
+                counted.append((key, seconds))
+                if count > limit:
+                    wait = max(wait, (slot + 1) * seconds - now)
+        if wait > 0:
+            # The call is not sent, so take it back out of every window it was counted in
+            for key, seconds in counted:
+                self.shared.incr(key, -1, seconds * 2)
+        return wait
+
+    def acquire(self, buckets):
+        """Wait until a call fits in every window of every bucket, then count it against them"""
+        wait = self.try_acquire(buckets)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire(buckets)
+
+    async def acquire_async(self, buckets):
+        """Same as acquire, but waits without blocking the event loop. The calls are counted in the shared store from a
+            thread, so a slow store does not hold up the loop either"""
+        wait = await self._try_acquire_async(buckets)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = await self._try_acquire_async(buckets)
+
+    async def _try_acquire_async(self, buckets):
+        if self.shared is None:
+            return self.try_acquire(buckets)
+        return await asyncio.to_thread(self.try_acquire, buckets)
+
+    def has_limits(self, bucket):
+        """Check if we know any rate limit windows for this bucket yet"""
+        return bucket in self._windows
+
+    def set_limits(self, bucket, limits):
+        """Use the windows in <limits>, a list of (count, seconds), for this bucket. Calls already counted are kept"""
+        with self._lock:
+            if bucket not in self._windows:
+                self._windows[bucket] = {}
+            windows = self._windows[bucket]
+            for count, seconds in limits:
+                if seconds in windows:
+                    windows[seconds][0] = count
+                else:
+                    windows[seconds] = [count, deque()]
+
+    def update(self, bucket, limit_header, count_header):
+        """Sync a bucket with the limit and count headers of a Riot response
+
+        Args:
+            bucket (tuple): The bucket the call counted towards
+            limit_header (str): The value of X-App-Rate-Limit or X-Method-Rate-Limit, None if it was not sent
+            count_header (str): The value of X-App-Rate-Limit-Count or X-Method-Rate-Limit-Count, None if it was not sent
+        """
+        limits = parse_limits(limit_header)
+        if limits:
+            self.set_limits(bucket, limits)
+        with self._lock:
+            now = time.monotonic()
+            windows = self._windows.get(bucket, {})
+            for count, seconds in parse_limits(count_header):
+                # Riot has seen more calls than we counted (another process using the same key, or a restart), so catch up
+                if seconds in windows:
+                    calls = windows[seconds][1]
+                    for i in range(count - len(calls)):
+                        calls.append(now)
+
+    def block(self, bucket, seconds):
+        """Stop sending calls in this bucket for a number of seconds, after Riot told us to back off"""
+        with self._lock:
+            self._blocked[bucket] = max(self._blocked.get(bucket, 0), time.monotonic() + seconds)
+        if self.shared is not None:
+            self.shared.set("ratelimit-blocked:" + backends.key_string(bucket), time.time() + seconds, seconds)
+
+    def headroom(self, bucket):
+        """Get the share of the fullest window of a bucket that is still free
+
+        Returns:
+            float: From 0 (a window is full, or the bucket is blocked) to 1 (nothing used, or no known windows)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._blocked.get(bucket, 0) > now:
+                return 0.0
+            ret = 1.0
+            for seconds, (limit, calls) in self._windows.get(bucket, {}).items():
+                while calls and calls[0] <= now - seconds:
+                    calls.popleft()
+                ret = min(ret, max(limit - len(calls), 0) / max(limit, 1))
+            return ret
+
+    def buckets(self):
+        """Get every bucket that we know rate limit windows for"""
+        with self._lock:
+            return list(self._windows)
+
+    def usage(self):
+        """Get the current use of every bucket
+
+        Returns:
+            dict: {bucket: {"windows": [{"limit": int, "seconds": int, "used": int}], "blocked_for": float}}
+        """
+        ret = {}
+        with self._lock:
+            now = time.monotonic()
+            for bucket, windows in self._windows.items():
+                used = []
+                for seconds, (limit, calls) in sorted(windows.items()):
+                    used.append({"limit": limit, "seconds": seconds, "used": sum(1 for t in calls if t > now - seconds)})
+                ret[bucket] = {"windows": used, "blocked_for": round(max(self._blocked.get(bucket, 0) - now, 0), 2)}
+        return ret
+
+
+LIMITER = RateLimiter(backends.shared())
+
+
+def _make_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = _make_session()
+
+
+def key_name(api_key):
+    """Shortened form of an API key, safe to show in status output"""
+    return "..." + (api_key or "")[-4:]
+
+
+class KeyPool:
+    """The API keys of one product, with calls spread over the keys by how much of their rate limits is left.
+
+    Riot encrypts PUUIDs and summoner IDs differently for every key, and an ID only works with the key it was looked
+    up with. So a key is chosen once per player, when their Riot ID is looked up (see for_riot_id), and every call about
+    that player then uses the same key (see for_puuid). Anything cached that holds those IDs is kept apart per key.
+    """
+
+    def __init__(self, keys, name):
+        """
+        Args:
+            keys (list): The API keys, empty ones are skipped
+            name (str): The name of the pool, which keeps its choices apart from other pools in a shared cache
+        """
+        self.keys = [key.strip() for key in keys if key and key.strip()] or [None]
+        self._by_name = {key_name(key): key for key in self.keys}
+        # Riot ID or PUUID -> key_name of its key, shared between workers like the identities are (keys themselves are never stored)
+        self._owners = cache.TTLCache(cache.IDENTITY_CACHE_SIZE, cache.IDENTITY_TTL, store=cache.open_store("keys-" + name, cache.IDENTITY_CACHE_SIZE))
+        self._turn = itertools.count()
+
+    def headroom(self, api_key):
+        """Get the share of the app rate limit of a key that is still free, on the host where it has the least left"""
+        name = key_name(api_key)
+        buckets = [bucket for bucket in LIMITER.buckets() if len(bucket) == 2 and bucket[0] == name]
+        return min((LIMITER.headroom(bucket) for bucket in buckets), default=1.0)
+
+    def choose(self):
+        """Get the key with the most of its rate limits left, taking turns between keys that have the same"""
+        if len(self.keys) == 1:
+            return self.keys[0]
+        start = next(self._turn) % len(self.keys)
+        return max(self.keys[start:] + self.keys[:start], key=self.headroom)
+
+    def for_riot_id(self, summoner_name, tagline):
+        """Get the key to look up a player's PUUID with. A player stays on the same key while it has room, since moving
+            them means looking up their IDs and downloading their matches again with the new key
+
+        Args:
+            summoner_name (str): The name part of the Riot ID
+            tagline (str): The tagline part of the Riot ID
+
+        Returns:
+            str: The API key
+        """
+        riot_id = ("riot-id", summoner_name.strip().lower(), tagline.strip().lower())
+        api_key = self._by_name.get(self._owners.get(riot_id))
+        if api_key is None or (len(self.keys) > 1 and self.headroom(api_key) < KEY_SWITCH_HEADROOM):
+            api_key = self.choose()
+            self._owners.set(riot_id, key_name(api_key))
+        return api_key
+
+    def remember(self, puuid, api_key):
+        """Note that <puuid> was looked up with <api_key>, so for_puuid sends the calls about that player with it"""
+        if puuid:
+            self._owners.set(("puuid", puuid), key_name(api_key))
+
+    def for_puuid(self, puuid):
+        """Get the key that a PUUID was looked up with, which is the only one that Riot accepts it from"""
+        return self._by_name.get(self._owners.get(("puuid", puuid))) or self.keys[0]
+
+    def store_id(self, match_id, api_key):
+        """Get the ID under which a match downloaded with <api_key> is stored. Match records hold the players' PUUIDs,
+            so every key has its own copy. The first key uses the plain match ID, the same as when there was only one key"""
+        if api_key == self.keys[0]:
+            return match_id
+        return key_name(api_key)[3:] + "/" + match_id
+
+
+def _buckets(url, api_key):
+    """Get the app bucket (API key on a host) and method bucket (endpoint on that host) that a call counts towards"""
+    parts = urlsplit(url)
+    app_bucket = (key_name(api_key), parts.netloc)
+    method_bucket = (key_name(api_key), parts.netloc, route_name(parts.path))
+    if not LIMITER.has_limits(app_bucket):
+        LIMITER.set_limits(app_bucket, parse_limits(DEFAULT_APP_RATE_LIMIT))
+    return [app_bucket, method_bucket]
+
+
+def _target(url):
+    """The URL to actually send a call to, which is only different from <url> when RIOT_API_OVERRIDE is set. Rate limits
+        are still kept per Riot host, so a mock server sees the same traffic as Riot would"""
+    if not API_OVERRIDE:
+        return url
+    parts = urlsplit(url)
+    return API_OVERRIDE.rstrip("/") + parts.path + ("?" + parts.query if parts.query else "")
+
+
+def _should_retry(buckets, response, attempt):
+    """Update the rate limits from a response, and decide if the call has to be sent again
+
+    Args:
+        buckets (list): The app and method buckets of the call
+        response (requests.Response or httpx.Response): The response from Riot
+        attempt (int): How many times the call was already retried
+
+    Returns:
+        bool: True if the call should be retried. The bucket that Riot asked us to back off on is blocked until it may be retried
+    """
+    app_bucket, method_bucket = buckets
+    LIMITER.update(app_bucket, response.headers.get("X-App-Rate-Limit"), response.headers.get("X-App-Rate-Limit-Count"))
+    LIMITER.update(method_bucket, response.headers.get("X-Method-Rate-Limit"), response.headers.get("X-Method-Rate-Limit-Count"))
+    if response.status_code != 429 and response.status_code < 500:
+        return False
+    if attempt >= MAX_RETRIES:
+        return False
+    delay = RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())    # Jitter so waiting calls do not all retry at once
+    if "Retry-After" in response.headers:
+        delay = float(response.headers["Retry-After"])
+    if response.status_code == 429 and response.headers.get("X-Rate-Limit-Type") == "application":
+        LIMITER.block(app_bucket, delay)    # Every call with this key on this host has to wait
+    else:
+        LIMITER.block(method_bucket, delay)
+    return True
+
+
+class Outcome:
+    """Whether Riot answered every call made for one result, see cacheable"""
+
+    def __init__(self):
+        self.complete = True
+
+
+# The Outcome of the result being made. Like metrics.CURRENT, it follows the result into threads started with
+# workers.py and into async tasks, so calls made in parallel are counted too
+OUTCOME = contextvars.ContextVar("riot_outcome", default=None)
+
+
+def cacheable(func, *args):
+    """Run func(*args) and tell whether its result is worth caching. A result is not if Riot failed to answer one of
+        the calls made for it (rate limits, outages), or if func reported part of it missing with incomplete. An empty
+        result that Riot did answer, such as the rank of an unranked player, is cached like any other
+
+    Returns:
+        tuple: (what func returned, True if it can be cached)
+    """
+    outcome = Outcome()
+    token = OUTCOME.set(outcome)
+    try:
+        value = func(*args)
+    finally:
+        OUTCOME.reset(token)
+    return value, outcome.complete
+
+
+def incomplete():
+    """Report that the result being made is missing something (e.g. a match that could not be obtained), so it is
+        served but not cached"""
+    outcome = OUTCOME.get()
+    if outcome is not None:
+        outcome.complete = False
+
+
+def _answered(status_code):
+    """Count a response towards the result being made. 404 is an answer too (no such player or match), anything
+        else but 200 means Riot could not give one"""
+    if status_code != 200 and status_code != 404:
+        incomplete()
+
+
+IN_FLIGHT = cache.SingleFlight()
+
+
+def get(url, api_key):
+    """Send a GET request to the Riot API over a pooled keep-alive connection, staying within the rate limits
+        and retrying responses that are 429 (rate limited) or 5xx (Riot having trouble)
+
+    Args:
+        url (str): The full URL of the Riot API endpoint
+        api_key (str): The Riot API key to send with the request
+
+    Returns:
+        requests.Response: The response from Riot, which can still be a 429 or 5xx once the retries run out. Raises
+            requests.exceptions.RequestException if Riot could not be reached or did not answer within the timeouts
+    """
+    # The same call with the same key is already in flight (e.g. many users looking up one streamer), wait for it instead
+    try:
+        response = IN_FLIGHT.do((url, api_key), lambda: _get(url, api_key))
+    except requests.exceptions.RequestException:
+        incomplete()
+        raise
+    _answered(response.status_code)
+    return response
+
+
+def get_parsed(url, api_key, parse):
+    """Same as get, but the body of a 200 response is handed to parse while it is still being downloaded instead of
+        being read into memory first. For large responses of which only a little is kept, such as match timelines
+
+    Args:
+        url (str): The full URL of the Riot API endpoint
+        api_key (str): The Riot API key to send with the request
+        parse (function): parse(file) reads the body from a file-like object and returns what should be kept of it
+
+    Returns:
+        tuple: (status code, what parse returned or None if the status code is not 200). Raises
+            requests.exceptions.RequestException like get
+    """
+    def run():
+        response = _get(url, api_key, stream=True)
+        with response:    # Gives the connection back to the pool, also when the body was not read
+            if response.status_code != 200:
+                return response.status_code, None
+            response.raw.decode_content = True    # Undo gzip as the body is read
+            return 200, parse(response.raw)
+    try:
+        status_code, parsed = IN_FLIGHT.do(("parsed", url, api_key), run)
+    except requests.exceptions.RequestException:
+        incomplete()
+        raise
+    _answered(status_code)
+    return status_code, parsed
+
+
+def _get(url, api_key, stream=False):
+    buckets = _buckets(url, api_key)
+    route = buckets[1][2]
+    attempt = 0
+    while True:
+        waited = time.perf_counter()
+        LIMITER.acquire(buckets)
+        started = time.perf_counter()
+        metrics.RATE_LIMIT_WAIT.inc(route, amount=started - waited)
+        try:
+            response = SESSION.get(_target(url), headers={"X-Riot-Token": api_key}, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=stream)
+        except requests.exceptions.RequestException:
+            metrics.upstream(route, "error", time.perf_counter() - started)
+            raise
+        metrics.upstream(route, response.status_code, time.perf_counter() - started)
+        if not _should_retry(buckets, response, attempt):
+            return response
+        response.close()
+        metrics.UPSTREAM_RETRIES.inc(route, str(response.status_code))
+        attempt += 1
+
+
+ASYNC_SESSION = None
+ASYNC_IN_FLIGHT = cache.AsyncSingleFlight()
+
+
+def async_session():
+    """Get the shared httpx.AsyncClient used by the async serving mode, created on first use so that
+        the normal Flask mode does not need httpx installed"""
+    global ASYNC_SESSION
+    if ASYNC_SESSION is None:
+        import httpx
+        ASYNC_SESSION = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=POOL_SIZE * POOL_HOSTS),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT))
+    return ASYNC_SESSION
+
+
+async def get_async(url, api_key):
+    """Same as get, but as a coroutine on an async HTTP client, so waiting on Riot does not hold a thread
+
+    Returns:
+        httpx.Response: The response from Riot. Raises httpx.HTTPError if Riot could not be reached or did not answer in time
+    """
+    import httpx
+    try:
+        response = await ASYNC_IN_FLIGHT.do((url, api_key), lambda: _get_async(url, api_key))
+    except httpx.HTTPError:
+        incomplete()
+        raise
+    _answered(response.status_code)
+    return response
+
+
+async def _get_async(url, api_key):
+    import httpx
+    buckets = _buckets(url, api_key)
+    route = buckets[1][2]
+    attempt = 0
+    while True:
+        waited = time.perf_counter()
+        await LIMITER.acquire_async(buckets)
+        started = time.perf_counter()
+        metrics.RATE_LIMIT_WAIT.inc(route, amount=started - waited)
+        try:
+            response = await async_session().get(_target(url), headers={"X-Riot-Token": api_key})
+        except httpx.HTTPError:
+            metrics.upstream(route, "error", time.perf_counter() - started)
+            raise
+        metrics.upstream(route, response.status_code, time.perf_counter() - started)
+        # Blocking a bucket after a 429 writes to the shared store, see cache.off_loop
+        if not await cache.off_loop(_should_retry, buckets, response, attempt):
+            return response
+        metrics.UPSTREAM_RETRIES.inc(route, str(response.status_code))
+        attempt += 1
+
+
+def rate_limit_status():
+    """Get how much of each rate limit we are currently using
+
+    Returns:
+        list: One dictionary per bucket, e.g. {"key": "...abcd", "host": "americas.api.riotgames.com", "route": "match",
+                "windows": [{"limit": 2000, "seconds": 10, "used": 37}], "blocked_for": 0}. "route" is None for the
+                app-wide bucket of a key on a host
+    """
+    ret = []
+    for bucket, usage in LIMITER.usage().items():
+        route = bucket[2] if len(bucket) > 2 else None
+        ret.append(dict({"key": bucket[0], "host": bucket[1], "route": route}, **usage))
+    return ret
+
+
+def app_headroom():
+    """Get the share of the app rate limit that is still free on the host that has the least left. With several keys
+        (see KeyPool) calls can go to whichever key has the most room, so that is the one that counts for each host
+
+    Returns:
+        float: From 0 (every key is at its limit on some host) to 1 (nothing used yet)
+    """
+    best = {}    # host -> headroom of its best key
+    for bucket in LIMITER.buckets():
+        if len(bucket) == 2:
+            best[bucket[1]] = max(best.get(bucket[1], 0.0), LIMITER.headroom(bucket))
+    return min(best.values(), default=1.0)
@@ -0,0 +1,148 @@
+"""
+This file is for the static game data that turns Riot's IDs into names: champions, queues, and TFT units and traits.
+Each kind of data is read from its files in data-jsons the first time it is needed (not when the program starts), and
+turned into an ID -> name index once. The files are checked for changes every STATIC_DATA_CHECK seconds, so dropping
+in the Data Dragon files of a new patch (champion.json, tft-champion.json, tft-trait.json, or Riot's queues.json) is
+picked up without a restart. IDs that are not in any file get a placeholder name instead of failing the request.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# Directory of the static data files, data-jsons next to this file unless set
+DATA_DIR = os.environ.get('STATIC_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data-jsons'))
+# Seconds between checks for changed static data files
+STATIC_DATA_CHECK = int(os.environ.get('STATIC_DATA_CHECK', '300'))
+
+log = logging.getLogger(__name__)
+
+
+class Dataset:
+    """One kind of static data, built from one or more files in DATA_DIR when it is first used"""
+
+    def __init__(self, files, build, data_dir=None):
+        """
+        Args:
+            files (list): The file names the data is built from, the ones that do not exist are skipped
+            build (function): build(files) turns {file name: decoded JSON} into the {ID: name} index
+            data_dir (str): The directory of the files. Defaults to DATA_DIR
+        """
+        self.files = files
+        self.build = build
+        self.data_dir = data_dir
+        self._index = None
+        self._mtimes = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def _paths(self):
+        data_dir = self.data_dir or DATA_DIR
+        return {name: os.path.join(data_dir, name) for name in self.files}
+
+    def _load(self):
+        mtimes = {name: os.path.getmtime(path) for name, path in self._paths().items() if os.path.exists(path)}
+        if self._index is not None and mtimes == self._mtimes:
+            return
+        try:
+            loaded = {}
+            for name, path in self._paths().items():
+                if name in mtimes:
+                    with open(path, "r", encoding="utf-8") as f:
+                        loaded[name] = json.load(f)
+            self._index = self.build(loaded)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # A file that is being replaced or is broken should not take the API down, keep what we had
+            log.warning("Could not load static data %s: %s", ", ".join(self.files), e)
+            if self._index is None:
+                self._index = {}
+        self._mtimes = mtimes
+
+    def index(self):
+        """Get the {ID: name} index, loading it or picking up changed files if it is time to"""
+        now = time.monotonic()
+        if self._index is None or now - self._checked >= STATIC_DATA_CHECK:
+            with self._lock:
+                if self._index is None or now - self._checked >= STATIC_DATA_CHECK:
+                    self._load()
+                    self._checked = now
+        return self._index
+
+    def get(self, key, default=None):
+        return self.index().get(str(key), default)
+
+    def reload(self):
+        """Read the files again on the next lookup"""
+        with self._lock:
+            self._index = None
+            self._mtimes = None
+
+
+def _champion_index(files):
+    ret = dict(files.get("champion_ids.json", {}))
+    # Data Dragon's champion.json lists every champion by name, with its numeric ID as "key"
+    for champion in files.get("champion.json", {}).get("data", {}).values():
+        ret[str(champion["key"])] = champion["name"]
+    return ret
+
+
+def _queue_index(files):
+    ret = {}
+    # Riot's queues.json is a list of {"queueId", "map", "description"}, our queue_ids.json has nicer names so it goes last
+    for queue in files.get("queues.json", []):
+        if queue.get("description"):
+            ret[str(queue["queueId"])] = queue["description"].replace(" games", "")
+    for names in files.get("queue_ids.json", []):
+        ret.update(names)
+    return ret
+
+
+def _tft_index(files):
+    ret = {}
+    for data in files.values():
+        # Data Dragon's tft-champion.json and tft-trait.json: {"data": {key: {"id": "TFT13_Jinx", "name": "Jinx", ...}}}
+        for entry in data.get("data", {}).values():
+            ret[entry["id"]] = entry["name"]
+    return ret
+
+
+CHAMPIONS = Dataset(["champion_ids.json", "champion.json"], _champion_index)
+QUEUES = Dataset(["queues.json", "queue_ids.json"], _queue_index)
+TFT_UNITS = Dataset(["tft-champion.json"], _tft_index)
+TFT_TRAITS = Dataset(["tft-trait.json"], _tft_index)
+ALL = [CHAMPIONS, QUEUES, TFT_UNITS, TFT_TRAITS]
+
+
+def champion_name(champion_id):
+    """Get the name of a champion from its numeric ID (e.g. 412 -> "Thresh")"""
+    return CHAMPIONS.get(champion_id) or "Champion " + str(champion_id)
+
+
+def queue_name(queue_id):
+    """Get the name of a queue from its ID (e.g. 420 -> "Ranked Solo/Duo")"""
+    return QUEUES.get(queue_id) or "Queue " + str(queue_id)
+
+
+def _tft_display_name(api_name, dataset):
+    name = dataset.get(api_name)
+    if name is None:
+        name = api_name.split("_", 1)[-1]    # "TFT13_Jinx" -> "Jinx", whatever the set number is
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+def tft_unit_name(character_id):
+    """Get the short lowercase name of a TFT unit (e.g. "TFT13_Jinx" -> "jinx")"""
+    return _tft_display_name(character_id, TFT_UNITS)
+
+
+def tft_trait_name(trait):
+    """Get the short lowercase name of a TFT trait (e.g. "TFT13_Scrap" -> "scrap")"""
+    return _tft_display_name(trait, TFT_TRAITS)
+
+
+def reload():
+    """Read every static data file again on its next lookup"""
+    for dataset in ALL:
+        dataset.reload()
@@ -0,0 +1,388 @@
+"""
+This file is for summing up many matches of a player at once. get_match_info turns a match into a dictionary of
+strings for display, which is fine for a handful of games but slow and lossy to average over a long history. Here
+each player's matches are kept as rows of a NumPy table instead (one typed column per stat), so averages, the
+placement distribution and the per-champion, per-trait and per-unit win rates are a few array operations over the
+whole table rather than a Python loop over dictionaries.
+
+Rows are built from the compact match records in the match store (see cache.py), so matches are never downloaded
+again, and a player's table is kept in memory and only gets rows added for matches it has not seen before.
+"""
+import os
+import threading
+import numpy as np
+import cache
+import static_data
+import workers
+
+# Number of player tables kept in memory (per game), the rows of the others are rebuilt from the match store when needed
+STATS_CACHE_SIZE = int(os.environ.get('STATS_CACHE_SIZE', '2000'))
+# A trait and unit pair needs this many games to be listed in a composition summary
+COMP_PAIR_MIN_GAMES = 3
+# Number of trait and unit pairs listed in a composition summary, best average placement first
+COMP_PAIRS = 20
+
+# One row per match of a League player. champion is an index into the store's names
+LEAGUE_ROW = np.dtype([("start", "i8"), ("duration", "i4"), ("queue", "i2"), ("win", "?"), ("champion", "i4"),
+                       ("kills", "i2"), ("deaths", "i2"), ("assists", "i2"), ("cs", "i4"), ("gold", "i4"),
+                       ("damage", "i4"), ("vision", "i2")])
+# One row per match of a TFT player, with the traits and units they played in separate tables. row is the index of
+# the match in the player's table, trait and unit are indexes into the store's names
+TFT_ROW = np.dtype([("start", "i8"), ("duration", "f4"), ("queue", "i2"), ("win", "?"), ("placement", "i1"),
+                    ("level", "i1"), ("last_round", "i2")])
+TFT_TRAIT = np.dtype([("row", "i4"), ("trait", "i4"), ("num_units", "i1"), ("style", "i1"), ("tier", "i1")])
+TFT_UNIT = np.dtype([("row", "i4"), ("unit", "i4"), ("rarity", "i1"), ("tier", "i1")])
+
+
+class Names:
+    """Gives every name (champion, trait, unit) a small integer, so the tables only hold numbers"""
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def id(self, name):
+        ret = self._ids.get(name)
+        if ret is None:
+            with self._lock:
+                ret = self._ids.get(name)
+                if ret is None:
+                    ret = len(self.names)
+                    self.names.append(name)
+                    self._ids[name] = ret
+        return ret
+
+
+class Table:
+    """A NumPy array of rows that grows as rows are added"""
+
+    def __init__(self, dtype, capacity=32):
+        self._rows = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, rows):
+        """Add a list of row tuples to the end of the table"""
+        if self.size + len(rows) > len(self._rows):
+            grown = np.zeros(max(2 * len(self._rows), self.size + len(rows)), dtype=self._rows.dtype)
+            grown[:self.size] = self._rows[:self.size]
+            self._rows = grown
+        self._rows[self.size:self.size + len(rows)] = rows
+        self.size += len(rows)
+
+    @property
+    def data(self):
+        return self._rows[:self.size]
+
+
+def league_row(record, puuid, names):
+    """Turn one player's part of a compact League match record (see riot.compact_match) into a table row"""
+    participant = record["participants"][puuid]
+    row = (record["gameStartTimestamp"] // 1000, record["gameDuration"], record["queueId"] or 0, bool(participant["win"]),
+           names.id(participant["championName"]), participant["kills"], participant["deaths"], participant["assists"],
+           participant["totalMinionsKilled"] + participant["neutralMinionsKilled"], participant["goldEarned"],
+           participant["totalDamageDealtToChampions"], participant["visionScore"])
+    return row, {}
+
+
+def tft_row(record, puuid, names):
+    """Turn one player's part of a compact TFT match record (see tft.compact_match) into a table row, and rows for
+        their traits and units"""
+    participant = record["participants"][puuid]
+    row = (record["game_datetime"] // 1000, participant["time_eliminated"], record["queue_id"] or 0, bool(participant["win"]),
+           participant["placement"], participant["level"], participant["last_round"])
+    traits = [(0, names.id(trait["name"]), trait["num_units"], trait["style"], trait["tier_current"]) for trait in participant["traits"]]
+    units = [(0, names.id(unit["character_id"]), unit["rarity"], unit["tier"]) for unit in participant["units"]]
+    return row, {"traits": traits, "units": units}
+
+
+class PlayerStats:
+    """The stats tables of every player for one game (league or tft)"""
+
+    def __init__(self, row_dtype, to_row, item_dtypes=None, size=STATS_CACHE_SIZE):
+        """
+        Args:
+            row_dtype (numpy.dtype): The columns of a match row
+            to_row (function): to_row(record, puuid, names) turns a compact match record into (row, {kind: [item rows]})
+            item_dtypes (dict): The columns of each kind of item row (e.g. traits, units), which start with the match row
+            size (int): The number of player tables kept in memory
+        """
+        self.row_dtype = row_dtype
+        self.to_row = to_row
+        self.item_dtypes = item_dtypes or {}
+        self.names = Names()
+        self._players = cache.LRUCache(size)
+        self._lock = threading.Lock()
+
+    def _player(self, puuid):
+        player = self._players.get(puuid)
+        if player is None:
+            player = {"index": {}, "rows": Table(self.row_dtype),
+                      "items": {kind: Table(dtype) for kind, dtype in self.item_dtypes.items()}}
+            self._players.set(puuid, player)
+        return player
+
+    def missing(self, puuid, match_ids):
+        """Get the matches in <match_ids> that are not in the player's table yet, which select would have to fetch"""
+        with self._lock:
+            player = self._player(puuid)
+            return [match_id for match_id in match_ids if match_id not in player["index"]]
+
+    def select(self, puuid, match_ids, get_record):
+        """Get the rows of a player's matches, adding the ones that are not in their table yet
+
+        Args:
+            puuid (str): Unique player ID of the summoner
+            match_ids (list): The matches to get, most recent first
+            get_record (function): get_record(match_id) returns the compact record of a match, or None if it could not be obtained
+
+        Returns:
+            tuple: (rows, items, errors). rows is an array with one row per match, in the order of <match_ids>. items maps
+                each kind of item to an array whose row field is an index into rows. errors lists the matches that could
+                not be obtained as {"matchId": match_id, "error": reason}
+        """
+        with self._lock:
+            player = self._player(puuid)
+            missing = [match_id for match_id in match_ids if match_id not in player["index"]]
+
+        def fetch(match_id):
+            try:
+                record = get_record(match_id)
+            except Exception as e:
+                return {"matchId": match_id, "error": str(e)}
+            if record is None or puuid not in record["participants"]:
+                return {"matchId": match_id, "error": "Invalid response from the Riot API"}
+            return self.to_row(record, puuid, self.names)
+
+        # The matches are fetched outside the lock, in parallel, so lookups of other players are not held up
+        fetched = workers.map_ordered(fetch, missing)
+        errors = []
+        with self._lock:
+            self._players.set(puuid, player)    # Keep using the same table even if it was pushed out of memory meanwhile
+            for match_id, result in zip(missing, fetched):
+                if isinstance(result, dict):
+                    errors.append(result)
+                    continue
+                if match_id in player["index"]:
+                    continue    # Another request added it while we were fetching
+                row, items = result
+                index = player["rows"].size
+                player["rows"].extend([row])
+                for kind, item_rows in items.items():
+                    player["items"][kind].extend([(index,) + item[1:] for item in item_rows])
+                player["index"][match_id] = index
+            positions = np.array([player["index"][match_id] for match_id in match_ids if match_id in player["index"]], dtype=np.int64)
+            rows = player["rows"].data[positions]
+            # Map each item from its place in the player's table to its place in the selected rows, dropping items of other matches
+            where = np.full(player["rows"].size, -1, dtype=np.int64)
+            where[positions] = np.arange(len(positions))
+            items = {}
+            for kind, table in player["items"].items():
+                data = table.data
+                selected = data[where[data["row"]] >= 0]
+                selected["row"] = where[selected["row"]]
+                items[kind] = selected
+        return rows, items, errors
+
+
+LEAGUE = PlayerStats(LEAGUE_ROW, league_row)
+TFT = PlayerStats(TFT_ROW, tft_row, {"traits": TFT_TRAIT, "units": TFT_UNIT})
+
+
+def _pct(part, whole):
+    return round(float(part) / max(float(whole), 1) * 100, 1)
+
+
+def _group(keys, rows_of_keys=None, **values):
+    """Count and sum <values> for every distinct key. If <rows_of_keys> is given, a key is only counted once per match row
+
+    Returns:
+        tuple: (distinct keys, number of rows with each key, {name: sum of the values for each key})
+    """
+    if rows_of_keys is not None and len(keys):
+        # The same unit can be on the board more than once in a game, only count the game once
+        _, first = np.unique(np.stack([rows_of_keys, keys]), axis=1, return_index=True)
+        keys = keys[first]
+        values = {name: value[first] for name, value in values.items()}
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(distinct))
+    sums = {name: np.bincount(inverse, weights=value, minlength=len(distinct)) for name, value in values.items()}
+    return distinct, counts, sums
+
+
+def summarize_league(rows, names):
+    """Sum up a League player's matches
+
+    Args:
+        rows (numpy.ndarray): The player's match rows, from LEAGUE.select
+        names (Names): The names the champion column refers to
+
+    Returns:
+        dict: Averages over all the matches (KDA, CS/min, gold/min, damage/min, vision score), and the games, wins and KDA
+                on each champion, most played first
+    """
+    games = len(rows)
+    if games == 0:
+        return {"games": 0}
+    minutes = max(float(rows["duration"].sum()) / 60, 1 / 60)
+    kills, deaths, assists = (int(rows[field].sum()) for field in ("kills", "deaths", "assists"))
+    wins = int(rows["win"].sum())
+
+    champions, counts, sums = _group(rows["champion"], win=rows["win"], kills=rows["kills"], deaths=rows["deaths"], assists=rows["assists"])
+    kda = (sums["kills"] + sums["assists"]) / np.maximum(sums["deaths"], 1)
+    by_champion = []
+    for i in np.argsort(-counts, kind="stable"):
+        by_champion.append({
+            "championName": names.names[champions[i]],
+            "games": int(counts[i]),
+            "wins": int(sums["win"][i]),
+            "win_pct": _pct(sums["win"][i], counts[i]),
+            "KDA": round(float(kda[i]), 2)
+        })
+    return {
+        "games": games,
+        "wins": wins,
+        "win_pct": _pct(wins, games),
+        "kills": round(kills / games, 1),
+        "deaths": round(deaths / games, 1),
+        "assists": round(assists / games, 1),
+        "KDA": round((kills + assists) / max(deaths, 1), 2),
+        "CS/min": round(float(rows["cs"].sum()) / minutes, 1),
+        "gold/min": round(float(rows["gold"].sum()) / minutes, 1),
+        "damage/min": round(float(rows["damage"].sum()) / minutes, 1),
+        "visionScore": round(float(rows["vision"].mean()), 1),
+        "champions": by_champion
+    }
+
+
+def _placement_groups(keys, match_rows, rows, names, display_name):
+    """The games, average placement and top four percentage of every trait or unit, most played first"""
+    if len(keys) == 0:
+        return []
+    distinct, counts, sums = _group(keys, match_rows, placement=rows["placement"][match_rows], win=rows["win"][match_rows])
+    ret = []
+    for i in np.argsort(-counts, kind="stable"):
+        ret.append({
+            "name": display_name(names.names[distinct[i]]),    # Same names as get_match_info
+            "games": int(counts[i]),
+            "avg_place": round(float(sums["placement"][i] / counts[i]), 2),
+            "top_4_pct": _pct(sums["win"][i], counts[i])
+        })
+    return ret
+
+
+def summarize_tft(rows, items, names):
+    """Sum up a TFT player's matches
+
+    Args:
+        rows (numpy.ndarray): The player's match rows, from TFT.select
+        items (dict): The player's trait and unit rows, from TFT.select
+        names (Names): The names the trait and unit columns refer to
+
+    Returns:
+        dict: The average placement and level, the top four and first place percentages, how many games ended in each
+                placement, and the games, average placement and top four percentage with each active trait and each unit
+    """
+    games = len(rows)
+    if games == 0:
+        return {"games": 0}
+    placements = rows["placement"].astype(np.int64)
+    distribution = np.bincount(np.clip(placements, 0, 8), minlength=9)[1:]
+    traits = items["traits"][items["traits"]["style"] > 0]    # Only traits that were active
+    units = items["units"]
+    return {
+        "games": games,
+        "avg_place": round(float(placements.mean()), 2),
+        "avg_level": round(float(rows["level"].mean()), 2),
+        "top_4_pct": _pct(rows["win"].sum(), games),
+        "win_pct": _pct((placements == 1).sum(), games),
+        "placements": {str(place): int(n) for place, n in enumerate(distribution, start=1)},
+        "traits": _placement_groups(traits["trait"], traits["row"], rows, names, static_data.tft_trait_name),
+        "units": _placement_groups(units["unit"], units["row"], rows, names, static_data.tft_unit_name)
+    }
+
+
+def _top_traits(traits, games):
+    """The two strongest active traits of every match row (highest style, then most units, like get_match_info sorts
+        them), -1 where a match has fewer than two
+
+    Returns:
+        numpy.ndarray: A (games, 2) array of trait name indexes
+    """
+    ret = np.full((games, 2), -1, dtype=np.int64)
+    if len(traits) == 0:
+        return ret
+    order = np.lexsort((-traits["num_units"].astype(np.int64), -traits["style"].astype(np.int64), traits["row"]))
+    ordered = traits[order]
+    # Place of each trait within its own match, 0 for the strongest
+    starts = np.searchsorted(ordered["row"], ordered["row"], side="left")
+    rank = np.arange(len(ordered)) - starts
+    top = rank < 2
+    ret[ordered["row"][top], rank[top]] = ordered["trait"][top]
+    return ret
+
+
+def summarize_comps(rows, items, names):
+    """Sum up the team compositions of a TFT player's matches. A composition is named after the two strongest active
+        traits of the final board, and every active trait is paired with every unit on the same board, so the trait
+        and unit pairs that did best show up across compositions
+
+    Args:
+        rows (numpy.ndarray): The player's match rows, from TFT.select
+        items (dict): The player's trait and unit rows, from TFT.select
+        names (Names): The names the trait and unit columns refer to
+
+    Returns:
+        dict: The number of games, the games, average placement, top four and first place percentages of each
+                composition (most played first), and the best COMP_PAIRS trait and unit pairs with at least
+                COMP_PAIR_MIN_GAMES games
+    """
+    games = len(rows)
+    if games == 0:
+        return {"games": 0, "comps": [], "pairs": []}
+    placements = rows["placement"].astype(np.int64)
+    traits = items["traits"][items["traits"]["style"] > 0]    # Only traits that were active
+    units = items["units"]
+
+    top = _top_traits(traits, games)
+    distinct, inverse = np.unique(top, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = np.bincount(inverse, minlength=len(distinct))
+    place_sums = np.bincount(inverse, weights=placements, minlength=len(distinct))
+    top_4 = np.bincount(inverse, weights=rows["win"], minlength=len(distinct))
+    firsts = np.bincount(inverse, weights=placements == 1, minlength=len(distinct))
+    comps = []
+    for i in np.lexsort((place_sums / counts, -counts)):
+        comps.append({
+            "traits": [static_data.tft_trait_name(names.names[trait]) for trait in distinct[i] if trait >= 0],
+            "games": int(counts[i]),
+            "avg_place": round(float(place_sums[i] / counts[i]), 2),
+            "top_4_pct": _pct(top_4[i], counts[i]),
+            "win_pct": _pct(firsts[i], counts[i])
+        })
+
+    pairs = []
+    if len(traits) and len(units):
+        # For every active trait, the units on the same board are one slice of the units sorted by match row
+        units = units[np.argsort(units["row"], kind="stable")]
+        first = np.searchsorted(units["row"], traits["row"], side="left")
+        last = np.searchsorted(units["row"], traits["row"], side="right")
+        per_trait = last - first
+        pair_trait = np.repeat(traits["trait"].astype(np.int64), per_trait)
+        pair_row = np.repeat(traits["row"].astype(np.int64), per_trait)
+        # Position of every pair within its trait's slice, added to the slice start to pick the unit
+        offsets = np.arange(per_trait.sum()) - np.repeat(np.cumsum(per_trait) - per_trait, per_trait)
+        pair_unit = units["unit"].astype(np.int64)[np.repeat(first, per_trait) + offsets]
+        size = max(len(names.names), 1)
+        keys, pair_counts, sums = _group(pair_trait * size + pair_unit, pair_row, placement=placements[pair_row], win=rows["win"][pair_row])
+        enough = np.flatnonzero(pair_counts >= COMP_PAIR_MIN_GAMES)
+        averages = sums["placement"][enough] / pair_counts[enough]
+        for i in enough[np.lexsort((-pair_counts[enough], averages))][:COMP_PAIRS]:
+            pairs.append({
+                "trait": static_data.tft_trait_name(names.names[keys[i] // size]),
+                "unit": static_data.tft_unit_name(names.names[keys[i] % size]),
+                "games": int(pair_counts[i]),
+                "avg_place": round(float(sums["placement"][i] / pair_counts[i]), 2),
+                "top_4_pct": _pct(sums["win"][i], pair_counts[i])
+            })
+    return {"games": games, "comps": comps, "pairs": pairs}
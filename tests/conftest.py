@@ -0,0 +1,29 @@
+"""
+Shared setup for the tests. GameAPI reads its settings when it is imported, so they are set here, before any test
+module imports it: every file it writes goes to a temporary directory, and every Riot call goes to the mock Riot API in
+bench/mock_riot.py instead of the network.
+"""
+import os
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+import mock_riot
+
+MOCK = mock_riot.MockRiot()
+_server = mock_riot.make_server(MOCK)
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+_tmp = tempfile.mkdtemp()
+os.environ["RIOT_API_OVERRIDE"] = "http://%s:%d" % _server.server_address
+os.environ["RIOT_KEY"] = "RGAPI-test"
+os.environ["TFT_KEY"] = "RGAPI-test"
+os.environ["RIOT_APP_RATE_LIMIT"] = "100000:1"
+os.environ["RIOT_RETRY_BACKOFF"] = "0.01"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["MATCH_DB_PATH"] = os.path.join(_tmp, "matches.sqlite3")
+os.environ["LADDER_DIR"] = os.path.join(_tmp, "ladder")
@@ -0,0 +1,53 @@
+"""The async app (game_api_async.py) has to answer every route with the same JSON as the Flask app"""
+import asyncio
+import pytest
+import game_api
+import game_api_async
+
+PATHS = [
+    "/league/matches/Parity/NA1/4",
+    "/league/matches/Parity/NA1/4?queue=450",
+    "/league/match/Parity/NA1/3",
+    "/tft/matches/Parity/NA1/4",
+    "/tft/match/Parity/NA1/2",
+    "/league/timeline/Parity/NA1/2",
+    "/league/stats/Parity/NA1/6",
+    "/league/stats/Parity/NA1/6?queue=420",
+    "/tft/stats/Parity/NA1/6",
+    "/tft/comps/Parity/NA1/6",
+]
+
+
+def get_async(*paths):
+    """Serve the async app on a new event loop, as it would be by hypercorn, and get each path from it"""
+    async def run():
+        ret = []
+        async with game_api_async.app.test_app() as test_app:
+            client = test_app.test_client()
+            for path in paths:
+                response = await client.get(path)
+                ret.append((response.status_code, await response.get_json()))
+        return ret
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_same_json_as_flask(path):
+    response = game_api.app.test_client().get(path)
+    assert get_async(path) == [(response.status_code, response.get_json())]
+
+
+def test_queue_filter_is_applied():
+    (_, every), (_, arams) = get_async("/league/matches/Parity/NA1/6", "/league/matches/Parity/NA1/6?queue=450")
+    assert {match["queueType"] for match in arams} == {"ARAM"}
+    assert {match["queueType"] for match in every} != {"ARAM"}
+
+
+@pytest.mark.parametrize("path", ["/league/matches/Blocking/NA1/5", "/league/stats/Blocking/NA1/5", "/tft/stats/Blocking/NA1/5", "/tft/comps/Blocking/NA1/5"])
+def test_riot_calls_are_not_blocking(path, monkeypatch):
+    def blocking(url, api_key):
+        raise AssertionError("Blocking call to " + url)
+    monkeypatch.setattr(game_api_async.riot_client, "get", blocking)
+    status, body = get_async(path)[0]
+    assert status == 200
+    assert body and "errors" not in body
@@ -0,0 +1,65 @@
+import socket
+import threading
+import pytest
+import backends
+import metrics
+import mock_redis
+
+
+@pytest.fixture
+def redis_store():
+    store = mock_redis.Store()
+    server = mock_redis.make_server(store)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield store, backends.RedisBackend("redis://%s:%d/0" % server.server_address)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return backends.SQLiteBackend(str(tmp_path / "shared.sqlite3"))
+    return request.getfixturevalue("redis_store")[1]
+
+
+def test_values_round_trip(backend):
+    backend.set("small", {"a": 1})
+    backend.set("large", {"ids": ["NA1_%d" % i for i in range(500)]})
+    assert backend.get("small") == {"a": 1}
+    assert backend.get("large")["ids"][-1] == "NA1_499"
+    backend.delete("small")
+    assert backend.get("small") is None
+
+
+def test_counter_counts(backend):
+    assert backend.incr("calls", 3, 10) == 3
+    assert backend.incr("calls", 2, 10) == 5
+
+
+def test_redis_counter_is_made_with_its_expiry(redis_store):
+    store, backend = redis_store
+    backend.incr("calls", 1, 10)
+    assert 0 < store.run([b"TTL", b"calls"]) <= 10
+    # Counting again does not push the expiry back
+    store.data[b"calls"][1] -= 5
+    backend.incr("calls", 1, 10)
+    assert store.run([b"TTL", b"calls"]) <= 5
+
+
+def test_redis_down_is_counted(monkeypatch):
+    # A port that nothing listens on
+    with socket.socket() as free:
+        free.bind(("127.0.0.1", 0))
+        port = free.getsockname()[1]
+    counter = metrics.Counter("test_shared_store_errors_total", "", ("backend", "operation"))
+    monkeypatch.setattr(metrics, "SHARED_STORE_ERRORS", counter)
+    backend = backends.RedisBackend("redis://127.0.0.1:%d/0" % port)
+    assert backend.get("key") is None
+    assert backend.incr("calls", 1, 10) is None
+    backend.set("key", 1)
+    assert counter.render()[2:] == [
+        'test_shared_store_errors_total{backend="redis",operation="get"} 1.0',
+        'test_shared_store_errors_total{backend="redis",operation="incr"} 1.0',
+        'test_shared_store_errors_total{backend="redis",operation="set"} 1.0',
+    ]
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import pytest
+import batches
+import game_api
+import game_api_async
+
+ROUTES = ["/league/batch/rank", "/league/batch/mastery", "/tft/batch/rank", "/tft/batch/matches", "/tft/batch/comps"]
+INVALID = [
+    [],
+    "x",
+    3,
+    None,
+    {},
+    {"players": "Batch1#NA1"},
+    {"players": ["no tagline"]},
+    {"players": [{"summoner": "Batch1"}]},
+]
+
+
+def post_async(path, body):
+    async def run():
+        async with game_api_async.app.test_app() as test_app:
+            response = await test_app.test_client().post(path, json=body)
+            return response.status_code, await response.get_data(as_text=True)
+    return asyncio.run(run())
+
+
+def post(path, body):
+    response = game_api.app.test_client().post(path, json=body)
+    return response.status_code, response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize("post", [post, post_async], ids=["flask", "quart"])
+@pytest.mark.parametrize("body", INVALID, ids=repr)
+@pytest.mark.parametrize("path", ROUTES)
+def test_invalid_body(post, path, body):
+    status, text = post(path, body)
+    assert status == 400
+    assert json.loads(text) == {"error": "Invalid request"}
+
+
+@pytest.mark.parametrize("post", [post, post_async], ids=["flask", "quart"])
+def test_too_many_players(post, monkeypatch):
+    monkeypatch.setattr(batches, "BATCH_MAX_PLAYERS", 2)
+    status, _ = post("/league/batch/rank", {"players": ["A#NA1", "B#NA1", "C#NA1"]})
+    assert status == 400
+
+
+@pytest.mark.parametrize("post", [post, post_async], ids=["flask", "quart"])
+def test_one_line_per_player(post):
+    players = ["Batch1#NA1", {"summoner": "Batch2", "tagline": "NA1"}, "batch1#na1"]
+    status, text = post("/league/batch/rank", {"players": players, "league": "SOLO"})
+    assert status == 200
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert sorted(line["player"] for line in lines) == ["Batch1#NA1", "Batch2#NA1", "batch1#na1"]
+    assert all("result" in line for line in lines)
+    # The same player written two ways is looked up once, and both lines get the same result
+    same = [line["result"] for line in lines if line["player"].lower() == "batch1#na1"]
+    assert same[0] == same[1]
+
+
+def test_same_lines_in_both_apps():
+    body = {"players": ["Batch3#NA1", "Batch4#NA1"], "count": "3"}
+    flask_lines = sorted(post("/tft/batch/matches", body)[1].splitlines())
+    quart_lines = sorted(post_async("/tft/batch/matches", body)[1].splitlines())
+    assert [json.loads(line) for line in flask_lines] == [json.loads(line) for line in quart_lines]
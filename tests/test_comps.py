@@ -0,0 +1,77 @@
+import copy
+import json
+import os
+import random
+import pytest
+import static_data
+import stats
+import tft
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "payloads")
+PUUID = "player"
+TRAITS = ["TFT13_Scrap", "TFT13_Sniper", "TFT13_Bruiser", "TFT13_Rebel"]
+UNITS = ["TFT13_Jinx", "TFT13_Vi", "TFT13_Ekko", "TFT13_Zeri", "TFT13_Powder"]
+
+
+def baseline_board(participant):
+    """The traits and units of a board sorted the way get_match_info used to, one sorted() per board"""
+    traits = sorted(participant["traits"], key=lambda x: (-x['style'], -x['num_units']))
+    units = []
+    for unit in participant["units"]:
+        cost = {4: 4, 6: 5, 8: 6}.get(unit["rarity"], unit["rarity"] + 1)
+        sort_val = (cost*0.6) + 2**(unit["tier"]/1.5)
+        if unit["character_id"][6:].lower() == "jaycesummon":
+            sort_val = 0
+        units.append((unit["character_id"], cost, sort_val))
+    units = sorted(units, key=lambda x: x[2], reverse=True)
+    return [trait["name"] for trait in traits], units
+
+
+def test_sorted_boards_match_the_baseline_sort():
+    with open(os.path.join(PAYLOADS, "tft_match.json")) as f:
+        data = json.load(f)
+    # Put a summon on a board, which always goes last
+    data["info"]["participants"][0]["units"].insert(0, {"character_id": "TFT13_JayceSummon", "rarity": 6, "tier": 3})
+    record = tft.compact_match(copy.deepcopy(data))
+    for puuid, participant in zip(data["metadata"]["participants"], data["info"]["participants"]):
+        traits, units = baseline_board(participant)
+        board = record["participants"][puuid]
+        assert [trait["name"] for trait in board["traits"]] == traits
+        assert [(unit["character_id"], unit["cost"]) for unit in board["units"]] == [unit[:2] for unit in units]
+        assert [unit["sort_val"] for unit in board["units"]] == pytest.approx([unit[2] for unit in units])
+    assert record["participants"][data["metadata"]["participants"][0]]["units"][-1]["sort_val"] == 0
+
+
+def test_comp_pairs_match_a_brute_force_count():
+    rng = random.Random(3)
+    records = {}
+    for i in range(120):
+        placement = rng.randint(1, 8)
+        records["NA1_%d" % i] = {"game_datetime": i * 1000, "queue_id": 1100, "participants": {PUUID: {
+            "time_eliminated": 1800.0, "win": placement <= 4, "placement": placement, "level": 8, "last_round": 30,
+            "traits": [{"name": trait, "num_units": rng.randint(1, 6), "style": rng.randint(0, 4), "tier_current": 1}
+                       for trait in rng.sample(TRAITS, rng.randint(0, len(TRAITS)))],
+            "units": [{"character_id": rng.choice(UNITS), "rarity": 1, "tier": 2} for _ in range(rng.randint(0, 6))]
+        }}}
+    table = stats.PlayerStats(stats.TFT_ROW, stats.tft_row, {"traits": stats.TFT_TRAIT, "units": stats.TFT_UNIT})
+    rows, items, errors = table.select(PUUID, list(records), records.get)
+    summary = stats.summarize_comps(rows, items, table.names)
+
+    pairs = {}
+    for record in records.values():
+        participant = record["participants"][PUUID]
+        board = {(static_data.tft_trait_name(trait["name"]), static_data.tft_unit_name(unit["character_id"]))
+                 for trait in participant["traits"] if trait["style"] > 0 for unit in participant["units"]}
+        for pair in board:
+            games, placements, top_4 = pairs.get(pair, (0, 0, 0))
+            pairs[pair] = (games + 1, placements + participant["placement"], top_4 + participant["win"])
+    expected = sorted(((placements / games, -games), pair) for pair, (games, placements, top_4) in pairs.items()
+                      if games >= stats.COMP_PAIR_MIN_GAMES)[:stats.COMP_PAIRS]
+
+    assert expected and len(summary["pairs"]) == len(expected)
+    assert [(pair["avg_place"], pair["games"]) for pair in summary["pairs"]] == [(round(key[0], 2), -key[1]) for key, _ in expected]
+    for pair in summary["pairs"]:
+        games, placements, top_4 = pairs[(pair["trait"], pair["unit"])]
+        assert pair["games"] == games
+        assert pair["avg_place"] == round(placements / games, 2)
+        assert pair["top_4_pct"] == round(top_4 / games * 100, 1)
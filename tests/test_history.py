@@ -0,0 +1,124 @@
+import asyncio
+import history
+
+
+class FakeRiot:
+    """A player's match history on the match-ids endpoint, newest first, with each match starting a minute after the last"""
+
+    def __init__(self, count):
+        self.ids = ["NA1_%d" % i for i in range(count, 0, -1)]
+        self.calls = []
+        self.down = False
+
+    def start_time(self, match_id):
+        return int(match_id.split("_")[1]) * 60
+
+    def fetch_ids(self, puuid, query):
+        self.calls.append(dict(query))
+        if self.down:
+            return None
+        ids = self.ids
+        if "startTime" in query:
+            ids = [match_id for match_id in ids if self.start_time(match_id) >= query["startTime"]]
+        start = int(query.get("start", 0))
+        return ids[start:start + int(query["count"])]
+
+    def play(self):
+        self.ids.insert(0, "NA1_%d" % (len(self.ids) + 1))
+
+
+def make_history(tmp_path, riot):
+    stored = set()
+
+    def match_start_time(match_id):
+        return riot.start_time(match_id) if match_id in stored else None
+
+    histories = history.MatchHistory("league", riot.fetch_ids, match_start_time, str(tmp_path / "history.sqlite3"))
+    return histories, stored
+
+
+def test_second_lookup_only_asks_for_new_matches(tmp_path):
+    riot = FakeRiot(50)
+    histories, stored = make_history(tmp_path, riot)
+    assert histories.get_ids("p", 0, 10) == riot.ids[:10]
+    stored.update(riot.ids[:10])    # Their details were downloaded, so their start times are known
+    riot.play()
+    riot.calls.clear()
+    assert histories.get_ids("p", 0, 10) == riot.ids[:10]
+    # One call, starting at the newest match we already had
+    assert len(riot.calls) == 1
+    assert riot.calls[0]["startTime"] == riot.start_time("NA1_50")
+
+
+def test_older_matches_are_added_when_more_are_asked_for(tmp_path):
+    riot = FakeRiot(50)
+    histories, _ = make_history(tmp_path, riot)
+    histories.get_ids("p", 0, 5)
+    riot.calls.clear()
+    assert histories.get_ids("p", 5, 10) == riot.ids[5:15]
+    assert {"start": 5, "count": 10} in riot.calls
+
+
+def test_short_history_is_marked_complete(tmp_path):
+    riot = FakeRiot(3)
+    histories, _ = make_history(tmp_path, riot)
+    assert histories.get_ids("p", 0, 10) == riot.ids
+    riot.calls.clear()
+    histories.get_ids("p", 0, 20)
+    # Only the check for new matches, we already know there are no older ones
+    assert all(call.get("start", 0) == 0 for call in riot.calls)
+
+
+def test_history_survives_a_restart(tmp_path):
+    riot = FakeRiot(30)
+    histories, _ = make_history(tmp_path, riot)
+    histories.get_ids("p", 0, 10)
+    reopened, _ = make_history(tmp_path, riot)
+    riot.down = True
+    # Riot is down, but the IDs we saved are still served
+    assert reopened.get_ids("p", 0, 10) == riot.ids[:10]
+
+
+def test_riot_down_with_nothing_stored(tmp_path):
+    riot = FakeRiot(30)
+    riot.down = True
+    histories, _ = make_history(tmp_path, riot)
+    assert histories.get_ids("p", 0, 10) is None
+
+
+def test_queues_are_kept_apart(tmp_path):
+    riot = FakeRiot(30)
+    histories, _ = make_history(tmp_path, riot)
+    histories.get_ids("p", 0, 5, 420)
+    assert all(call["queue"] == 420 for call in riot.calls)
+    riot.calls.clear()
+    histories.get_ids("p", 0, 5)
+    assert riot.calls and all("queue" not in call for call in riot.calls)
+
+
+def test_async_sync_makes_the_same_calls(tmp_path):
+    riot = FakeRiot(50)
+    (tmp_path / "blocking").mkdir()
+    blocking, stored = make_history(tmp_path / "blocking", riot)
+    stored.update(riot.ids[:10])
+    blocking.get_ids("p", 0, 10)
+    riot.play()
+    blocking.get_ids("p", 5, 20)
+    expected = riot.calls
+
+    riot = FakeRiot(50)
+    (tmp_path / "async").mkdir()
+    awaited, stored = make_history(tmp_path / "async", riot)
+    stored.update(riot.ids[:10])
+
+    async def fetch_ids(puuid, query):
+        return riot.fetch_ids(puuid, query)
+
+    async def run():
+        first = await awaited.get_ids_async(fetch_ids, "p", 0, 10)
+        riot.play()
+        return first, await awaited.get_ids_async(fetch_ids, "p", 5, 20)
+    first, second = asyncio.run(run())
+    assert first == riot.ids[1:11]
+    assert second == riot.ids[5:25]
+    assert riot.calls == expected
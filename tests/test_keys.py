@@ -0,0 +1,37 @@
+import asyncio
+import riot_client
+import tft
+import tft_async
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, url):
+        self.url = url
+
+    def json(self):
+        return {"id": "summoner-of-" + self.url.rsplit("/", 1)[1]}
+
+
+def test_tft_summoner_id_uses_the_key_of_the_puuid(monkeypatch):
+    keys = riot_client.KeyPool(["RGAPI-first", "RGAPI-second"], "test-tft")
+    keys.remember("puuid-on-second", "RGAPI-second")
+    monkeypatch.setattr(tft, "KEYS", keys)
+    monkeypatch.setattr(tft_async, "KEYS", keys)
+    used = []
+
+    def get(url, api_key):
+        used.append(api_key)
+        return Response(url)
+
+    async def get_async(url, api_key):
+        return get(url, api_key)
+
+    monkeypatch.setattr(riot_client, "get", get)
+    monkeypatch.setattr(riot_client, "get_async", get_async)
+    assert tft.get_summoner_id("puuid-on-second") == "summoner-of-puuid-on-second"
+    # A new PUUID, so the async version asks Riot too rather than reading the identity cache
+    keys.remember("another-on-second", "RGAPI-second")
+    assert asyncio.run(tft_async.get_summoner_id("another-on-second")) == "summoner-of-another-on-second"
+    assert used == ["RGAPI-second", "RGAPI-second"]
@@ -0,0 +1,89 @@
+import time
+import numpy as np
+import pytest
+import ladder
+import mock_riot
+import riot_client
+from conftest import MOCK
+
+KEY = "RGAPI-test"
+
+
+def make_ladder(players):
+    """A ladder from (puuid, tier, division, lp) tuples, sorted by PUUID like a crawled one"""
+    players = sorted(players)
+    return {
+        "puuid": np.array([puuid.encode() for puuid, _, _, _ in players], dtype="S"),
+        "tier": np.array([ladder.TIERS.index(tier) for _, tier, _, _ in players], dtype=np.int8),
+        "division": np.array([ladder.DIVISIONS.index(division) for _, _, division, _ in players], dtype=np.int8),
+        "lp": np.array([lp for _, _, _, lp in players], dtype=np.int32),
+        "wins": np.zeros(len(players), dtype=np.int32),
+        "losses": np.zeros(len(players), dtype=np.int32)
+    }
+
+
+def test_promotions_and_demotions_count_as_lp():
+    previous = make_ladder([("a", "GOLD", "II", 90), ("b", "GOLD", "I", 10), ("c", "DIAMOND", "I", 80), ("d", "MASTER", "I", 50),
+                            ("gone", "IRON", "IV", 0)])
+    current = make_ladder([("a", "GOLD", "I", 15), ("b", "GOLD", "II", 75), ("c", "MASTER", "I", 20), ("d", "MASTER", "I", 120),
+                           ("new", "SILVER", "III", 40)])
+    ladder.diff(current, previous)
+    changes = dict(zip(current["puuid"].tolist(), current["change"].tolist()))
+    assert changes == {b"a": 25, b"b": -35, b"c": 40, b"d": 70, b"new": 0}
+    assert current["new"].tolist() == [False, False, False, False, True]
+
+
+def test_first_snapshot_has_only_new_players():
+    current = ladder.diff(make_ladder([("a", "GOLD", "II", 90), ("b", "IRON", "IV", 0)]), None)
+    assert current["change"].tolist() == [0, 0]
+    assert current["new"].tolist() == [True, True]
+    assert ladder.climbers(current, 10) == []
+
+
+@pytest.mark.parametrize("size, pages", [(1000, 8), (410, 4), (100, 4)])
+def test_division_crawl_stops_at_the_first_short_page(monkeypatch, size, pages):
+    monkeypatch.setitem(mock_riot.LADDER_SIZES, "division", size)
+    monkeypatch.setattr(ladder, "LADDER_PAGE_BATCH", 4)
+    MOCK.reset_counts()
+    entries = ladder._crawl_division("league", "na1", "RANKED_SOLO_5x5", "GOLD", "II", KEY)
+    assert len(entries) == len({entry["puuid"] for entry in entries}) == size
+    assert MOCK.calls["league-entries"] == pages    # Batches of 4 pages, the last batch has the short or empty page
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    monkeypatch.setattr(ladder, "SNAPSHOTS", ladder.Snapshots())
+    monkeypatch.setattr(ladder, "LADDER_MAX_AGE", 1800)
+
+
+def test_lookup_answers_from_a_fresh_snapshot_made_with_the_same_key(snapshots):
+    ladder.save("league", "na1", "LOOKUP", ladder.diff(make_ladder([("a", "GOLD", "II", 42), ("c", "MASTER", "I", 310)]), None),
+                riot_client.key_name(KEY))
+    assert ladder.lookup("league", "na1", "LOOKUP", "a", KEY) == ["GOLD", "II", 42]
+    assert ladder.lookup("league", "na1", "LOOKUP", "c", KEY) == ["MASTER", "I", 310]
+    assert ladder.lookup("league", "na1", "LOOKUP", "b", KEY) == []    # Not on the ladder, so unranked
+    assert ladder.lookup("league", "na1", "LOOKUP", "a", "RGAPI-other") is None    # PUUIDs of another key
+    assert ladder.lookup("league", "euw1", "LOOKUP", "a", KEY) is None    # No snapshot of that ladder
+
+
+def test_lookup_asks_riot_when_the_snapshot_is_stale(snapshots, monkeypatch):
+    ladder.save("league", "na1", "STALE", ladder.diff(make_ladder([("a", "GOLD", "II", 42)]), None), riot_client.key_name(KEY))
+    later = time.time() + ladder.LADDER_MAX_AGE + 1
+    monkeypatch.setattr(ladder.time, "time", lambda: later)
+    assert ladder.lookup("league", "na1", "STALE", "a", KEY) is None
+
+
+def test_two_crawls_give_the_lp_changes(snapshots):
+    MOCK.ladder_shift = 0
+    try:
+        first_path, first = ladder.snapshot("tft", "na1", "RANKED_TFT", KEY)
+        MOCK.ladder_shift = 5
+        second_path, second = ladder.snapshot("tft", "na1", "RANKED_TFT", KEY)
+    finally:
+        MOCK.ladder_shift = 0
+    assert first["new"].all() and not second["new"].any()
+    assert second["change"].tolist() == (ladder.score(second) - ladder.score(first)).tolist()
+    assert second["change"].any()
+    climbers = ladder.climbers(ladder.load(second_path), 5)
+    assert [player["change"] for player in climbers] == sorted(second["change"].tolist(), reverse=True)[:5] + \
+        sorted(second["change"].tolist(), reverse=True)[-5:]
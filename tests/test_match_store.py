@@ -0,0 +1,51 @@
+import json
+import sqlite3
+import zlib
+import cache
+
+
+def compact(data):
+    return {"id": data["metadata"]["matchId"], "players": len(data["info"]["participants"])}
+
+
+def make_old_store(path, games):
+    """A match store file the way user-002 versions wrote it: whole Riot responses in the matches table"""
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE matches (game TEXT, match_id TEXT, data BLOB, PRIMARY KEY (game, match_id))")
+    for game, match_id in games:
+        raw = json.dumps({"metadata": {"matchId": match_id}, "info": {"participants": [{}] * 10}}).encode()
+        db.execute("INSERT INTO matches VALUES (?, ?, ?)", (game, match_id, zlib.compress(raw)))
+    db.execute("INSERT INTO matches VALUES ('league', 'NA1_bad', ?)", (zlib.compress(b"not json"),))
+    db.commit()
+    db.close()
+
+
+def tables(path):
+    db = sqlite3.connect(path)
+    try:
+        return {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        db.close()
+
+
+def test_put_and_get(tmp_path):
+    store = cache.MatchStore("league", compact, str(tmp_path / "matches.sqlite3"))
+    raw = json.dumps({"metadata": {"matchId": "NA1_1"}, "info": {"participants": [{}, {}]}}).encode()
+    assert store.put("NA1_1", raw) == {"id": "NA1_1", "players": 2}
+    reopened = cache.MatchStore("league", compact, str(tmp_path / "matches.sqlite3"))
+    assert reopened.get("NA1_1") == {"id": "NA1_1", "players": 2}
+    assert reopened.get("NA1_2") is None
+
+
+def test_old_matches_are_migrated(tmp_path):
+    path = str(tmp_path / "matches.sqlite3")
+    make_old_store(path, [("league", "NA1_1"), ("league", "NA1_2"), ("tft", "NA1_3")])
+    league = cache.MatchStore("league", compact, path)
+    assert league.get("NA1_1") == {"id": "NA1_1", "players": 10}
+    assert league.get("NA1_2") == {"id": "NA1_2", "players": 10}
+    assert league.get("NA1_bad") is None
+    # The TFT matches are still waiting for the TFT store
+    assert "matches" in tables(path)
+    tft = cache.MatchStore("tft", compact, path)
+    assert tft.get("NA1_3") == {"id": "NA1_3", "players": 10}
+    assert "matches" not in tables(path)
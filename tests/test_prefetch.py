@@ -0,0 +1,37 @@
+import prefetch
+
+
+def make_prefetcher(watchlist=(), top=10):
+    warmed = []
+    prefetcher = prefetch.Prefetcher(warmed.append, lambda: 1.0, watchlist, top=top,
+                                     paths="/league/rank/{name}/{tagline}/SOLO,/tft/matches/{name}/{tagline}?count=5",
+                                     interval=0)
+    return prefetcher, warmed
+
+
+def test_watchlist_entries_keep_their_platform():
+    watchlist = prefetch.parse_watchlist("Faker#KR1@KR, Caps#EUW@euw1\nDoublelift#NA1,bad@euw1,Nobody#X@atlantis")
+    assert watchlist == [("Faker", "KR1", "kr"), ("Caps", "EUW", "euw1"), ("Doublelift", "NA1", "")]
+
+
+def test_warmed_paths_ask_for_the_players_platform():
+    prefetcher, warmed = make_prefetcher(prefetch.parse_watchlist("Caps#EUW@euw1,Doublelift#NA1"))
+    assert prefetcher.run_once() == 4
+    assert sorted(warmed) == ["/league/rank/Caps/EUW/SOLO?platform=euw1",
+                              "/league/rank/Doublelift/NA1/SOLO",
+                              "/tft/matches/Caps/EUW?count=5&platform=euw1",
+                              "/tft/matches/Doublelift/NA1?count=5"]
+
+
+def test_same_riot_id_on_two_platforms_is_tracked_twice():
+    prefetcher, warmed = make_prefetcher()
+    prefetcher.seen("Caps", "EUW", "EUW1")
+    prefetcher.seen("caps", "euw", "euw1")
+    prefetcher.seen("Caps", "EUW")
+    assert prefetcher.tracked() == [("Caps", "EUW", "euw1"), ("Caps", "EUW", "")]
+
+
+def test_lookups_on_unknown_platforms_are_not_tracked():
+    prefetcher, warmed = make_prefetcher()
+    prefetcher.seen("Caps", "EUW", "atlantis")
+    assert prefetcher.tracked() == []
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+import backends
+import cache
+import riot_client
+
+BUCKET = ("RGAPI-te", "na1.api.riotgames.com")
+
+
+def test_calls_fit_until_a_window_is_full():
+    limiter = riot_client.RateLimiter()
+    limiter.set_limits(BUCKET, [(3, 10), (100, 600)])
+    assert [limiter.try_acquire([BUCKET]) for _ in range(3)] == [0, 0, 0]
+    wait = limiter.try_acquire([BUCKET])
+    assert 9 < wait <= 10
+    assert limiter.headroom(BUCKET) == 0.0
+
+
+def test_count_header_catches_up():
+    limiter = riot_client.RateLimiter()
+    limiter.set_limits(BUCKET, [(20, 1), (100, 120)])
+    limiter.try_acquire([BUCKET])
+    # Riot has seen 90 calls in the long window, 89 from another worker on the same key
+    limiter.update(BUCKET, "20:1,100:120", "1:1,90:120")
+    assert limiter.usage()[BUCKET]["windows"] == [
+        {"limit": 20, "seconds": 1, "used": 1},
+        {"limit": 100, "seconds": 120, "used": 90},
+    ]
+    assert limiter.headroom(BUCKET) == 0.1
+    assert [limiter.try_acquire([BUCKET]) for _ in range(10)] == [0] * 10
+    assert limiter.try_acquire([BUCKET]) > 0
+
+
+def test_count_header_never_lowers_the_count():
+    limiter = riot_client.RateLimiter()
+    limiter.set_limits(BUCKET, [(20, 1)])
+    for _ in range(5):
+        limiter.try_acquire([BUCKET])
+    # A response that left Riot before our later calls arrived
+    limiter.update(BUCKET, "20:1", "2:1")
+    assert limiter.usage()[BUCKET]["windows"][0]["used"] == 5
+
+
+def test_limit_header_changes_the_limit():
+    limiter = riot_client.RateLimiter()
+    limiter.update(BUCKET, "5:1", "1:1")
+    assert limiter.has_limits(BUCKET)
+    assert limiter.usage()[BUCKET]["windows"] == [{"limit": 5, "seconds": 1, "used": 1}]
+
+
+def test_block_after_429():
+    limiter = riot_client.RateLimiter()
+    limiter.set_limits(BUCKET, [(20, 1)])
+    limiter.block(BUCKET, 2)
+    assert 1 < limiter.try_acquire([BUCKET]) <= 2
+    assert limiter.headroom(BUCKET) == 0.0
+
+
+def test_workers_share_the_count(tmp_path):
+    shared = backends.SQLiteBackend(str(tmp_path / "shared.sqlite3"))
+    first, second = riot_client.RateLimiter(shared), riot_client.RateLimiter(shared)
+    for limiter in (first, second):
+        limiter.set_limits(BUCKET, [(4, 3600)])
+    assert [first.try_acquire([BUCKET]) for _ in range(2)] == [0, 0]
+    assert [second.try_acquire([BUCKET]) for _ in range(2)] == [0, 0]
+    assert first.try_acquire([BUCKET]) > 0
+
+
+class SlowStore:
+    """A shared store that takes a while to answer, like a Redis server that is struggling"""
+
+    def __init__(self):
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.05)
+        return None
+
+    def incr(self, key, amount, ttl):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.05)
+        return 1
+
+
+def test_slow_shared_store_does_not_block_the_event_loop():
+    store = SlowStore()
+    limiter = riot_client.RateLimiter(store)
+    limiter.set_limits(BUCKET, [(100, 10)])
+
+    async def run():
+        ticks = []
+
+        async def tick():
+            for _ in range(10):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(limiter.acquire_async([BUCKET]), tick())
+        return ticks, threading.get_ident()
+    ticks, loop_thread = asyncio.run(run())
+    assert loop_thread not in store.threads
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.05
+
+
+def test_off_loop_only_uses_a_thread_with_a_shared_store(monkeypatch):
+    async def run():
+        return threading.get_ident(), await cache.off_loop(threading.get_ident)
+    loop_thread, called_from = asyncio.run(run())
+    assert called_from == loop_thread
+    monkeypatch.setattr(backends, "_SHARED", (SlowStore(),))
+    loop_thread, called_from = asyncio.run(run())
+    assert called_from != loop_thread
@@ -0,0 +1,126 @@
+import threading
+import time
+import cache
+import regions
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_fresh_entry_is_not_fetched_again():
+    responses = cache.ResponseCache(store=cache.MemoryStore(10))
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return "value", True
+
+    assert responses.get("a", fetch, 60, 60) == ("value", 0)
+    assert responses.get("a", fetch, 60, 60)[0] == "value"
+    assert len(calls) == 1
+
+
+def test_incomplete_result_is_not_stored():
+    responses = cache.ResponseCache(store=cache.MemoryStore(10))
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return [], False
+
+    responses.get("a", fetch, 60, 60)
+    responses.get("a", fetch, 60, 60)
+    assert len(calls) == 2
+
+
+def test_stale_entry_is_served_and_refreshed_once():
+    store = cache.MemoryStore(10)
+    store.set("a", ("old", time.time() - 90))    # Past its 60 second ttl, within the stale window
+    responses = cache.ResponseCache(store=store)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "new", True
+
+    assert responses.get("a", fetch, 60, 60)[0] == "old"
+    assert responses.get("a", fetch, 60, 60)[0] == "old"    # The refresh is still running, no second one is started
+    release.set()
+    wait_for(lambda: store.get("a")[0] == "new")
+    assert len(calls) == 1
+    assert responses.get("a", fetch, 60, 60)[0] == "new"
+
+
+def test_stale_refresh_keeps_the_platform_of_the_request():
+    store = cache.MemoryStore(10)
+    store.set("a", ("old", time.time() - 90))
+    responses = cache.ResponseCache(store=store)
+    platforms = []
+
+    def fetch():
+        platforms.append(regions.platform())
+        return "new", True
+
+    def request():
+        regions.PLATFORM.set("euw1")
+        responses.get("a", fetch, 60, 60)
+
+    # A thread of its own, like a request being handled, so the platform is not set for the rest of the tests
+    thread = threading.Thread(target=request)
+    thread.start()
+    thread.join()
+    wait_for(lambda: platforms)
+    assert platforms == ["euw1"]
+
+
+def test_app_stale_refresh_uses_the_requested_platform(monkeypatch):
+    import game_api
+    import riot
+    platforms = []
+
+    def get_summoner_rank(summoner, tagline, league):
+        platforms.append(regions.platform())
+        return ["GOLD", "II", 42]
+
+    monkeypatch.setattr(riot, "get_summoner_rank", get_summoner_rank)
+    client = game_api.app.test_client()
+    path = "/league/rank/Stale/EUW/SOLO?platform=euw"
+    assert client.get(path).get_json() == ["GOLD", "II", 42]
+    # Make the cached answer stale, the next request gets it right away and refreshes it in the background
+    value, _ = game_api.RESPONSES._data.get(path)
+    game_api.RESPONSES._data.set(path, (value, time.time() - game_api.RANK_CACHE_TTL - 1))
+    client.get(path)
+    wait_for(lambda: len(platforms) == 2)
+    assert platforms == ["euw1", "euw1"]
+
+
+def test_app_keeps_the_empty_rank_of_an_unranked_player(monkeypatch):
+    import game_api
+    from conftest import MOCK
+    monkeypatch.setitem(MOCK.payloads, "league", [])
+    client = game_api.app.test_client()
+    MOCK.reset_counts()
+    assert client.get("/league/rank/Unranked/NA1/SOLO").get_json() == []
+    assert client.get("/league/rank/Unranked/NA1/SOLO").get_json() == []
+    assert MOCK.calls["league"] == 1
+
+
+def test_app_does_not_keep_a_rank_riot_failed_to_answer(monkeypatch):
+    import game_api
+    from conftest import MOCK
+    routes = [(route, pattern, (lambda query, *args: (503, {})) if route == "league" else handler)
+              for route, pattern, handler in MOCK.routes]
+    monkeypatch.setattr(MOCK, "routes", routes)
+    client = game_api.app.test_client()
+    MOCK.reset_counts()
+    assert client.get("/league/rank/Outage/NA1/SOLO").get_json() == []
+    calls = MOCK.calls["league"]
+    assert calls > 0
+    assert client.get("/league/rank/Outage/NA1/SOLO").get_json() == []
+    assert MOCK.calls["league"] == 2 * calls
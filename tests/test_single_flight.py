@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import pytest
+import cache
+
+
+def test_concurrent_calls_share_one_run():
+    flight = cache.SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["value"] * 5
+    assert len(runs) == 1
+
+
+def test_async_calls_share_one_run():
+    async def run():
+        flight = cache.AsyncSingleFlight()
+        runs = []
+
+        async def slow():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return "value"
+
+        results = await asyncio.gather(*(flight.do("key", slow) for _ in range(5)))
+        return results, runs
+    results, runs = asyncio.run(run())
+    assert results == ["value"] * 5
+    assert len(runs) == 1
+
+
+def test_async_leader_cancelled_does_not_fail_followers():
+    async def run():
+        flight = cache.AsyncSingleFlight()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "value"
+
+        leader = asyncio.ensure_future(flight.do("key", slow))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+    assert asyncio.run(run()) == "value"
+
+
+def test_async_error_reaches_every_caller():
+    async def run():
+        flight = cache.AsyncSingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("Riot is down")
+
+        return await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+    results = asyncio.run(run())
+    assert [str(result) for result in results] == ["Riot is down"] * 3
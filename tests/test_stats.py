@@ -0,0 +1,136 @@
+import random
+import numpy as np
+import pytest
+import static_data
+import stats
+
+PUUID = "player"
+CHAMPIONS = ["Ahri", "Jinx", "Leona", "Zed"]
+TRAITS = ["TFT13_Scrap", "TFT13_Sniper", "TFT13_Bruiser", "TFT13_Rebel"]
+UNITS = ["TFT13_Jinx", "TFT13_Vi", "TFT13_Ekko", "TFT13_Zeri", "TFT13_Powder"]
+
+
+def league_records(count, seed=1):
+    rng = random.Random(seed)
+    records = {}
+    for i in range(count):
+        records["NA1_%d" % i] = {
+            "gameStartTimestamp": (1700000000 + i * 3600) * 1000, "gameDuration": rng.randint(900, 2400), "queueId": 420,
+            "participants": {PUUID: {
+                "win": rng.random() < 0.5, "championName": rng.choice(CHAMPIONS), "kills": rng.randint(0, 15),
+                "deaths": rng.randint(0, 10), "assists": rng.randint(0, 20), "totalMinionsKilled": rng.randint(0, 250),
+                "neutralMinionsKilled": rng.randint(0, 40), "goldEarned": rng.randint(5000, 18000),
+                "totalDamageDealtToChampions": rng.randint(2000, 40000), "visionScore": rng.randint(0, 80)
+            }}
+        }
+    return records
+
+
+def tft_records(count, seed=1):
+    rng = random.Random(seed)
+    records = {}
+    for i in range(count):
+        placement = rng.randint(1, 8)
+        records["NA1_%d" % i] = {
+            "game_datetime": (1700000000 + i * 3600) * 1000, "queue_id": 1100,
+            "participants": {PUUID: {
+                "time_eliminated": rng.uniform(1200, 2400), "win": placement <= 4, "placement": placement,
+                "level": rng.randint(5, 10), "last_round": rng.randint(20, 40),
+                "traits": [{"name": trait, "num_units": rng.randint(1, 6), "style": rng.randint(0, 4),
+                            "tier_current": rng.randint(0, 3)} for trait in rng.sample(TRAITS, rng.randint(0, len(TRAITS)))],
+                # The same unit can be on the board twice
+                "units": [{"character_id": rng.choice(UNITS), "rarity": rng.randint(0, 4), "tier": rng.randint(1, 3)}
+                          for _ in range(rng.randint(0, 7))]
+            }}
+        }
+    return records
+
+
+def group_by_loop(records, match_ids, key):
+    """games, wins and placements of every name that <key> lists for a match, counted once per match"""
+    groups = {}
+    for match_id in match_ids:
+        participant = records[match_id]["participants"][PUUID]
+        for name in set(key(participant)):
+            group = groups.setdefault(name, {"games": 0, "wins": 0, "placements": 0, "kills": 0, "deaths": 0, "assists": 0})
+            group["games"] += 1
+            group["wins"] += participant["win"]
+            group["placements"] += participant.get("placement", 0)
+            for field in ("kills", "deaths", "assists"):
+                group[field] += participant.get(field, 0)
+    return groups
+
+
+def test_league_summary_matches_a_loop():
+    records = league_records(60)
+    match_ids = list(records)
+    table = stats.PlayerStats(stats.LEAGUE_ROW, stats.league_row)
+    rows, items, errors = table.select(PUUID, match_ids, records.get)
+    assert errors == [] and len(rows) == len(match_ids)
+    summary = stats.summarize_league(rows, table.names)
+
+    participants = [records[match_id]["participants"][PUUID] for match_id in match_ids]
+    kills, deaths, assists = (sum(p[field] for p in participants) for field in ("kills", "deaths", "assists"))
+    minutes = sum(records[match_id]["gameDuration"] for match_id in match_ids) / 60
+    assert summary["games"] == 60
+    assert summary["wins"] == sum(p["win"] for p in participants)
+    assert summary["kills"] == round(kills / 60, 1)
+    assert summary["KDA"] == round((kills + assists) / max(deaths, 1), 2)
+    assert summary["CS/min"] == round(sum(p["totalMinionsKilled"] + p["neutralMinionsKilled"] for p in participants) / minutes, 1)
+    assert summary["gold/min"] == round(sum(p["goldEarned"] for p in participants) / minutes, 1)
+    assert summary["visionScore"] == round(sum(p["visionScore"] for p in participants) / 60, 1)
+
+    groups = group_by_loop(records, match_ids, lambda p: [p["championName"]])
+    assert [champion["games"] for champion in summary["champions"]] == sorted((g["games"] for g in groups.values()), reverse=True)
+    for champion in summary["champions"]:
+        group = groups[champion["championName"]]
+        assert champion["games"] == group["games"]
+        assert champion["wins"] == group["wins"]
+        assert champion["KDA"] == round((group["kills"] + group["assists"]) / max(group["deaths"], 1), 2)
+
+
+def test_tft_summary_matches_a_loop():
+    records = tft_records(80)
+    match_ids = list(records)
+    table = stats.PlayerStats(stats.TFT_ROW, stats.tft_row, {"traits": stats.TFT_TRAIT, "units": stats.TFT_UNIT})
+    rows, items, errors = table.select(PUUID, match_ids, records.get)
+    summary = stats.summarize_tft(rows, items, table.names)
+
+    placements = [records[match_id]["participants"][PUUID]["placement"] for match_id in match_ids]
+    assert summary["avg_place"] == round(sum(placements) / 80, 2)
+    assert summary["top_4_pct"] == round(sum(place <= 4 for place in placements) / 80 * 100, 1)
+    assert summary["win_pct"] == round(placements.count(1) / 80 * 100, 1)
+    assert summary["placements"] == {str(place): placements.count(place) for place in range(1, 9)}
+
+    traits = group_by_loop(records, match_ids, lambda p: [trait["name"] for trait in p["traits"] if trait["style"] > 0])
+    units = group_by_loop(records, match_ids, lambda p: [unit["character_id"] for unit in p["units"]])
+    for kind, groups, display_name in (("traits", traits, static_data.tft_trait_name), ("units", units, static_data.tft_unit_name)):
+        expected = {display_name(name): (group["games"], round(group["placements"] / group["games"], 2),
+                                         round(group["wins"] / group["games"] * 100, 1)) for name, group in groups.items()}
+        assert {group["name"]: (group["games"], group["avg_place"], group["top_4_pct"]) for group in summary[kind]} == expected
+
+
+def test_group_counts_a_key_once_per_row():
+    keys = np.array([3, 1, 3, 3, 2, 1])
+    rows = np.array([0, 0, 0, 1, 1, 2])
+    values = np.array([10, 20, 10, 30, 40, 50])
+    distinct, counts, sums = stats._group(keys, rows, value=values)
+    assert distinct.tolist() == [1, 2, 3]
+    assert counts.tolist() == [2, 1, 2]
+    assert sums["value"].tolist() == [70, 40, 40]
+
+
+@pytest.mark.parametrize("pick", [slice(None, None, 3), slice(5, 20), slice(None, None, -2)])
+def test_partial_select_only_keeps_the_items_of_the_selected_matches(pick):
+    records = tft_records(30, seed=7)
+    table = stats.PlayerStats(stats.TFT_ROW, stats.tft_row, {"traits": stats.TFT_TRAIT, "units": stats.TFT_UNIT})
+    table.select(PUUID, list(records), records.get)    # Every match is in the player's table
+    match_ids = list(records)[pick]
+    rows, items, errors = table.select(PUUID, match_ids, records.get)
+
+    assert rows["start"].tolist() == [records[match_id]["game_datetime"] // 1000 for match_id in match_ids]
+    for kind, field, item_field in (("traits", "trait", "name"), ("units", "unit", "character_id")):
+        selected = [[] for _ in match_ids]
+        for item in items[kind]:
+            selected[item["row"]].append(table.names.names[item[field]])
+        assert selected == [[item[item_field] for item in records[match_id]["participants"][PUUID][kind]] for match_id in match_ids]
@@ -0,0 +1,71 @@
+"""?stream=ndjson on /league/matches, in both apps"""
+import asyncio
+import json
+import httpx
+import pytest
+import requests
+import game_api
+import game_api_async
+import riot
+import riot_async
+
+PATH = "/league/matches/Stream/NA1/4?stream=ndjson"
+
+
+def get(path):
+    response = game_api.app.test_client().get(path)
+    return response.status_code, response.get_data(as_text=True)
+
+
+def get_async(path):
+    async def run():
+        async with game_api_async.app.test_app() as test_app:
+            response = await test_app.test_client().get(path)
+            return response.status_code, await response.get_data(as_text=True)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("get", [get, get_async], ids=["flask", "quart"])
+def test_one_line_per_match(get):
+    status, text = get(PATH)
+    assert status == 200
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+    assert all("error" not in line for line in lines)
+    _, every = get(PATH.split("?")[0])
+    assert [line for line in sorted(lines, key=lambda line: line["index"])] == [dict(match, index=i) for i, match in enumerate(json.loads(every))]
+
+
+def test_riot_down_before_streaming(monkeypatch):
+    def unreachable(*args):
+        raise requests.exceptions.ConnectionError("Riot is down")
+    monkeypatch.setattr(riot, "get_summoner_puuid", unreachable)
+    status, text = get(PATH)
+    assert status == 504
+    assert json.loads(text) == {"error": "Riot API unavailable"}
+
+
+def test_riot_down_before_streaming_async(monkeypatch):
+    async def unreachable(*args):
+        raise httpx.ConnectError("Riot is down")
+    monkeypatch.setattr(riot_async, "get_summoner_puuid", unreachable)
+    status, text = get_async(PATH)
+    assert status == 504
+    assert json.loads(text) == {"error": "Riot API unavailable"}
+
+
+def test_failed_match_gets_its_own_line(monkeypatch):
+    ids = riot.get_recent_match_ids(riot.get_summoner_puuid("Stream", "NA1"), "4")
+    get_match_info = riot.get_match_info
+
+    def flaky(match_id, puuid):
+        if match_id == ids[2]:
+            raise requests.exceptions.ReadTimeout("too slow")
+        return get_match_info(match_id, puuid)
+    monkeypatch.setattr(riot, "get_match_info", flaky)
+    status, text = get(PATH)
+    assert status == 200
+    lines = {line["index"]: line for line in map(json.loads, text.splitlines())}
+    assert sorted(lines) == [0, 1, 2, 3]
+    assert lines[2] == {"index": 2, "matchId": ids[2], "error": "too slow"}
+    assert "error" not in lines[1]
@@ -0,0 +1,70 @@
+import copy
+import io
+import json
+import pytest
+import mock_riot
+import riot
+import timeline
+from conftest import MOCK
+
+
+@pytest.fixture
+def match():
+    """A full match and its timeline from the mock Riot API"""
+    puuid = mock_riot.make_puuid("Timeline", "TEST")
+    match_id = "NA1_%d" % (MOCK._player(puuid) * mock_riot.MATCH_ID_BASE + 4)
+    _, data = MOCK.lol_match({}, match_id)
+    _, timeline_data = MOCK.lol_timeline({}, match_id)
+    return puuid, data, timeline_data
+
+
+def test_streamed_timeline_is_the_same_as_the_decoded_one(match):
+    pytest.importorskip("ijson")
+    _, _, data = match
+    body = json.dumps(data).encode()
+    assert timeline._stream(io.BytesIO(body)) == timeline.compact_timeline(json.loads(body))
+
+
+def test_timeline_without_info_participants_uses_the_metadata_order(match):
+    pytest.importorskip("ijson")
+    _, _, data = match
+    data = copy.deepcopy(data)
+    del data["info"]["participants"]
+    body = json.dumps(data).encode()
+    record = timeline._stream(io.BytesIO(body))
+    assert record == timeline.compact_timeline(json.loads(body))
+    assert record["participants"] == data["metadata"]["participants"]
+
+
+def test_curves_compare_the_player_with_their_lane_opponent(match):
+    puuid, data, timeline_data = match
+    record = timeline.compact_timeline(timeline_data)
+    compact = riot.compact_match(data)
+    opponent = timeline.lane_opponent(compact, puuid)
+    assert opponent is not None and compact["participants"][opponent]["teamId"] != compact["participants"][puuid]["teamId"]
+    assert compact["participants"][opponent]["teamPosition"] == compact["participants"][puuid]["teamPosition"]
+
+    ret = timeline.curves(record, compact, puuid)
+    i, j = record["participants"].index(puuid), record["participants"].index(opponent)
+    frames = {str(minute): timeline.frame_at(record, minute) for minute in timeline.DIFF_MINUTES}
+    assert ret["opponent"] == compact["participants"][opponent]["championName"]
+    assert ret["diffs"] and set(ret["diffs"]) == {minute for minute, frame in frames.items() if frame is not None}
+    for minute, diffs in ret["diffs"].items():
+        frame = timeline_data["info"]["frames"][frames[minute]]["participantFrames"]
+        player, other = frame[str(i + 1)], frame[str(j + 1)]
+        assert diffs == {
+            "gold": player["totalGold"] - other["totalGold"],
+            "xp": player["xp"] - other["xp"],
+            "cs": player["minionsKilled"] + player["jungleMinionsKilled"] - other["minionsKilled"] - other["jungleMinionsKilled"]
+        }
+
+
+def test_no_lane_opponent_without_positions(match):
+    puuid, data, timeline_data = match
+    compact = riot.compact_match(data)
+    for participant in compact["participants"].values():
+        participant["teamPosition"] = ""    # Like an ARAM
+    assert timeline.lane_opponent(compact, puuid) is None
+    ret = timeline.curves(timeline.compact_timeline(timeline_data), compact, puuid)
+    assert ret["opponent"] is None and ret["diffs"] == {}
+    assert len(ret["gold"]) == len(ret["minutes"]) == len(timeline_data["info"]["frames"])
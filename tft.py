@@ -1,15 +1,22 @@
 
-import json
-import requests
 import os
 import datetime
+from urllib.parse import urlencode
+import numpy as np
+import workers
+import cache
+import history
+import ladder
+import regions
+import riot_client
+import static_data
+import stats
 from dotenv import load_dotenv
 load_dotenv('keys.env')
 
-TARGET = "https://na1.api.riotgames.com"
-ACCOUNT_TARGET = "https://americas.api.riotgames.com"
 API_KEY = os.environ.get('TFT_KEY')
-GEN_API_KEY = os.environ.get('RIOT_KEY') #API key for general use requests (puuid)
+# Several TFT keys separated by commas, calls are spread over all of them (see riot_client.KeyPool). Defaults to TFT_KEY
+KEYS = riot_client.KeyPool(os.environ.get('TFT_KEYS', API_KEY or '').split(','), "tft")
 
 tft_codes = {
     "SOLO" : "RANKED_TFT",
@@ -30,87 +37,210 @@ def get_tft_rank(summoner_name, tagline, league_type="RANKED"):
     """
     ret = []
     puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:
+        # A fresh snapshot of the whole ladder already has everyone's rank, see ladder.py
+        ranked = ladder.lookup("tft", regions.platform(), tft_codes.get(league_type, tft_codes["SOLO"]), puuid, KEYS.for_puuid(puuid))
+        if ranked is not None:
+            return ranked
     encryptedID = get_summoner_id(puuid)
     if len(encryptedID) > 0 :
-        url = TARGET+"/tft/league/v1/entries/by-summoner/"+encryptedID+"?api_key="+API_KEY
-        response = requests.get(url)
+        url = regions.platform_url()+"/tft/league/v1/entries/by-summoner/"+encryptedID
+        response = riot_client.get(url, KEYS.for_puuid(puuid))
         if response.status_code == 200:
-            if league_type in tft_codes:
-                code = tft_codes[league_type]
-            else:
-                code = tft_codes["SOLO"]
-            data = response.json()
-            for league in data:
-                if league["queueType"] == code:
-                    ret = [league["tier"], league["rank"], league["leaguePoints"]]
+            ret = parse_tft_rank(response.json(), league_type)
     return ret
 
 
+def parse_tft_rank(data, league_type="RANKED"):
+    """Find one league type in a TFT league entries response
+
+    Args:
+        data (list): The JSON from the TFT league entries endpoint, one entry per league the player is ranked in
+        league_type (str): The name of the league we want (RANKED or DOUBLEUP)
+
+    Returns:
+        list: Contains the tier, division, and LP of the player, or an empty list if they are not ranked in that league
+    """
+    ret = []
+    if league_type in tft_codes:
+        code = tft_codes[league_type]
+    else:
+        code = tft_codes["SOLO"]
+    for league in data:
+        if league["queueType"] == code:
+            ret = [league["tier"], league["rank"], league["leaguePoints"]]
+    return ret
+
+
+# The fields of each participant, trait and unit that we keep from a TFT match response, everything else is dropped before storing it
+PARTICIPANT_FIELDS = ("placement", "win", "level", "last_round", "time_eliminated")
+TRAIT_FIELDS = ("name", "num_units", "style", "tier_current")
+UNIT_FIELDS = ("character_id", "rarity", "tier")
+# Riot's rarity of a unit -> its gold cost. They index costs a little weirdly: 1-3 cost are 0-2, 4 cost is 4, 5 is 6, 6 is 8
+UNIT_COSTS = np.array([1, 2, 3, 4, 4, 5, 5, 6, 6])
+# Units that are summoned rather than bought, which always go at the end of a board
+SUMMONS = {"jaycesummon"}
+
+
+def sort_boards(participants):
+    """Put the traits and units of every participant of a match in display order, and give every unit its cost and
+        sort value. The whole lobby is sorted at once, with one NumPy sort for the traits and one for the units
+
+    Traits are sorted by style (inactive=0, bronze=1, silver=2, unique/teamup=3, gold=4, prismatic=5), then by the
+    number of units to decide ties (scrap 6 > ambusher 5). Units are sorted by cost*0.6 + 2**(star/1.5), so a three
+    star unit goes ahead of a more expensive two star one.
+
+    Args:
+        participants (list): The participant records from compact_match, which are changed in place
+    """
+    traits = [(i, trait) for i, participant in enumerate(participants) for trait in participant["traits"]]
+    if traits:
+        owner = np.array([i for i, _ in traits])
+        style = np.array([trait["style"] or 0 for _, trait in traits])
+        num_units = np.array([trait["num_units"] or 0 for _, trait in traits])
+        order = np.lexsort((-num_units, -style, owner))    # The last key is the main one, so each player's traits stay together
+        for participant in participants:
+            participant["traits"] = []
+        for i in order:
+            participants[owner[i]]["traits"].append(traits[i][1])
+    units = [(i, unit) for i, participant in enumerate(participants) for unit in participant["units"]]
+    if units:
+        owner = np.array([i for i, _ in units])
+        costs = UNIT_COSTS[np.clip([unit["rarity"] or 0 for _, unit in units], 0, len(UNIT_COSTS) - 1)]
+        tiers = np.array([unit["tier"] or 0 for _, unit in units], dtype=float)
+        # Only look up the name of each distinct unit once, a lobby has the same few units on most boards
+        summon_ids = {character_id for character_id in {unit["character_id"] for _, unit in units}
+                      if static_data.tft_unit_name(character_id) in SUMMONS}
+        summon = np.array([unit["character_id"] in summon_ids for _, unit in units])
+        sort_vals = np.where(summon, 0, costs * 0.6 + 2 ** (tiers / 1.5))
+        for (_, unit), cost, sort_val, is_summon in zip(units, costs.tolist(), sort_vals.tolist(), summon.tolist()):
+            unit["cost"] = cost
+            unit["sort_val"] = 0 if is_summon else sort_val
+        order = np.lexsort((-sort_vals, owner))
+        for participant in participants:
+            participant["units"] = []
+        for i in order:
+            participants[owner[i]]["units"].append(units[i][1])
+
+
+def compact_match(data):
+    """Turn a full TFT match response into the compact record that is kept in the match store. The boards are sorted
+        here (see sort_boards), so that showing a match later does not have to sort them again
+
+    Args:
+        data (dict): The match JSON from the Riot API
+
+    Returns:
+        dict: {"game_datetime": int, "queue_id": int, "boards": 1, "participants": {puuid: {field: value, "traits": [...], "units": [...]}}}
+    """
+    info = data["info"]
+    participants = {}
+    for puuid, participant in zip(data["metadata"]["participants"], info["participants"]):
+        record = {field: participant.get(field) for field in PARTICIPANT_FIELDS}
+        record["traits"] = [{field: trait.get(field) for field in TRAIT_FIELDS} for trait in participant["traits"]]
+        record["units"] = [{field: unit.get(field) for field in UNIT_FIELDS} for unit in participant["units"]]
+        participants[puuid] = record
+    sort_boards(list(participants.values()))
+    return {
+        "game_datetime": info["game_datetime"],
+        "queue_id": info.get("queue_id"),
+        "boards": 1,    # The boards are sorted, records stored before that was done here are sorted when they are read
+        "participants": participants
+    }
+
+
+def board(record, puuid):
+    """Get one player's part of a match record with their board sorted (see sort_boards)"""
+    participant = record["participants"][puuid]
+    if not record.get("boards"):
+        # Copy it, the record is shared with everyone reading this match from the cache
+        participant = dict(participant, traits=list(participant["traits"]), units=[dict(unit) for unit in participant["units"]])
+        sort_boards([participant])
+    return participant
+
+
+MATCHES = cache.MatchStore("tft", compact_match)
+
+
 def get_match_info(match_id, puuid):
     ret = {}
-    url = "https://americas.api.riotgames.com/tft/match/v1/matches/"+match_id+"?api_key="+API_KEY
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        participant_idx = data["metadata"]["participants"].index(puuid)
-        win = data["info"]["participants"][participant_idx]["win"]
-        placement = str(data["info"]["participants"][participant_idx]["placement"])
-        level = str(data["info"]["participants"][participant_idx]["level"])
-        #turning the total round from the API response into the stage-round format used in game
-        #                               ie: round 30 ---> stage 5 round 5, or round 5-5
-        stage = ((data["info"]["participants"][participant_idx]["last_round"] - 4) // 7) + 2
-        round = (data["info"]["participants"][participant_idx]["last_round"] -4 ) % 7
-        round_reached = str(stage) + "-" + str(round)
-        duration_seconds = data["info"]["participants"][participant_idx]["time_eliminated"]
-        duration_time = str(datetime.timedelta(seconds=duration_seconds))   # Duration in time format (HH:MM:SS)
-        traits = []
-        for trait in data["info"]["participants"][participant_idx]["traits"]:
-            
-            to_add={
-                "name" : trait["name"][6:].lower(), #removing "TFT13_" in the name
-                #number of units of this trait that are active. used to sort when there are multiple traits of the same style 
-                #                                                                                   ie: scrap 6 > ambusher 5
-                "num_units" : trait["num_units"],
-                #inactive=0, bronze=1, silver=2, unique/teamup=3, gold=4, pris=5. first level of sorting for later
-                "style" : trait["style"]
-            }
-            
-            traits.append(to_add)
-        sorted_traits = sorted(traits, key=lambda x: (-x['style'], -x['num_units'])) #reverse sort first by style (br, si, gld, prs etc)
-        units = []                                                                     #then by num_units to decide any ties
-        for unit in data["info"]["participants"][participant_idx]["units"]:
-            #because they are a little silly and index their costs really weirdly (1-3 cost are 0-2, 4 cost is 4, 5 is 6, 6 is 8)
-            if unit["rarity"] < 4:
-                cost = unit["rarity"] + 1
-            if unit["rarity"] == 4:
-                cost = unit["rarity"]
-            if unit["rarity"] == 6:
-                cost = unit["rarity"] - 1
-            if unit["rarity"] == 8:
-                cost = unit["rarity"] - 2
-            
-            to_add={
-                "name" : unit["character_id"][6:].lower(), #removing "TFT_" in the name
-                "cost" : str(cost),
-                "star" : str(unit["tier"]),
-                "sort_val" : (cost*0.6) + 2**(unit["tier"]/1.5)
-            }
-            if to_add["name"] == "jaycesummon":
-                to_add["sort_val"] = 0
-            units.append(to_add)
-        sorted_units = sorted(units, key=lambda x:x["sort_val"], reverse=True)
-
-        ret = {
-            "placement" : placement,
-            "win" : win,
-            "level" : level,
-            "round" : round_reached,
-            "time_elim" : duration_time,
-            "traits" : sorted_traits,
-            "units" : sorted_units
-        }
-        return ret
-    
+    record = get_match_record(match_id, KEYS.for_puuid(puuid))
+    if record is not None:
+        ret = parse_match_info(record, puuid)
+    return ret
+
+
+def get_match_record(match_id, api_key=None):
+    """Get the compact record of a match (see compact_match), from the match store or else from the Riot API
+
+    Args:
+        match_id (str): Unique ID of the requested match
+        api_key (str): The key that the PUUIDs of the player asking for it belong to, see KEYS.for_puuid. Defaults to the first key
+
+    Returns:
+        dict: The compact record of the match. Returns None if an invalid response is received from the API.
+    """
+    api_key = api_key or KEYS.keys[0]
+    store_id = KEYS.store_id(match_id, api_key)    # The PUUIDs in the record only match the key that downloaded it
+    record = MATCHES.get(store_id)   # Finished matches never change, so only download ones we have not seen before
+    if record is None:
+        # Matches are on the regional host of the platform the match was played on, which is the start of its ID
+        url = regions.match_url(regions.match_id_platform(match_id))+"/tft/match/v1/matches/"+match_id
+        response = riot_client.get(url, api_key)
+        if response.status_code == 200:
+            record = MATCHES.put(store_id, response.content)
+    return record
+
+
+def parse_match_info(record, puuid):
+    """Pull the placement, traits and units of one player out of a compact TFT match record
+
+    Args:
+        record (dict): The compact record of the match, from compact_match
+        puuid (str): Unique player ID of the requested summoner
+
+    Returns:
+        dict: Dictionary containing the player's placement, level, round reached, time eliminated, and their sorted traits and units
+    """
+    participant = board(record, puuid)
+    win = participant["win"]
+    placement = str(participant["placement"])
+    level = str(participant["level"])
+    #turning the total round from the API response into the stage-round format used in game
+    #                               ie: round 30 ---> stage 5 round 5, or round 5-5
+    stage = ((participant["last_round"] - 4) // 7) + 2
+    round = (participant["last_round"] -4 ) % 7
+    round_reached = str(stage) + "-" + str(round)
+    duration_seconds = participant["time_eliminated"]
+    duration_time = str(datetime.timedelta(seconds=duration_seconds))   # Duration in time format (HH:MM:SS)
+    # The traits and units are already in display order, see sort_boards
+    sorted_traits = []
+    for trait in participant["traits"]:
+        sorted_traits.append({
+            "name" : static_data.tft_trait_name(trait["name"]), #removing "TFT13_" in the name
+            "num_units" : trait["num_units"],
+            "style" : trait["style"]
+        })
+    sorted_units = []
+    for unit in participant["units"]:
+        sorted_units.append({
+            "name" : static_data.tft_unit_name(unit["character_id"]), #removing "TFT13_" in the name
+            "cost" : str(unit["cost"]),
+            "star" : str(unit["tier"]),
+            "sort_val" : unit["sort_val"]
+        })
+
+    return {
+        "placement" : placement,
+        "win" : win,
+        "level" : level,
+        "round" : round_reached,
+        "time_elim" : duration_time,
+        "traits" : sorted_traits,
+        "units" : sorted_units
+    }
+
+
 def get_match(summoner_name, tagline, count, start="1"):
 
     """Call the Riot API to obtain stats about the most recent match of a given summoner, starting at <start> amount of matches backwards. 
@@ -128,20 +258,10 @@ def get_match(summoner_name, tagline, count, start="1"):
     ret = []
     puuid = get_summoner_puuid(summoner_name, tagline)
     if len(puuid) > 0:    # Make sure we get a valid summoner ID
-        # Different API target than some other methods, so not using the TARGET variable
-        start_int = int(start)
-        # Riot API zero-indexes games, so subtract one
-        if start_int > 0:
-            start_int -= 1
-        start = str(start_int)
-        # Different API target than some other methods, so not using the TARGET variable
-        url = "https://americas.api.riotgames.com/tft/match/v1/matches/by-puuid/"+puuid+"/ids?start="+start+"&count="+count+"&api_key="+API_KEY
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json() # List of match IDs
-            for match_id in data:
-                match = get_match_info(match_id, puuid)
-                ret.append(match)           
+        data = get_recent_match_ids(puuid, count, start)
+        if data is not None:
+            # Fetch the details of every match at once, results stay in the same order as the match IDs
+            ret = workers.map_ordered(lambda match_id: get_match_or_error(match_id, puuid), data)
             
     return ret
 
@@ -152,46 +272,223 @@ def get_recents(summoner_name, tagline,count,start = "1"):
     Separate from get_match because unlike league, the single match data is not very useful for this as it will not display any specific data from
     matches other than the placements.  
     """
+    ret = {}
+    puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        matches = []
+        data = get_recent_match_ids(puuid, count, start)
+        if data is not None:
+            # Only the placements are shown, so the boards are not built
+            api_key = KEYS.for_puuid(puuid)
+            matches = workers.map_ordered(lambda match_id: get_placement_or_error(match_id, puuid, api_key), data)
+        ret = summarize_placements(matches)
+    return ret
+
+
+def get_match_stats(summoner_name, tagline, count):
+    """Sum up a summoner's <count> most recent TFT matches: average placement and level, top four and first place
+        percentages, the placement distribution, and how the summoner does with each trait and unit
+
+    Args:
+        summoner_name (str): The name of the summoner whose match history we want
+        count (str): The number of games to sum up
+
+    Returns:
+        dict: See stats.summarize_tft. Matches that could not be obtained are left out and listed under "errors".
+                Returns an empty dictionary if an invalid response is received from the API.
+    """
+    ret = {}
+    puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = get_recent_match_ids(puuid, count)
+        if data is not None:
+            api_key = KEYS.for_puuid(puuid)
+            ret = summarize_stats(puuid, data, lambda match_id: get_match_record(match_id, api_key), stats.summarize_tft)
+    return ret
+
+
+def get_comps(summoner_name, tagline, count):
+    """Sum up the team compositions of a summoner's <count> most recent TFT matches: how often they played each one
+        (named after its two strongest traits) and how it went, and how they did with every active trait and unit pair
+
+    Args:
+        summoner_name (str): The name of the summoner whose match history we want
+        count (str): The number of games to sum up
+
+    Returns:
+        dict: See stats.summarize_comps. Matches that could not be obtained are left out and listed under "errors".
+                Returns an empty dictionary if an invalid response is received from the API.
+    """
+    ret = {}
+    puuid = get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = get_recent_match_ids(puuid, count)
+        if data is not None:
+            api_key = KEYS.for_puuid(puuid)
+            ret = summarize_stats(puuid, data, lambda match_id: get_match_record(match_id, api_key), stats.summarize_comps)
+    return ret
+
+
+def summarize_stats(puuid, match_ids, get_record, summarize):
+    """The part of get_match_stats and get_comps after the match IDs are known: get the player's rows and sum them up
+
+    Args:
+        puuid (str): Unique player ID of the summoner
+        match_ids (list): The matches to sum up, most recent first
+        get_record (function): get_record(match_id) returns the compact record of a match, see stats.PlayerStats.select
+        summarize (function): stats.summarize_tft or stats.summarize_comps
+
+    Returns:
+        dict: What <summarize> returns, with the matches that could not be obtained listed under "errors"
+    """
+    rows, items, errors = stats.TFT.select(puuid, match_ids, get_record)
+    ret = summarize(rows, items, stats.TFT.names)
+    if errors:
+        riot_client.incomplete()
+        ret["errors"] = errors
+    return ret
+
+
+def parse_placement(record, puuid):
+    """Pull only the placement of one player out of a compact TFT match record, for when the board is not shown
+
+    Returns:
+        dict: {"placement": str, "win": bool}, the same fields as in parse_match_info
+    """
+    participant = record["participants"][puuid]
+    return {"placement": str(participant["placement"]), "win": participant["win"]}
+
+
+def get_placement_or_error(match_id, puuid, api_key=None):
+    """Same as get_match_or_error, but only gets the placement (see parse_placement)"""
+    try:
+        record = get_match_record(match_id, api_key)
+        if record is not None:
+            return parse_placement(record, puuid)
+    except Exception as e:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": str(e)}
+    riot_client.incomplete()
+    return {"matchId": match_id, "error": "Invalid response from the Riot API"}
+
+
+def summarize_placements(matches):
+    """Sum up the placements of a list of matches from get_match_or_error
+
+    Args:
+        matches (list): The matches, a dictionary from get_match_info or parse_placement, or an error dictionary for each one
+
+    Returns:
+        dict: The placements (top fours in bold), the top four and first place percentages, and the average placement.
+                Matches that could not be obtained are left out of the stats and listed under "errors"
+    """
     placements = []
+    failed = []
     placement_sum = 0
     wins=0 #wins = top fours, not first places
     firsts=0 #first places
-    puuid = get_summoner_puuid(summoner_name, tagline)
-    if len(puuid) > 0:    # Make sure we get a valid summoner ID
-        # Different API target than some other methods, so not using the TARGET variable
-        start_int = int(start)
-        # Riot API zero-indexes games, so subtract one
-        if start_int > 0:
-            start_int -= 1
-        start = str(start_int)
-        # Different API target than some other methods, so not using the TARGET variable
-        url = "https://americas.api.riotgames.com/tft/match/v1/matches/by-puuid/"+puuid+"/ids?start="+start+"&count="+count+"&api_key="+API_KEY
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            for match_id in data:
-                match = get_match_info(match_id, puuid)
-                placement_sum += int(match["placement"])
-                if match["win"]:
-                    if(match["placement"] == "1"):
-                        firsts+=1
-                    wins+=1
-                    top4_str = "**" + match["placement"] + "**"
-                    placements.append(top4_str)
-                else:
-                    bot4_str = match["placement"]
-                    placements.append(bot4_str)
-                
-            top_four_pct = round((wins/int(count)) * 100, 2) #% of top fours rounded to three digits
-            first_pct = round((firsts/int(count)) * 100, 2) #% of firsts rounded to three digits
-            avg_place = round(placement_sum/int(count) , 2) #average placement over this group of games rounded to three digits
-            
-        ret = {"placements" : placements,
-               "top_4_pct" : str(top_four_pct),
-               "win_pct" : str(first_pct),
-               "avg_place" : str(avg_place)
-               }
-        return ret
+    for match in matches:
+        if "error" in match:
+            failed.append(match)    # Leave matches we could not get out of the stats, but still report them
+            continue
+        placement_sum += int(match["placement"])
+        if match["win"]:
+            if(match["placement"] == "1"):
+                firsts+=1
+            wins+=1
+            top4_str = "**" + match["placement"] + "**"
+            placements.append(top4_str)
+        else:
+            bot4_str = match["placement"]
+            placements.append(bot4_str)
+
+    num_games = max(len(placements), 1)    # Only count the games we actually got, and avoid dividing by zero
+    top_four_pct = round((wins/num_games) * 100, 2) #% of top fours rounded to three digits
+    first_pct = round((firsts/num_games) * 100, 2) #% of firsts rounded to three digits
+    avg_place = round(placement_sum/num_games , 2) #average placement over this group of games rounded to three digits
+
+    ret = {"placements" : placements,
+           "top_4_pct" : str(top_four_pct),
+           "win_pct" : str(first_pct),
+           "avg_place" : str(avg_place)
+           }
+    if failed:
+        ret["errors"] = failed
+    return ret
+
+
+def get_recent_match_ids(puuid, count, start="1"):
+    """Get the IDs of a summoner's <count> most recent TFT matches, starting at <start> matches backwards
+
+    Args:
+        puuid (str): Unique player ID of the summoner
+        count (str): The number of match IDs to get
+        start (str): The number of the match to start looking back from (1 would be the most recent game)
+
+    Returns:
+        list: The match IDs, most recent first. Returns None if an invalid response is received from the API.
+    """
+    start_int = int(start)
+    # Riot API zero-indexes games, so subtract one
+    if start_int > 0:
+        start_int -= 1
+    if history.INCREMENTAL_HISTORY:
+        # Only asks Riot for the matches played since the last time we looked this player up
+        return HISTORIES.get().get_ids(puuid, start_int, int(count))
+    return get_match_ids(puuid, {"start": start_int, "count": count})
+
+
+def get_match_ids(puuid, query):
+    """Call the Riot API to get a page of a summoner's TFT match IDs
+
+    Args:
+        puuid (str): Unique player ID of the summoner
+        query (dict): Query parameters for the match-ids endpoint, such as start, count and startTime
+
+    Returns:
+        list: The match IDs, most recent first. Returns None if an invalid response is received from the API.
+    """
+    # Match histories are on the regional host, not the platform one
+    url = regions.match_url()+"/tft/match/v1/matches/by-puuid/"+puuid+"/ids?"+urlencode(query)
+    response = riot_client.get(url, KEYS.for_puuid(puuid))
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+def match_start_time(match_id):
+    """Get the start time of a match that is already in the match store, in epoch seconds, or None if we do not have it"""
+    for api_key in KEYS.keys:    # Any key's copy of the match has the same start time
+        record = MATCHES.get(KEYS.store_id(match_id, api_key))
+        if record is not None:
+            return record["game_datetime"] // 1000
+    return None
+
+
+# Match histories are kept per region, since Riot only lists the matches a player played in the region that is asked
+HISTORIES = regions.PerRegion(lambda region: history.MatchHistory("tft/" + region, get_match_ids, match_start_time))
+
+
+def get_match_or_error(match_id, puuid):
+    """Wrapper around get_match_info used when fetching many matches at once, so that one match failing
+        is reported in its own slot of the list instead of failing the whole request
+
+    Args:
+        match_id (str): Unique ID of the requested match
+        puuid (str): Unique player ID of the requested summoner
+
+    Returns:
+        dict: The result of get_match_info, or {"matchId": match_id, "error": reason} if the match could not be obtained
+    """
+    try:
+        match = get_match_info(match_id, puuid)
+    except Exception as e:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": str(e)}
+    if not match:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": "Invalid response from the Riot API"}
+    return match
 
 
 def get_summoner_id(puuid):
@@ -203,12 +500,22 @@ def get_summoner_id(puuid):
     Returns:
         str: The encrypted summoner ID. Returns an empty string if an invalid response is received from the API.
     """
+    # The summoner ID is used with the key the PUUID came from (see get_tft_rank), and only works with the key it was
+    # looked up with, so it has to be looked up with that key too
+    api_key = KEYS.for_puuid(puuid)
+    # Summoner IDs are different on every platform, and encrypted for the key they were looked up with
+    key = ("summoner", "tft", regions.platform(), riot_client.key_name(api_key), puuid)
+    ret = cache.IDENTITIES.get(key)
+    if ret is not None:
+        return ret
     ret = ""
-    url = TARGET+"/lol/summoner/v4/summoners/by-puuid/"+ puuid + "?api_key="+GEN_API_KEY
-    response = requests.get(url)
-    data = response.json()
+    if len(puuid) == 0:    # No point asking Riot about a player we could not find
+        return ret
+    url = regions.platform_url()+"/lol/summoner/v4/summoners/by-puuid/"+ puuid
+    response = riot_client.get(url, api_key)
     if response.status_code == 200:
-        ret = data["id"]
+        ret = response.json()["id"]
+        cache.IDENTITIES.set(key, ret)
     return ret
 
 
@@ -221,10 +528,20 @@ def get_summoner_puuid(summoner_name, tagline):
     Returns:
         str: The unique summoner puuid. Returns an empty string if an invalid response is received from the API.
     """   
+    api_key = KEYS.for_riot_id(summoner_name, tagline)    # Every later call about this player has to use the same key
+    key = cache.riot_id_key("tft", summoner_name, tagline, riot_client.key_name(api_key))
+    ret = cache.IDENTITIES.get(key)
+    if ret is not None:
+        KEYS.remember(ret, api_key)
+        return ret
     ret = ""  
-    url = ACCOUNT_TARGET+"/riot/account/v1/accounts/by-riot-id/"+ summoner_name + "/" + tagline + "?api_key="+API_KEY
-    response = requests.get(url)
-    data = response.json()
+    url = regions.account_url()+"/riot/account/v1/accounts/by-riot-id/"+ summoner_name + "/" + tagline
+    response = riot_client.get(url, api_key)
     if response.status_code == 200:
-        ret = data["puuid"]
+        ret = response.json()["puuid"]
+        cache.IDENTITIES.set(key, ret)
+        KEYS.remember(ret, api_key)
+    elif response.status_code == 404:
+        # Remember that this Riot ID does not exist for a short time, but do not cache other errors (rate limits, outages)
+        cache.IDENTITIES.set(key, ret, cache.IDENTITY_NEGATIVE_TTL)
     return ret
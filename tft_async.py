@@ -0,0 +1,196 @@
+"""
+Async versions of the TFT methods in tft.py, used by game_api_async.py. Each one makes the same Riot API calls
+as its tft.py counterpart, but awaits them on an async HTTP client so that a single process can wait on many
+calls at once. They share tft.py's constants, caches and parsing, so the JSON they return is identical.
+"""
+import asyncio
+from urllib.parse import urlencode
+import cache
+import history
+import ladder
+import regions
+import riot_async
+import riot_client
+import stats
+import tft
+import workers
+from tft import KEYS
+
+
+async def get_tft_rank(summoner_name, tagline, league_type="RANKED"):
+    """Async version of tft.get_tft_rank"""
+    ret = []
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    if len(puuid) > 0:
+        # The snapshot is read from disk when a newer one shows up, so do that in a thread rather than on the event loop
+        queue = tft.tft_codes.get(league_type, tft.tft_codes["SOLO"])
+        ranked = await asyncio.to_thread(ladder.lookup, "tft", regions.platform(), queue, puuid, api_key)
+        if ranked is not None:
+            return ranked
+    encryptedID = await get_summoner_id(puuid)
+    if len(encryptedID) > 0 :
+        url = regions.platform_url()+"/tft/league/v1/entries/by-summoner/"+encryptedID
+        response = await riot_client.get_async(url, api_key)
+        if response.status_code == 200:
+            ret = tft.parse_tft_rank(response.json(), league_type)
+    return ret
+
+
+async def get_match_record(match_id, api_key=None):
+    """Async version of tft.get_match_record"""
+    api_key = api_key or KEYS.keys[0]
+    store_id = KEYS.store_id(match_id, api_key)
+    # The match store reads and writes a SQLite file, so do that in a thread rather than on the event loop
+    record = await asyncio.to_thread(tft.MATCHES.get, store_id)
+    if record is None:
+        url = regions.match_url(regions.match_id_platform(match_id))+"/tft/match/v1/matches/"+match_id
+        response = await riot_client.get_async(url, api_key)
+        if response.status_code == 200:
+            record = await asyncio.to_thread(tft.MATCHES.put, store_id, response.content)
+    return record
+
+
+async def get_match_info(match_id, puuid):
+    """Async version of tft.get_match_info"""
+    ret = {}
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    record = await get_match_record(match_id, api_key)
+    if record is not None:
+        ret = tft.parse_match_info(record, puuid)
+    return ret
+
+
+async def get_placement_or_error(match_id, puuid, api_key=None):
+    """Async version of tft.get_placement_or_error"""
+    try:
+        record = await get_match_record(match_id, api_key)
+        if record is not None:
+            return tft.parse_placement(record, puuid)
+    except Exception as e:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": str(e)}
+    riot_client.incomplete()
+    return {"matchId": match_id, "error": "Invalid response from the Riot API"}
+
+
+async def get_match_or_error(match_id, puuid):
+    """Async version of tft.get_match_or_error"""
+    try:
+        match = await get_match_info(match_id, puuid)
+    except Exception as e:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": str(e)}
+    if not match:
+        riot_client.incomplete()
+        return {"matchId": match_id, "error": "Invalid response from the Riot API"}
+    return match
+
+
+async def get_recent_match_ids(puuid, count, start="1"):
+    """Async version of tft.get_recent_match_ids, with the same stored histories as the sync app"""
+    start_int = int(start)
+    # Riot API zero-indexes games, so subtract one
+    if start_int > 0:
+        start_int -= 1
+    if history.INCREMENTAL_HISTORY:
+        return await tft.HISTORIES.get().get_ids_async(get_match_ids, puuid, start_int, int(count))
+    return await get_match_ids(puuid, {"start": start_int, "count": count})
+
+
+async def get_match_ids(puuid, query):
+    """Async version of tft.get_match_ids"""
+    url = regions.match_url()+"/tft/match/v1/matches/by-puuid/"+puuid+"/ids?"+urlencode(query)
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    response = await riot_client.get_async(url, api_key)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+async def get_match(summoner_name, tagline, count, start="1"):
+    """Async version of tft.get_match"""
+    ret = []
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = await get_recent_match_ids(puuid, count, start)
+        if data is not None:
+            ret = await workers.gather_ordered(lambda match_id: get_match_or_error(match_id, puuid), data)
+    return ret
+
+
+async def get_recents(summoner_name, tagline, count, start="1"):
+    """Async version of tft.get_recents"""
+    ret = {}
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        matches = []
+        data = await get_recent_match_ids(puuid, count, start)
+        if data is not None:
+            api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+            matches = await workers.gather_ordered(lambda match_id: get_placement_or_error(match_id, puuid, api_key), data)
+        ret = tft.summarize_placements(matches)
+    return ret
+
+
+async def get_match_stats(summoner_name, tagline, count):
+    """Async version of tft.get_match_stats, see riot_async.get_match_stats"""
+    return await summarize_stats(summoner_name, tagline, count, stats.summarize_tft)
+
+
+async def get_comps(summoner_name, tagline, count):
+    """Async version of tft.get_comps, see riot_async.get_match_stats"""
+    return await summarize_stats(summoner_name, tagline, count, stats.summarize_comps)
+
+
+async def summarize_stats(summoner_name, tagline, count, summarize):
+    """Fetch a summoner's <count> most recent matches on the async client, then sum them up in a thread with tft.summarize_stats"""
+    ret = {}
+    puuid = await get_summoner_puuid(summoner_name, tagline)
+    if len(puuid) > 0:    # Make sure we get a valid summoner ID
+        data = await get_recent_match_ids(puuid, count)
+        if data is not None:
+            api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+            get_record = await riot_async.prefetch_records(stats.TFT, puuid, data, lambda match_id: get_match_record(match_id, api_key),
+                                                           lambda match_id: tft.get_match_record(match_id, api_key))
+            ret = await asyncio.to_thread(tft.summarize_stats, puuid, data, get_record, summarize)
+    return ret
+
+
+async def get_summoner_id(puuid):
+    """Async version of tft.get_summoner_id"""
+    api_key = await cache.off_loop(KEYS.for_puuid, puuid)
+    key = ("summoner", "tft", regions.platform(), riot_client.key_name(api_key), puuid)
+    ret = await cache.off_loop(cache.IDENTITIES.get, key)
+    if ret is not None:
+        return ret
+    ret = ""
+    if len(puuid) == 0:    # No point asking Riot about a player we could not find
+        return ret
+    url = regions.platform_url()+"/lol/summoner/v4/summoners/by-puuid/"+ puuid
+    response = await riot_client.get_async(url, api_key)
+    if response.status_code == 200:
+        ret = response.json()["id"]
+        await cache.off_loop(cache.IDENTITIES.set, key, ret)
+    return ret
+
+
+async def get_summoner_puuid(summoner_name, tagline):
+    """Async version of tft.get_summoner_puuid"""
+    api_key = await cache.off_loop(KEYS.for_riot_id, summoner_name, tagline)
+    key = cache.riot_id_key("tft", summoner_name, tagline, riot_client.key_name(api_key))
+    ret = await cache.off_loop(cache.IDENTITIES.get, key)
+    if ret is not None:
+        await cache.off_loop(KEYS.remember, ret, api_key)
+        return ret
+    ret = ""
+    url = regions.account_url()+"/riot/account/v1/accounts/by-riot-id/"+ summoner_name + "/" + tagline
+    response = await riot_client.get_async(url, api_key)
+    if response.status_code == 200:
+        ret = response.json()["puuid"]
+        await cache.off_loop(cache.IDENTITIES.set, key, ret)
+        await cache.off_loop(KEYS.remember, ret, api_key)
+    elif response.status_code == 404:
+        # Remember that this Riot ID does not exist for a short time, but do not cache other errors (rate limits, outages)
+        await cache.off_loop(cache.IDENTITIES.set, key, ret, cache.IDENTITY_NEGATIVE_TTL)
+    return ret
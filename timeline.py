@@ -0,0 +1,174 @@
+"""
+This file is for League match timelines (match-v5 .../timeline): the gold, XP and CS of every player at each minute of
+a match, which get_match_info can only give as averages over the whole game. A timeline is several megabytes of JSON,
+almost all of it events (every ward, item and skill level) that we do not use. When ijson is installed the timeline is
+parsed while it is being downloaded and only the per-minute totals are kept, so the whole body is never in memory at
+once. Without ijson the body is read and decoded in one go, which gives the same result with more memory.
+
+The totals of a match are a few numbers per player per minute, so they are kept in their own match store (see
+riot.TIMELINES) and a timeline is never downloaded twice.
+"""
+import json
+try:
+    import ijson    # Parses JSON as it is read, used when installed
+except ImportError:
+    ijson = None
+
+# Minutes at which a player is compared with their lane opponent
+DIFF_MINUTES = (10, 15, 20)
+# The stats kept for every minute, and the participant frame fields each one is the sum of
+STATS = ("gold", "xp", "cs")
+FRAME_FIELDS = {"totalGold": "gold", "xp": "xp", "minionsKilled": "cs", "jungleMinionsKilled": "cs"}
+FRAMES_PREFIX = "info.frames.item.participantFrames."
+
+
+def _build(puuids, ids, timestamps, frames):
+    """Turn what was read from a timeline into its compact record
+
+    Args:
+        puuids (list): metadata.participants, the PUUIDs in participant ID order
+        ids (dict): participant ID -> PUUID from info.participants, which is used instead of puuids when it is there
+        timestamps (list): The timestamp of each frame, in milliseconds
+        frames (list): {participant ID (str): {stat: value}} for each frame
+
+    Returns:
+        dict: {"participants": [puuid, ...], "minutes": [float, ...], "gold": [[one value per participant], ...], "xp": ..., "cs": ...}
+    """
+    count = max(len(puuids), len(ids))
+    order = [str(participant_id) for participant_id in range(1, count + 1)]
+    record = {
+        "participants": [ids.get(participant_id) or puuids[participant_id - 1] for participant_id in range(1, count + 1)],
+        "minutes": [round(timestamp / 60000, 2) for timestamp in timestamps]
+    }
+    for stat in STATS:
+        record[stat] = [[frame.get(participant_id, {}).get(stat, 0) for participant_id in order] for frame in frames]
+    return record
+
+
+def compact_timeline(data):
+    """Turn a decoded match-v5 timeline into the compact record that is kept in the match store
+
+    Args:
+        data (dict): The timeline JSON from the Riot API
+
+    Returns:
+        dict: See _build
+    """
+    info = data["info"]
+    ids = {participant["participantId"]: participant["puuid"] for participant in info.get("participants", [])}
+    timestamps = []
+    frames = []
+    for frame in info["frames"]:
+        timestamps.append(frame["timestamp"])
+        totals = {}
+        for participant_id, values in frame["participantFrames"].items():
+            totals[participant_id] = dict.fromkeys(STATS, 0)
+            for field, stat in FRAME_FIELDS.items():
+                totals[participant_id][stat] += values.get(field) or 0
+        frames.append(totals)
+    return _build(data["metadata"]["participants"], ids, timestamps, frames)
+
+
+def _stream(file):
+    """Read a timeline with ijson, keeping only what compact_timeline would"""
+    puuids = []
+    participants = []    # [participant ID, PUUID] of each entry of info.participants
+    timestamps = []
+    frames = []
+    for prefix, event, value in ijson.parse(file):
+        if prefix.startswith(FRAMES_PREFIX):
+            # info.frames.item.participantFrames.<participant ID>.<field>, deeper fields (championStats...) are not kept
+            if event == "number":
+                participant_id, _, field = prefix[len(FRAMES_PREFIX):].partition(".")
+                stat = FRAME_FIELDS.get(field)
+                if stat is not None:
+                    frames[-1].setdefault(participant_id, dict.fromkeys(STATS, 0))[stat] += int(value)
+        elif prefix == "info.frames.item":
+            if event == "start_map":
+                frames.append({})
+                timestamps.append(0)
+        elif prefix == "info.frames.item.timestamp":
+            timestamps[-1] = int(value)
+        elif prefix == "metadata.participants.item":
+            puuids.append(value)
+        elif prefix == "info.participants.item" and event == "start_map":
+            participants.append([None, None])
+        elif prefix == "info.participants.item.participantId":
+            participants[-1][0] = int(value)
+        elif prefix == "info.participants.item.puuid":
+            participants[-1][1] = value
+    ids = {participant_id: puuid for participant_id, puuid in participants if participant_id is not None and puuid}
+    return _build(puuids, ids, timestamps, frames)
+
+
+def parse_timeline(file):
+    """Read a match-v5 timeline from a file-like object (such as a response being downloaded) into its compact record
+
+    Args:
+        file: Anything with a read method that gives the bytes of the timeline JSON
+
+    Returns:
+        dict: See _build
+    """
+    if ijson is not None:
+        return _stream(file)
+    return compact_timeline(json.loads(file.read()))
+
+
+def frame_at(record, minute):
+    """The index of the first frame at or after <minute>, or None if the game ended before then"""
+    for i, frame_minute in enumerate(record["minutes"]):
+        if frame_minute >= minute:
+            return i
+    return None
+
+
+def lane_opponent(match, puuid):
+    """The PUUID of the player on the other team with the same position, or None (no positions in ARAM, for example)
+
+    Args:
+        match (dict): The compact match record, from riot.compact_match
+        puuid (str): Unique player ID of the summoner
+    """
+    player = match["participants"][puuid]
+    if not player.get("teamPosition"):
+        return None
+    for other, participant in match["participants"].items():
+        if participant["teamId"] != player["teamId"] and participant.get("teamPosition") == player["teamPosition"]:
+            return other
+    return None
+
+
+def curves(record, match, puuid):
+    """Get a player's gold, XP and CS at every minute of a match, and how far ahead or behind their lane opponent they
+        were at each of DIFF_MINUTES
+
+    Args:
+        record (dict): The compact timeline, from parse_timeline
+        match (dict): The compact match record, from riot.compact_match
+        puuid (str): Unique player ID of the summoner
+
+    Returns:
+        dict: {"championName", "opponent" (their champion, or None), "minutes", "gold", "xp", "cs" (one value per
+                minute), "diffs": {"10": {"gold", "xp", "cs"}, ...}}. A minute the game did not reach is left out of
+                diffs. Returns an empty dictionary if the player is not in the timeline
+    """
+    if puuid not in record["participants"]:
+        return {}
+    i = record["participants"].index(puuid)
+    opponent = lane_opponent(match, puuid)
+    ret = {
+        "championName": match["participants"][puuid]["championName"],
+        "opponent": match["participants"][opponent]["championName"] if opponent is not None else None,
+        "minutes": record["minutes"]
+    }
+    for stat in STATS:
+        ret[stat] = [frame[i] for frame in record[stat]]
+    ret["diffs"] = {}
+    if opponent in record["participants"]:
+        j = record["participants"].index(opponent)
+        for minute in DIFF_MINUTES:
+            frame = frame_at(record, minute)
+            if frame is not None:
+                ret["diffs"][str(minute)] = {stat: record[stat][frame][i] - record[stat][frame][j] for stat in STATS}
+    return ret
@@ -0,0 +1,119 @@
+"""
+This file is for running independent Riot API calls at the same time instead of one after another.
+Fetching the details of a list of matches is the main use: each match is its own HTTPS round trip, so
+doing them in parallel keeps the response time close to that of the slowest single match.
+The async serving mode does the same thing with coroutines instead of threads.
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Maximum number of calls that a single request is allowed to have in flight at once
+MATCH_WORKERS = int(os.environ.get('MATCH_WORKERS', '8'))
+
+
+def _in_context(func):
+    """Wrap <func> so it runs with the context variables of the caller (e.g. the request being timed in metrics.py),
+        which threads do not get on their own"""
+    context = contextvars.copy_context()
+    return lambda item: context.copy().run(func, item)
+
+
+def map_ordered(func, items, limit=MATCH_WORKERS):
+    """Call <func> on every item in <items> using a bounded pool of threads
+
+    Args:
+        func (function): The function to call, takes a single item as its argument
+        items (list): The items to process
+        limit (int): The maximum number of calls to run at the same time. Defaults to MATCH_WORKERS
+
+    Returns:
+        list: The return values of <func>, in the same order as <items> (not the order they finished in)
+    """
+    items = list(items)
+    if len(items) <= 1 or limit <= 1:
+        return [func(item) for item in items]
+    func = _in_context(func)
+    # A new pool per call, so a request that fans out from inside another fan-out can never deadlock
+    with ThreadPoolExecutor(max_workers=min(limit, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+def imap_unordered(func, items, limit=MATCH_WORKERS):
+    """Call <func> on every item in <items> using a bounded pool of threads, giving back each result as soon as it is done
+
+    Args:
+        func (function): The function to call, takes a single item as its argument
+        items (list): The items to process
+        limit (int): The maximum number of calls to run at the same time. Defaults to MATCH_WORKERS
+
+    Yields:
+        tuple: (index, result), where index is the position of the item in <items>, in the order the calls finish
+    """
+    items = list(items)
+    if not items:
+        return
+    func = _in_context(func)
+    pool = ThreadPoolExecutor(max_workers=min(max(limit, 1), len(items)))
+    try:
+        futures = {pool.submit(func, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # If the caller stops early (e.g. the client disconnected), do not start the calls that are still waiting
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def gather_ordered(func, items, limit=MATCH_WORKERS):
+    """Async version of map_ordered: await <func> on every item in <items>, at most <limit> at a time
+
+    Args:
+        func (function): The coroutine function to call, takes a single item as its argument
+        items (list): The items to process
+        limit (int): The maximum number of calls to run at the same time. Defaults to MATCH_WORKERS
+
+    Returns:
+        list: The return values of <func>, in the same order as <items>
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
+
+
+def gather_unordered(func, items, limit=MATCH_WORKERS):
+    """Async version of imap_unordered: await <func> on every item in <items>, at most <limit> at a time, giving back
+        each result as soon as it is done. Must be called from a coroutine: the calls are started right away, with the
+        context variables of the caller, rather than when the first result is asked for
+
+    Args:
+        func (function): The coroutine function to call, takes a single item as its argument
+        items (list): The items to process
+        limit (int): The maximum number of calls to run at the same time. Defaults to MATCH_WORKERS
+
+    Returns:
+        async iterator: Yields (index, result), where index is the position of the item in <items>, in the order the
+            calls finish
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(i, item):
+        async with semaphore:
+            return i, await func(item)
+
+    tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(items)]
+
+    async def results():
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # If the caller stops early (e.g. the client disconnected), do not leave the other calls running
+            for task in tasks:
+                task.cancel()
+
+    return results()